@@ -0,0 +1,480 @@
+"""Pantallas y popups de administración (solo se cargan para usuarios admin)"""
+import threading
+import time
+from datetime import datetime
+from kivy.app import App
+from kivy.clock import Clock
+from kivy.uix.popup import Popup
+from kivy.uix.label import Label
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.textinput import TextInput
+from kivy.uix.button import Button
+from kivy.uix.spinner import Spinner
+from kivy.uix.scrollview import ScrollView
+from kivymd.uix.button import MDIconButton
+from base_screen import BaseScreen
+from memory_budget import release_widgets
+
+class AddProductPopup(Popup):
+    def __init__(self, update_callback, **kwargs):
+        super().__init__(**kwargs)
+        self.update_callback = update_callback
+        self.title = 'Agregar Producto'
+        self.size_hint = (0.8, 0.6)
+        self.content = self.create_content()
+
+    def create_content(self):
+        layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        
+        self.nombre_input = TextInput(hint_text='Nombre del Producto', multiline=False)
+        self.unidades_input = TextInput(hint_text='Unidades', multiline=False)
+        self.costo_input = TextInput(hint_text='Costo', multiline=False)
+        
+        add_button = Button(
+            text='Agregar',
+            size_hint_y=None,
+            height='40dp',
+            background_color=(0.2, 0.6, 1, 1)
+        )
+        add_button.bind(on_press=self.add_product)
+        
+        layout.add_widget(Label(text='Nombre del Producto'))
+        layout.add_widget(self.nombre_input)
+        layout.add_widget(Label(text='Unidades'))
+        layout.add_widget(self.unidades_input)
+        layout.add_widget(Label(text='Costo'))
+        layout.add_widget(self.costo_input)
+        layout.add_widget(add_button)
+        
+        return layout
+
+    def add_product(self, instance):
+        nombre = self.nombre_input.text.strip()
+        unidades = self.unidades_input.text.strip()
+        costo = self.costo_input.text.strip()
+        
+        if not all([nombre, unidades, costo]):
+            self.show_error("Todos los campos son requeridos")
+            return
+            
+        if not unidades.isdigit() or not costo.isdigit():
+            self.show_error("Unidades y costo deben ser números")
+            return
+            
+        app = App.get_running_app()
+        app.db.add_product(nombre, unidades, costo)
+        self.update_callback()
+        self.dismiss()
+
+    def show_error(self, message):
+        content = BoxLayout(orientation='vertical', padding=10)
+        label = Label(
+            text=message,
+            text_size=(280, None),
+            size_hint_y=None,
+            halign='center',
+            valign='middle'
+        )
+        label.bind(texture_size=lambda *x: setattr(label, 'height', label.texture_size[1]))
+        content.add_widget(label)
+        
+        popup = Popup(
+            title='Error',
+            content=content,
+            size_hint=(None, None),
+            size=(300, label.height + 100),
+            auto_dismiss=True
+        )
+        popup.open()
+
+class SelectProductTypePopup(Popup):
+    def __init__(self, callback, **kwargs):
+        super().__init__(**kwargs)
+        self.callback = callback
+        self.title = 'Seleccionar Tipo de Producto'
+        self.size_hint = (0.8, 0.4)
+        
+        layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        
+        nuevo_btn = Button(
+            text='Nuevo Producto',
+            size_hint_y=None,
+            height='50dp',
+            background_color=(0.2, 0.6, 1, 1)
+        )
+        nuevo_btn.bind(on_press=lambda x: self.select_type('nuevo'))
+        
+        existente_btn = Button(
+            text='Actualizar Producto Existente',
+            size_hint_y=None,
+            height='50dp',
+            background_color=(0.2, 0.8, 0.2, 1)
+        )
+        existente_btn.bind(on_press=lambda x: self.select_type('existente'))
+        
+        layout.add_widget(nuevo_btn)
+        layout.add_widget(existente_btn)
+        self.content = layout
+
+    def select_type(self, tipo):
+        self.dismiss()
+        self.callback(tipo)
+
+class UpdateProductPopup(Popup):
+    def __init__(self, producto, update_callback, **kwargs):
+        super().__init__(**kwargs)
+        self.producto = producto
+        self.update_callback = update_callback
+        self.title = f'Actualizar {producto["nombre"]}'
+        self.size_hint = (0.8, 0.6)
+        self.content = self.create_content()
+
+    def create_content(self):
+        layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        
+        layout.add_widget(Label(text=f'Unidades actuales: {self.producto["unidades"]}'))
+        layout.add_widget(Label(text=f'Costo actual: ${self.producto["costo"]:,}'))
+        
+        self.unidades_input = TextInput(
+            hint_text='Unidades adicionales',
+            multiline=False,
+            input_filter='int'
+        )
+        self.costo_input = TextInput(
+            hint_text='Nuevo costo (opcional)',
+            multiline=False,
+            input_filter='int'
+        )
+        
+        update_button = Button(
+            text='Actualizar',
+            size_hint_y=None,
+            height='40dp',
+            background_color=(0.2, 0.6, 1, 1)
+        )
+        update_button.bind(on_press=self.update_product)
+        
+        layout.add_widget(Label(text='Unidades a agregar:'))
+        layout.add_widget(self.unidades_input)
+        layout.add_widget(Label(text='Nuevo costo (dejar vacío para mantener):'))
+        layout.add_widget(self.costo_input)
+        layout.add_widget(update_button)
+        
+        return layout
+
+    def update_product(self, instance):
+        try:
+            unidades_adicionales = int(self.unidades_input.text or '0')
+            nuevo_costo = self.costo_input.text.strip()
+            
+            if nuevo_costo and not nuevo_costo.isdigit():
+                self.show_error("El costo debe ser un número")
+                return
+                
+            app = App.get_running_app()
+            app.catalog.refresh()
+            producto = app.catalog.get(self.producto['nombre'])
+            if producto is None:
+                self.show_error("El producto ya no existe")
+                return
+
+            if nuevo_costo:
+                producto['costo'] = int(nuevo_costo)
+            
+            # Las entradas se registran como reposición; una cantidad negativa es un ajuste
+            if unidades_adicionales > 0:
+                app.db.restock_product(self.producto['nombre'], unidades_adicionales)
+            elif unidades_adicionales < 0:
+                app.db.update_product_units(
+                    self.producto['nombre'], producto['unidades'] + unidades_adicionales
+                )
+            self.update_callback()
+            self.dismiss()
+            
+        except ValueError:
+            self.show_error("Por favor ingrese valores válidos")
+
+    def show_error(self, message):
+        content = BoxLayout(orientation='vertical', padding=10)
+        label = Label(
+            text=message,
+            text_size=(280, None),
+            size_hint_y=None,
+            halign='center',
+            valign='middle'
+        )
+        label.bind(texture_size=lambda *x: setattr(label, 'height', label.texture_size[1]))
+        content.add_widget(label)
+        
+        popup = Popup(
+            title='Error',
+            content=content,
+            size_hint=(None, None),
+            size=(300, label.height + 100),
+            auto_dismiss=True
+        )
+        popup.open()
+
+class QueryStatsPopup(Popup):
+    def __init__(self, db, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+        self.title = 'Estadísticas de Base de Datos'
+        self.size_hint = (0.95, 0.9)
+        self.content = self.create_content()
+
+    def create_content(self):
+        layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
+
+        self.report_label = Label(
+            font_name='RobotoMono-Regular',
+            font_size='12sp',
+            size_hint=(None, None),
+            halign='left',
+            valign='top'
+        )
+        self.report_label.bind(texture_size=self.report_label.setter('size'))
+        scroll = ScrollView(do_scroll_x=True, do_scroll_y=True)
+        scroll.add_widget(self.report_label)
+        layout.add_widget(scroll)
+
+        botones = BoxLayout(size_hint_y=None, height='40dp', spacing=10)
+        reset_btn = Button(text='Reiniciar', background_color=(0.8, 0.2, 0.2, 1))
+        reset_btn.bind(on_press=self.reset)
+        close_btn = Button(text='Cerrar', background_color=(0.2, 0.6, 1, 1))
+        close_btn.bind(on_press=self.dismiss)
+        botones.add_widget(reset_btn)
+        botones.add_widget(close_btn)
+        layout.add_widget(botones)
+
+        self.refresh()
+        return layout
+
+    def refresh(self, *args):
+        self.report_label.text = self.db.dump_query_stats()
+
+    def reset(self, instance):
+        self.db.stats.reset()
+        self.refresh()
+
+class UsersScreen(BaseScreen):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.current_user_id = None
+        
+    def on_enter(self):
+        self.load_users()
+        app = App.get_running_app()
+        if app.current_user_role != 'admin':
+            self.disable_admin_actions()
+
+    def on_leave(self):
+        # Los usuarios se vuelven a cargar (desde la caché de lecturas) al entrar
+        if App.get_running_app().low_memory:
+            release_widgets(self.name, self.ids.users_container)
+    
+    def disable_admin_actions(self):
+        container = self.ids.users_container
+        for widget in container.walk():
+            if isinstance(widget, Button):
+                widget.disabled = True
+                widget.opacity = 0
+    
+    def load_users(self):
+        app = App.get_running_app()
+        users = app.db.get_all_users()
+        container = self.ids.users_container
+        container.clear_widgets()
+        
+        for user_id, user_data in users:
+            container.add_widget(Label(
+                text=str(user_id),
+                color=(0,0,0,1),
+                size_hint_y=None,
+                height='40dp'
+            ))
+            container.add_widget(Label(
+                text=str(user_data['username']),
+                color=(0,0,0,1),
+                size_hint_y=None,
+                height='40dp'
+            ))
+            container.add_widget(Label(
+                text=str(user_data['role']),
+                color=(0,0,0,1),
+                size_hint_y=None,
+                height='40dp'
+            ))
+            actions = BoxLayout(size_hint_y=None, height='40dp', spacing='10dp')
+            if user_id != 'admin':
+                edit_btn = MDIconButton(
+                    icon="pencil",
+                    theme_text_color="Custom",
+                    text_color=(0.2, 0.6, 1, 1),
+                    size_hint=(None, None),
+                    size=('40dp', '40dp')
+                )
+                edit_btn.bind(on_press=lambda x, uid=user_id: self.show_edit_popup(uid))
+                
+                delete_btn = MDIconButton(
+                    icon="delete",
+                    theme_text_color="Custom",
+                    text_color=(1, 0.2, 0.2, 1),
+                    size_hint=(None, None),
+                    size=('40dp', '40dp')
+                )
+                delete_btn.bind(on_press=lambda x, uid=user_id: self.delete_user(uid))
+                
+                actions.add_widget(edit_btn)
+                actions.add_widget(delete_btn)
+            container.add_widget(actions)
+
+    def show_query_stats(self):
+        app = App.get_running_app()
+        QueryStatsPopup(app.db).open()
+
+    def show_add_user_popup(self):
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+
+    def show_edit_popup(self, user_id):
+        app = App.get_running_app()
+        user_data = app.db.get_user_data(user_id)
+        if not user_data:
+            return
+
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        
+        username_input = TextInput(
+            text=user_data['username'],
+            hint_text='Nombre de Usuario',
+            multiline=False,
+            size_hint_y=None,
+            height='40dp'
+        )
+        
+        role_spinner = Spinner(
+            text=user_data['role'],
+            values=('admin', 'client'),
+            size_hint_y=None,
+            height='40dp'
+        )
+        
+        update_btn = Button(
+            text='Actualizar',
+            size_hint_y=None,
+            height='40dp',
+            background_color=(0.2, 0.6, 1, 1)
+        )
+        
+        content.add_widget(Label(text='Nombre de Usuario:'))
+        content.add_widget(username_input)
+        content.add_widget(Label(text='Rol:'))
+        content.add_widget(role_spinner)
+        content.add_widget(update_btn)
+
+        popup = Popup(
+            title=f'Editar Usuario: {user_id}',
+            content=content,
+            size_hint=(0.8, 0.8)
+        )
+
+        def update(instance):
+            app.db.update_user(
+                user_id,
+                username=username_input.text,
+                role=role_spinner.text
+            )
+            self.load_users()
+            popup.dismiss()
+
+        update_btn.bind(on_press=update)
+        popup.open()
+
+    def delete_user(self, user_id):
+        app = App.get_running_app()
+        if app.db.delete_user(user_id):
+            self.load_users()
+
+class DashboardScreen(BaseScreen):
+    """Tablero de ventas y stock; lee las vistas materializadas tal como están.
+
+    Las vistas las refresca el servidor periódicamente; el botón Actualizar
+    fuerza un refresco, como mucho uno cada REFRESCO_MINIMO segundos.
+    """
+    DIAS = 30
+    STOCK_MINIMO = 10
+    REFRESCO_MINIMO = 60
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._refreshing = False
+        self._last_refresh = None
+
+    def on_enter(self):
+        # Recalcular las vistas en cada apertura recorre todas las cotizaciones
+        self.load_dashboard()
+
+    def load_dashboard(self, *args):
+        app = App.get_running_app()
+        try:
+            tablero = app.db.get_dashboard(self.DIAS, self.STOCK_MINIMO)
+        except Exception as e:
+            self.show_error(str(e))
+            return
+
+        self._fill(self.ids.productos_container, [
+            (p['nombre'], str(p['unidades']), f"${p['ingresos']:,.0f}") for p in tablero['productos']
+        ])
+        self._fill(self.ids.vendedores_container, [
+            (v['username'], str(v['cotizaciones']), f"${v['ingresos']:,.0f}") for v in tablero['vendedores']
+        ])
+        self._fill(self.ids.stock_container, [
+            (p['nombre'], str(p['unidades'])) for p in tablero['stock_bajo']
+        ])
+
+    def _fill(self, container, filas):
+        container.clear_widgets()
+        for fila in filas:
+            for valor in fila:
+                container.add_widget(Label(
+                    text=valor,
+                    color=(0,0,0,1),
+                    size_hint_y=None,
+                    height='30dp'
+                ))
+
+    def refresh_in_background(self):
+        """REFRESH CONCURRENTLY en un hilo; al terminar se vuelve a leer el tablero"""
+        if self._refreshing:
+            return
+        if self._last_refresh is not None:
+            espera = self.REFRESCO_MINIMO - (time.monotonic() - self._last_refresh)
+            if espera > 0:
+                # Refrescado hace poco: solo se vuelve a leer
+                self.ids.estado_label.text = f"Actualizado hace poco (espere {espera:.0f} s)"
+                self.load_dashboard()
+                return
+        self._refreshing = True
+        self._last_refresh = time.monotonic()
+        self.ids.estado_label.text = 'Actualizando...'
+        app = App.get_running_app()
+
+        def refresh():
+            error = None
+            try:
+                app.db.refresh_dashboard()
+            except Exception as e:
+                error = str(e)
+            Clock.schedule_once(lambda dt: self._on_refreshed(error))
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _on_refreshed(self, error):
+        self._refreshing = False
+        if error:
+            self.ids.estado_label.text = 'No se pudo actualizar'
+            print(error)
+            return
+        self.ids.estado_label.text = f"Actualizado {datetime.now().strftime('%H:%M:%S')}"
+        if self.manager and self.manager.current == self.name:
+            self.load_dashboard()
@@ -0,0 +1,205 @@
+"""Cliente del servidor HTTP (api_server.py) con la misma interfaz que Database.
+
+La app lo usa en lugar de Database cuando COLVA_API_URL está definido; así
+las tabletas no abren conexiones directas a Postgres.
+"""
+import http.client
+import json
+import threading
+from datetime import datetime
+from decimal import Decimal
+from urllib.parse import urlparse, quote
+
+
+# Solicitudes POST que se pueden repetir sin efecto adicional; los demás POST
+# (descontar inventario, crear cotización, escrituras RPC) no se reintentan
+# porque si se perdió la respuesta la operación pudo haberse aplicado
+IDEMPOTENT_POSTS = {'/sesion', '/stats/reset'} | {
+    f'/rpc/{method}' for method in (
+        'get_user_role', 'get_user_data', 'get_all_users', 'check_stock',
+        'get_dashboard', 'search_clientes', 'refresh_dashboard',
+    )
+}
+
+
+class _RemoteStats:
+    def __init__(self, client):
+        self.client = client
+
+    def reset(self):
+        self.client._request('POST', '/stats/reset', {})
+
+
+class ApiDatabase:
+    def __init__(self, base_url, api_key=None, timeout=10):
+        url = urlparse(base_url)
+        self.scheme = url.scheme or 'http'
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        self.stats = _RemoteStats(self)
+        self._local = threading.local()
+        self._products_etag = None
+        self._products = []
+        self._session = None  # (token, id, rol) de validate_user
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _request(self, method, path, payload=None, headers=None):
+        """Enviar la solicitud reutilizando la conexión (keep-alive) del hilo"""
+        body = json.dumps(payload, default=float).encode('utf-8') if payload is not None else None
+        headers = dict(headers or {})
+        headers['Content-Type'] = 'application/json'
+        if self.api_key:
+            headers['X-Api-Key'] = self.api_key
+        if self._session:
+            headers['X-Session'] = self._session[0]
+
+        reintentable = method == 'GET' or path in IDEMPOTENT_POSTS
+        for intento in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # La conexión reutilizada pudo cerrarse del lado del servidor
+                conn.close()
+                self._local.conn = None
+                if intento or not reintentable:
+                    raise Exception("No se pudo conectar con el servidor")
+
+        result = json.loads(data, parse_float=Decimal) if data else None
+        if response.status >= 400:
+            raise Exception((result or {}).get('error', f'Error HTTP {response.status}'))
+        return response.status, response.getheader('ETag'), result
+
+    def _rpc(self, method, *args, **kwargs):
+        _, _, result = self._request('POST', f'/rpc/{method}', {'args': args, 'kwargs': kwargs})
+        return result['result']
+
+    def initialize_database(self):
+        """El servidor se encarga de crear las tablas"""
+
+    def get_query_stats(self):
+        return self._request('GET', '/stats')[2]
+
+    def dump_query_stats(self):
+        return self._request('GET', '/stats?formato=texto')[2]['report']
+
+    def get_all_products(self):
+        try:
+            headers = {'If-None-Match': self._products_etag} if self._products_etag else {}
+            status, etag, result = self._request('GET', '/productos', headers=headers)
+            if status != 304:
+                self._products = result
+                self._products_etag = etag
+            # Copias: las pantallas modifican los diccionarios que reciben
+            return [dict(p) for p in self._products]
+        except Exception as e:
+            print(f"Error obteniendo productos: {str(e)}")
+            return []
+
+    def get_product_changes_since(self, version=0):
+        return self._request('GET', f'/productos/cambios?desde={int(version)}')[2]
+
+    def get_products_changed_since(self, ts=None):
+        if ts is None:
+            result = self._request('GET', '/productos/cambios?completo=1')[2]
+        else:
+            result = self._request('GET', f'/productos/cambios?desde_fecha={quote(ts.isoformat())}')[2]
+        result['timestamp'] = datetime.fromisoformat(result['timestamp'])
+        return result
+
+    def create_cotizacion_with_details(self, usuario_id, cliente_data, valores, detalles_ambientes):
+        # El servidor toma el vendedor de la sesión; usuario_id se acepta por compatibilidad con Database
+        try:
+            _, _, result = self._request('POST', '/cotizaciones', {
+                'cliente_data': cliente_data,
+                'valores': valores,
+                'detalles_ambientes': detalles_ambientes
+            })
+            return result['id']
+        except Exception as e:
+            raise Exception(f"Error creando cotización: {str(e)}")
+
+    def decrement_products(self, cantidades, usuario_id=None, cotizacion_id=None):
+        # El servidor toma el vendedor de la sesión; usuario_id se acepta por compatibilidad con Database
+        _, _, result = self._request('POST', '/inventario/descontar', {
+            'items': [{'nombre': nombre, 'cantidad': cantidad} for nombre, cantidad in cantidades.items()],
+            'cotizacion_id': cotizacion_id
+        })
+        return result
+
+    def decrement_product_units(self, nombre, cantidad, usuario_id=None, cotizacion_id=None):
+        result = self.decrement_products({nombre: cantidad}, usuario_id, cotizacion_id)
+        if nombre in result['rechazados']:
+            raise Exception(f"Error descontando unidades: {result['rechazados'][nombre]}")
+        return result['unidades'][nombre]
+
+    def validate_user(self, id_number, password):
+        """Abrir una sesión en el servidor; las operaciones siguientes la usan"""
+        self._session = None
+        _, _, result = self._request('POST', '/sesion', {
+            'id_number': id_number, 'password': password
+        })
+        if not result['token']:
+            return False
+        self._session = (result['token'], str(id_number), result['role'])
+        return True
+
+    def get_user_role(self, id_number):
+        if self._session and self._session[1] == str(id_number):
+            return self._session[2]
+        return self._rpc('get_user_role', id_number)
+
+    def get_user_data(self, id_number):
+        return self._rpc('get_user_data', id_number)
+
+    def get_all_users(self):
+        return [tuple(user) for user in self._rpc('get_all_users')]
+
+    def add_user(self, id_number, username, password, role='client'):
+        return self._rpc('add_user', id_number, username, password, role)
+
+    def update_user(self, id_number, username=None, password=None, role=None):
+        return self._rpc('update_user', id_number, username=username, password=password, role=role)
+
+    def delete_user(self, id_number):
+        return self._rpc('delete_user', id_number)
+
+    def add_product(self, nombre, unidades, costo):
+        return self._rpc('add_product', nombre, unidades, costo)
+
+    def update_product_units(self, nombre, nuevas_unidades):
+        return self._rpc('update_product_units', nombre, nuevas_unidades)
+
+    def restock_product(self, nombre, unidades, usuario_id=None):
+        return self._rpc('restock_product', nombre, unidades, usuario_id)
+
+    def delete_product(self, nombre):
+        return self._rpc('delete_product', nombre)
+
+    def check_stock(self, nombre, cantidad):
+        return self._rpc('check_stock', nombre, cantidad)
+
+    def get_dashboard(self, dias=30, stock_minimo=10, limite=10):
+        return self._rpc('get_dashboard', dias, stock_minimo, limite)
+
+    def refresh_dashboard(self):
+        return self._rpc('refresh_dashboard')
+
+    def search_clientes(self, prefijo, tipo_doc=None, limite=8):
+        try:
+            return self._rpc('search_clientes', prefijo, tipo_doc, limite)
+        except Exception as e:
+            print(f"Error buscando clientes: {str(e)}")
+            return []
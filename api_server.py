@@ -0,0 +1,416 @@
+"""Servidor HTTP liviano que expone las operaciones de Database a las tabletas.
+
+Mantiene un pool de conexiones a Postgres compartido por todos los
+dispositivos y cachea el listado de productos (con ETag). Las tabletas lo
+usan definiendo COLVA_API_URL (ver api_client.ApiDatabase).
+
+Todas las rutas exigen la clave COLVA_API_KEY (encabezado X-Api-Key); sin ella
+el servidor solo acepta escuchar en la interfaz local. Las cotizaciones, el
+inventario y los métodos RPC que no son públicos exigen además una sesión
+(encabezado X-Session, obtenido en POST /sesion); la administración de
+usuarios, productos y el tablero, una sesión de administrador.
+
+Rutas:
+    POST /sesion                  {id_number, password} -> {token, role} (token nulo si no son válidas)
+    GET  /productos               listado de productos (ETag / If-None-Match)
+    GET  /productos/cambios       cambios desde ?desde=<version> (sincronización incremental),
+                                  ?desde_fecha=<ISO 8601> (por updated_at) o ?completo=1
+    POST /cotizaciones            {cliente_data, valores, detalles_ambientes} (vendedor de la sesión)
+    POST /inventario/descontar    {items: [{nombre, cantidad}], cotizacion_id} -> {unidades, rechazados}
+                                  (vendedor de la sesión; todo en una transacción)
+    GET  /stats                   métricas de consultas (?formato=texto)
+    POST /stats/reset
+    POST /rpc/<método>            {args: [...], kwargs: {...}} para el resto de métodos
+
+Uso: COLVA_API_KEY=... python api_server.py --host 0.0.0.0 --port 8080 --pool 10
+"""
+import argparse
+import hashlib
+import ipaddress
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from database import Database
+
+# Métodos de Database accesibles por /rpc/<método>
+RPC_METHODS = {
+    'get_user_role', 'get_user_data', 'get_all_users',
+    'add_user', 'update_user', 'delete_user',
+    'add_product', 'update_product_units', 'restock_product', 'delete_product', 'check_stock',
+    'get_dashboard', 'refresh_dashboard', 'search_clientes',
+}
+
+# Sin sesión solo se permite el registro (add_user con rol 'client')
+PUBLIC_METHODS = {'add_user'}
+
+# Solo para sesiones de administrador
+ADMIN_METHODS = {
+    'get_user_data', 'get_all_users', 'update_user', 'delete_user',
+    'add_product', 'update_product_units', 'restock_product', 'delete_product',
+    'get_dashboard', 'refresh_dashboard',
+}
+
+# Duración de una sesión (s)
+SESSION_TTL = 12 * 3600
+
+# Métodos que modifican productos y obligan a invalidar el listado cacheado
+PRODUCT_WRITES = {'add_product', 'update_product_units', 'restock_product', 'delete_product'}
+
+
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(data):
+    return json.dumps(data, default=json_default, ensure_ascii=False).encode('utf-8')
+
+
+def without_password(result):
+    """Nunca devolver la columna password, venga del método que venga"""
+    if isinstance(result, dict):
+        return {k: v for k, v in result.items() if k != 'password'}
+    if isinstance(result, list):
+        return [without_password(r) for r in result]
+    return result
+
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def int_keys(detalles_ambientes):
+    """JSON convierte las claves en texto; Database espera enteros"""
+    return {
+        int(ambiente): {int(producto_id): detalle for producto_id, detalle in productos.items()}
+        for ambiente, productos in detalles_ambientes.items()
+    }
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, db, cache_ttl=5, api_key=None):
+        super().__init__(address, ApiHandler)
+        self.db = db
+        self.cache_ttl = cache_ttl
+        self.api_key = api_key
+        self._products = None  # (etag, body, expira)
+        self._products_lock = threading.Lock()
+        self._sessions = {}  # token -> {'user_id', 'role', 'expira'}
+        self._sessions_lock = threading.Lock()
+
+    def open_session(self, id_number, password):
+        """Token de sesión si las credenciales son válidas, o None"""
+        if not self.db.validate_user(id_number, password):
+            return None
+        role = self.db.get_user_role(id_number)
+        token = secrets.token_urlsafe(32)
+        with self._sessions_lock:
+            self._sessions[token] = {
+                'user_id': str(id_number),
+                'role': role,
+                'expira': time.monotonic() + SESSION_TTL
+            }
+        return token, role
+
+    def session(self, token):
+        if not token:
+            return None
+        with self._sessions_lock:
+            sesion = self._sessions.get(token)
+            if sesion and sesion['expira'] <= time.monotonic():
+                del self._sessions[token]
+                sesion = None
+            return sesion
+
+    def drop_sessions(self, user_id):
+        """Cerrar las sesiones de un usuario modificado o eliminado (su rol pudo cambiar)"""
+        with self._sessions_lock:
+            for token in [t for t, s in self._sessions.items() if s['user_id'] == str(user_id)]:
+                del self._sessions[token]
+
+    def products_response(self):
+        """Listado cacheado; al vencer el TTL solo se relee si cambió la versión del catálogo.
+
+        Si la versión no es confiable en ese momento (escrituras confirmadas fuera
+        de orden) se relee el listado y el ETag es un hash del contenido.
+        """
+        with self._products_lock:
+            ahora = time.monotonic()
+            if self._products and self._products[2] > ahora:
+                return self._products[:2]
+            version = self.db.get_catalog_version()
+            etag = f'"v{version}"' if version is not None else None
+            if etag and self._products and self._products[0] == etag:
+                body = self._products[1]
+            else:
+                # Del primario y después de la versión: nunca más antiguo que el ETag
+                body = dumps(self.db.get_catalog())
+                if etag is None:
+                    etag = f'"h{hashlib.sha256(body).hexdigest()[:32]}"'
+            self._products = (etag, body, ahora + self.cache_ttl)
+            return etag, body
+
+    def invalidate_products(self):
+        with self._products_lock:
+            self._products = None
+
+    def start_dashboard_refresh(self, interval):
+        """Refrescar las vistas del tablero cada `interval` segundos en un hilo aparte"""
+        def loop():
+            while True:
+                try:
+                    self.db.refresh_dashboard()
+                except Exception as e:
+                    print(str(e))
+                time.sleep(interval)
+
+        threading.Thread(target=loop, name='dashboard-refresh', daemon=True).start()
+
+    def start_partition_maintenance(self, interval=24 * 3600):
+        """Crear las particiones de los meses siguientes mientras el servidor siga en marcha"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    creados = self.db.ensure_cotizacion_partitions()
+                    if creados:
+                        print(f"Particiones de cotizaciones creadas: {', '.join(creados)}")
+                except Exception as e:
+                    print(str(e))
+
+        threading.Thread(target=loop, name='partition-maintenance', daemon=True).start()
+
+    def start_inventory_snapshots(self, interval):
+        """Guardar fotos del inventario y conciliarlas cada `interval` segundos"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.db.snapshot_inventory()
+                    for fila in self.db.reconcile_inventory():
+                        print(f"Inventario descuadrado: {fila}")
+                except Exception as e:
+                    print(str(e))
+
+        threading.Thread(target=loop, name='inventory-snapshots', daemon=True).start()
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_json(self, status, data):
+        self._send(status, dumps(data))
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length), parse_float=Decimal)
+
+    def _authorized(self):
+        api_key = self.server.api_key
+        if api_key and self.headers.get('X-Api-Key') != api_key:
+            self._send_json(401, {'error': 'No autorizado'})
+            return False
+        return True
+
+    def _session(self, admin=False):
+        """Sesión del encabezado X-Session; si falta (o no es de admin) responde y devuelve None"""
+        sesion = self.server.session(self.headers.get('X-Session'))
+        if sesion is None:
+            self._send_json(401, {'error': 'Inicie sesión'})
+            return None
+        if admin and sesion['role'] != 'admin':
+            self._send_json(403, {'error': 'Solo para administradores'})
+            return None
+        return sesion
+
+    def do_GET(self):
+        # Leer lo escrito se decide por sesión: las escrituras de un vendedor no
+        # desvían al primario las lecturas de los demás
+        with self.server.db.read_session(self.headers.get('X-Session')):
+            self._do_get()
+
+    def do_POST(self):
+        with self.server.db.read_session(self.headers.get('X-Session')):
+            self._do_post()
+
+    def _do_get(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        try:
+            if url.path == '/productos':
+                etag, body = self.server.products_response()
+                if self.headers.get('If-None-Match') == etag:
+                    self._send(304, headers={'ETag': etag})
+                else:
+                    self._send(200, body, headers={'ETag': etag})
+            elif url.path == '/productos/cambios':
+                query = parse_qs(url.query)
+                if 'desde_fecha' in query:
+                    desde = datetime.fromisoformat(query['desde_fecha'][0])
+                    self._send_json(200, self.server.db.get_products_changed_since(desde))
+                elif query.get('completo') == ['1']:
+                    self._send_json(200, self.server.db.get_products_changed_since(None))
+                else:
+                    desde = int(query.get('desde', ['0'])[0])
+                    self._send_json(200, self.server.db.get_product_changes_since(desde))
+            elif url.path == '/stats/replicas':
+                self._send_json(200, {
+                    'replicas': self.server.db.replica_status(),
+                    'circuit': self.server.db.circuit_status()
+                })
+            elif url.path == '/stats':
+                if parse_qs(url.query).get('formato') == ['texto']:
+                    self._send_json(200, {'report': self.server.db.dump_query_stats()})
+                else:
+                    self._send_json(200, self.server.db.get_query_stats())
+            else:
+                self._send_json(404, {'error': f'Ruta no encontrada: {url.path}'})
+        except ValueError as e:
+            self._send_json(400, {'error': f'Solicitud inválida: {str(e)}'})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+
+    def _do_post(self):
+        if not self._authorized():
+            return
+        path = urlparse(self.path).path
+        db = self.server.db
+        try:
+            payload = self._read_json()
+            if path == '/sesion':
+                # Credenciales inválidas no son un error de la solicitud: token nulo
+                sesion = self.server.open_session(payload['id_number'], payload['password'])
+                token, role = sesion or (None, None)
+                self._send_json(200, {'token': token, 'role': role})
+            elif path == '/cotizaciones':
+                sesion = self._session()
+                if not sesion:
+                    return
+                # El vendedor es el de la sesión; el usuario_id del cuerpo se ignora
+                cotizacion_id = db.create_cotizacion_with_details(
+                    int(sesion['user_id']),
+                    payload['cliente_data'],
+                    payload['valores'],
+                    int_keys(payload['detalles_ambientes'])
+                )
+                self._send_json(201, {'id': cotizacion_id})
+            elif path == '/inventario/descontar':
+                sesion = self._session()
+                if not sesion:
+                    return
+                cotizacion_id = payload.get('cotizacion_id')
+                cantidades = {}
+                for item in payload['items']:
+                    if item['nombre'] in cantidades:
+                        raise ValueError(f"Producto repetido: {item['nombre']}")
+                    cantidades[item['nombre']] = item['cantidad']
+                try:
+                    # Una sola transacción: o se aplica el lote o nada, y la respuesta
+                    # dice qué productos no tenían stock
+                    resultado = db.decrement_products(
+                        cantidades,
+                        usuario_id=int(sesion['user_id']),
+                        cotizacion_id=int(cotizacion_id) if cotizacion_id is not None else None
+                    )
+                finally:
+                    self.server.invalidate_products()
+                self._send_json(200, resultado)
+            elif path == '/stats/reset':
+                if not self._session(admin=True):
+                    return
+                db.stats.reset()
+                self._send_json(200, {})
+            elif path.startswith('/rpc/'):
+                method = path[len('/rpc/'):]
+                if method not in RPC_METHODS:
+                    self._send_json(404, {'error': f'Método no disponible: {method}'})
+                    return
+                args = payload.get('args', [])
+                kwargs = payload.get('kwargs', {})
+                if method == 'add_user':
+                    # El registro abierto solo crea vendedores; otros roles requieren admin
+                    role = kwargs.get('role', args[3] if len(args) > 3 else 'client')
+                    if role != 'client' and not self._session(admin=True):
+                        return
+                elif method not in PUBLIC_METHODS and not self._session(admin=method in ADMIN_METHODS):
+                    return
+                result = getattr(db, method)(*args, **kwargs)
+                if method in PRODUCT_WRITES:
+                    self.server.invalidate_products()
+                if method in ('update_user', 'delete_user'):
+                    self.server.drop_sessions(args[0] if args else kwargs.get('id_number'))
+                self._send_json(200, {'result': without_password(result)})
+            else:
+                self._send_json(404, {'error': f'Ruta no encontrada: {path}'})
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(400, {'error': f'Solicitud inválida: {str(e)}'})
+        except Exception as e:
+            self._send_json(400, {'error': str(e)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor HTTP de la base de datos de Colva APP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--pool', type=int, default=10, help="Conexiones máximas a Postgres")
+    parser.add_argument('--cache-ttl', type=float, default=5,
+                        help="Segundos que se reutiliza el listado de productos")
+    parser.add_argument('--dashboard-refresh', type=float, default=300,
+                        help="Segundos entre actualizaciones del tablero (0 para desactivar)")
+    parser.add_argument('--inventory-snapshot', type=float, default=600,
+                        help="Segundos entre fotos y conciliación del inventario (0 para desactivar)")
+    args = parser.parse_args()
+
+    api_key = os.getenv('COLVA_API_KEY')
+    if not api_key and not is_loopback(args.host):
+        parser.error("Defina COLVA_API_KEY para escuchar fuera de la interfaz local")
+
+    db = Database(pool_size=args.pool)
+    db.migrate_database()
+    server = ApiServer((args.host, args.port), db, args.cache_ttl, api_key)
+    if args.dashboard_refresh > 0:
+        server.start_dashboard_refresh(args.dashboard_refresh)
+    server.start_partition_maintenance()
+    if args.inventory_snapshot > 0:
+        server.start_inventory_snapshots(args.inventory_snapshot)
+    print(f"Servidor escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
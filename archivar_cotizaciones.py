@@ -0,0 +1,49 @@
+"""Archivar los meses antiguos de cotizaciones (particiones mensuales).
+
+Las particiones de meses anteriores a --antes-de se separan de las tablas
+cotizaciones y cotizacion_detalles y se mueven al esquema 'archivo' (o se
+eliminan con --eliminar). La aplicación deja de verlas en el historial.
+
+Ejemplos:
+    python archivar_cotizaciones.py --antes-de 2024-01
+    python archivar_cotizaciones.py --antes-de 2023-01 --eliminar
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from database import Database
+
+
+def parse_mes(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Mes inválido (use AAAA-MM): {valor}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archivar particiones antiguas de cotizaciones")
+    parser.add_argument('--antes-de', type=parse_mes, required=True,
+                        help="Primer mes que se conserva, AAAA-MM")
+    parser.add_argument('--eliminar', action='store_true',
+                        help="Eliminar las particiones en lugar de moverlas al esquema de archivo")
+    parser.add_argument('--esquema', default='archivo', help="Esquema de destino")
+    args = parser.parse_args(argv)
+
+    try:
+        meses = Database().archive_cotizaciones(args.antes_de, args.eliminar, args.esquema)
+    except Exception as e:
+        print(f"❌ {str(e)}")
+        return 1
+
+    if not meses:
+        print("No hay particiones anteriores a esa fecha")
+        return 0
+    destino = 'eliminadas' if args.eliminar else f"movidas al esquema {args.esquema}"
+    print(f"✅ {len(meses)} particiones {destino}: {', '.join(meses)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
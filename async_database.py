@@ -0,0 +1,518 @@
+"""Variante asíncrona de Database sobre asyncpg, para servicios del lado del servidor.
+
+Expone los mismos métodos que database.Database (como corrutinas) y usa su
+propio pool de conexiones, de modo que un solo proceso puede atender cientos
+de operaciones concurrentes. Requiere el paquete asyncpg, que no forma parte
+de las dependencias de la app móvil.
+
+Las sentencias SQL son las de database.py: aquí solo se cambian los marcadores
+%s de psycopg2 por $1, $2... de asyncpg. Los reintentos y el cortacircuitos
+siguen las mismas reglas que Database; las lecturas van siempre al primario.
+
+Ejemplo:
+    db = AsyncDatabase()
+    await db.connect()
+    productos = await db.get_all_products()
+    await db.close()
+"""
+import asyncio
+import functools
+import itertools
+import re
+import time
+
+import asyncpg
+
+from database import (
+    AJUSTE_CANTIDAD, CALL_DEADLINE, CATALOG_VERSION_SELECT, CLIENTES_SEARCH, COTIZACION_CANTIDAD,
+    COTIZACION_INSERT, COTIZACION_SELECT, DASHBOARD_PRODUCTOS_SELECT, DASHBOARD_VENDEDORES_SELECT,
+    DASHBOARD_VIEWS, DB_CONFIG, DB_RETRIES, DESCUENTO_INSERT, DESCUENTO_LOCK, DETALLE_INSERT,
+    DETALLES_SELECT, IDEMPOTENT_METHODS,
+    MOVIMIENTO_LOCK, PRODUCT_CHANGES_SELECT, PRODUCTO_DELETE, PRODUCTO_INSERT, PRODUCTOS_ELIMINADOS_SELECT,
+    PRODUCTOS_SELECT, PRODUCTS_CHANGED_SELECT, REPOSICION_CANTIDAD, SLOW_QUERY_MS, STATEMENT_TIMEOUT_MS,
+    STOCK_BAJO_SELECT, STOCK_SELECT, TIMESTAMP_WATERMARK_SELECT, USUARIO_DELETE, USUARIO_INSERT,
+    USUARIO_PASSWORD_SELECT, USUARIO_ROL_SELECT, USUARIO_SELECT, USUARIOS_SELECT, VERSION_WATERMARK_SELECT,
+    _TransientError, _cliente_data, _clientes_search_params, _cotizacion_params, _cotizaciones_filter,
+    _cotizaciones_with_details, _descuento_params, _descuento_resultado, _detalle_params, _movimiento_insert,
+    _stable_catalog_version, _usuario_update,
+    _without_deleted_at
+)
+from db_resilience import CircuitBreaker, DatabaseUnavailableError, backoff_delays
+from query_stats import QueryStats
+
+
+@functools.lru_cache(maxsize=None)
+def _dollar(query):
+    """Sentencia de database.py con los marcadores %s como $1, $2... (y %% como %)"""
+    numeros = itertools.count(1)
+    return re.sub(r'%([s%])', lambda m: f'${next(numeros)}' if m.group(1) == 's' else '%', query)
+
+
+def _status_rows(status):
+    # El estado tiene la forma "UPDATE 3" / "INSERT 0 1"
+    last = status.split()[-1]
+    return int(last) if last.isdigit() else 0
+
+
+class AsyncDatabase:
+    def __init__(self, config=None, min_size=2, max_size=20, slow_query_ms=SLOW_QUERY_MS):
+        self.config = config or DB_CONFIG
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = None
+        self.stats = QueryStats(slow_query_ms)
+        self.breaker = CircuitBreaker()
+
+    async def connect(self):
+        config = self.config
+        sslmode = config.get('sslmode', 'prefer')
+        self.pool = await asyncpg.create_pool(
+            host=config['host'],
+            port=config['port'],
+            user=config['user'],
+            password=config['password'],
+            database=config['database'],
+            ssl=False if sslmode == 'disable' else sslmode,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            timeout=config.get('connect_timeout', 5),
+            command_timeout=STATEMENT_TIMEOUT_MS / 1000,
+            # El pooler de Supabase (pgbouncer en modo transacción) no admite sentencias preparadas
+            statement_cache_size=0 if 'pooler' in (config['host'] or '') else 100
+        )
+        return self
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def get_query_stats(self):
+        return self.stats.snapshot()
+
+    def dump_query_stats(self):
+        return self.stats.report()
+
+    def circuit_status(self):
+        return self.breaker.status()
+
+    async def _execute_query(self, caller, query, *params, fetch=False):
+        sql = _dollar(query)
+
+        async def consulta(conn):
+            if fetch:
+                result = [dict(row) for row in await conn.fetch(sql, *params)]
+                return result, len(result)
+            result = _status_rows(await conn.execute(sql, *params))
+            return result, result
+
+        return await self._run(caller, query, params, consulta)
+
+    async def _run(self, caller, query, params, work):
+        """Ejecutar `work(conn)` con el cortacircuitos y los reintentos de Database._execute_query"""
+        try:
+            self.breaker.before_call()
+        except DatabaseUnavailableError:
+            self.stats.record_event(caller, 'rejected')
+            raise
+
+        limite = time.monotonic() + CALL_DEADLINE
+        esperas = backoff_delays(DB_RETRIES)
+        while True:
+            try:
+                result = await self._run_once(caller, query, params, work)
+            except _TransientError as e:
+                espera = next(esperas, None)
+                if (espera is None or time.monotonic() + espera >= limite
+                        or (e.sent and caller not in IDEMPOTENT_METHODS)):
+                    self.breaker.record_failure()
+                    raise Exception(f"No se pudo conectar con la base de datos: {str(e)}")
+                self.stats.record_event(caller, 'retries')
+                await asyncio.sleep(espera)
+                continue
+            except Exception:
+                # Error de datos o de la consulta: el servidor respondió
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def _run_once(self, caller, query, params, work):
+        """Un intento: `work(conn)` devuelve (resultado, filas)"""
+        connect_ms = execute_ms = 0.0
+        rows = 0
+        error = False
+        sent = False
+        inicio = time.perf_counter()
+        try:
+            async with self.pool.acquire() as conn:
+                connect_ms = (time.perf_counter() - inicio) * 1000
+                inicio = time.perf_counter()
+                sent = True
+                result, rows = await work(conn)
+                execute_ms = (time.perf_counter() - inicio) * 1000
+                return result
+        except asyncpg.IntegrityConstraintViolationError as e:
+            error = True
+            if isinstance(e, asyncpg.UniqueViolationError):
+                if 'usuarios' in (e.constraint_name or ''):
+                    raise Exception("Ya existe un usuario con este número de identificación")
+                raise Exception("Ya existe un producto con ese nombre")
+            if isinstance(e, asyncpg.CheckViolationError):
+                raise Exception("Valor fuera de rango permitido")
+            raise Exception(f"Error de integridad: {str(e)}")
+        except (asyncpg.QueryCanceledError, asyncio.TimeoutError) as e:
+            error = True
+            if not sent:
+                # Sin conexión libre o sin respuesta al conectar
+                raise _TransientError(e, sent)
+            self.stats.record_event(caller, 'timeouts')
+            raise Exception(f"La consulta superó el tiempo límite: {str(e)}")
+        except (OSError, asyncpg.PostgresConnectionError) as e:
+            error = True
+            raise _TransientError(e, sent)
+        except asyncpg.PostgresError as e:
+            error = True
+            raise Exception(f"Error en la base de datos: {str(e)}")
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.stats.record(caller, query, params, connect_ms, execute_ms, 0.0, rows, error)
+
+    async def validate_user(self, id_number, password):
+        users = await self._execute_query(
+            'validate_user', USUARIO_PASSWORD_SELECT, int(id_number), fetch=True
+        )
+        return bool(users) and users[0]['password'] == password
+
+    async def get_user_role(self, id_number):
+        users = await self._execute_query(
+            'get_user_role', USUARIO_ROL_SELECT, int(id_number), fetch=True
+        )
+        return users[0]['role'] if users else None
+
+    async def get_user_data(self, id_number):
+        users = await self._execute_query(
+            'get_user_data', USUARIO_SELECT, int(id_number), fetch=True
+        )
+        return users[0] if users else None
+
+    async def get_all_users(self):
+        users = await self._execute_query('get_all_users', USUARIOS_SELECT, fetch=True)
+        return [(str(user['id']), {
+            'username': user['username'],
+            'role': user['role']
+        }) for user in users]
+
+    async def get_all_products(self):
+        try:
+            return await self._execute_query('get_all_products', PRODUCTOS_SELECT, fetch=True)
+        except Exception as e:
+            print(f"Error obteniendo productos: {str(e)}")
+            return []
+
+    async def get_catalog(self):
+        return await self._execute_query('get_catalog', PRODUCTOS_SELECT, fetch=True)
+
+    async def get_catalog_version(self):
+        result = await self._execute_query('get_catalog_version', CATALOG_VERSION_SELECT, fetch=True)
+        return _stable_catalog_version(result[0])
+
+    async def get_product_changes_since(self, version=0):
+        try:
+            marca = (await self._execute_query(
+                'get_product_changes_since', VERSION_WATERMARK_SELECT, fetch=True
+            ))[0]['version']
+            rows = await self._execute_query(
+                'get_product_changes_since', PRODUCT_CHANGES_SELECT, version, version, fetch=True
+            )
+            deleted = await self._execute_query(
+                'get_product_changes_since', PRODUCTOS_ELIMINADOS_SELECT, version, fetch=True
+            )
+            return {
+                'version': marca,
+                'changed': [_without_deleted_at(row) for row in rows if row['deleted_at'] is None],
+                'deleted': [row['id'] for row in rows if row['deleted_at'] is not None]
+                           + [row['producto_id'] for row in deleted]
+            }
+        except Exception as e:
+            raise Exception(f"Error obteniendo cambios del catálogo: {str(e)}")
+
+    async def get_products_changed_since(self, ts=None):
+        """Ver Database.get_products_changed_since"""
+        try:
+            marca = (await self._execute_query(
+                'get_products_changed_since', TIMESTAMP_WATERMARK_SELECT, fetch=True
+            ))[0]
+            if not marca['permitido']:
+                raise Exception("se requiere el rol pg_read_all_stats; use get_product_changes_since")
+
+            if ts is None:
+                cambios = await self.get_product_changes_since(0)
+                return {'timestamp': marca['ts'], 'changed': cambios['changed'], 'deleted': []}
+
+            rows = await self._execute_query(
+                'get_products_changed_since', PRODUCTS_CHANGED_SELECT, ts, ts, fetch=True
+            )
+            return {
+                'timestamp': marca['ts'],
+                'changed': [_without_deleted_at(row) for row in rows if row['deleted_at'] is None],
+                'deleted': [row['id'] for row in rows if row['deleted_at'] is not None]
+            }
+        except Exception as e:
+            raise Exception(f"Error obteniendo cambios del catálogo: {str(e)}")
+
+    async def delete_product(self, nombre):
+        try:
+            result = await self._execute_query('delete_product', PRODUCTO_DELETE, nombre, fetch=True)
+            if not result:
+                raise Exception(f"No se encontró el producto: {nombre}")
+            return result[0]['id']
+        except Exception as e:
+            raise Exception(f"Error eliminando producto: {str(e)}")
+
+    async def add_product(self, nombre, unidades, costo):
+        try:
+            if not nombre or not nombre.strip():
+                raise ValueError("El nombre no puede estar vacío")
+            try:
+                unidades = int(unidades)
+                if unidades < 0:
+                    raise ValueError
+            except (ValueError, TypeError):
+                raise ValueError("Las unidades deben ser un número entero positivo")
+            try:
+                costo = float(costo)
+                if costo <= 0 or costo >= 1e13:
+                    raise ValueError
+            except (ValueError, TypeError):
+                raise ValueError("El costo debe ser un número válido")
+
+            result = await self._execute_query(
+                'add_product', PRODUCTO_INSERT, nombre.strip(), unidades, costo, unidades, fetch=True
+            )
+            if result:
+                return result[0]['id']
+            raise Exception("Ya existe un producto con ese nombre")
+        except Exception as e:
+            raise Exception(f"Error agregando producto: {str(e)}")
+
+    async def _append_movement(self, caller, nombre, tipo, cantidad_sql, params, usuario_id=None,
+                               cotizacion_id=None):
+        """Registrar un movimiento con el producto bloqueado (ver Database._append_movement)"""
+        query = _movimiento_insert(cantidad_sql)
+
+        async def movimiento(conn):
+            async with conn.transaction():
+                await conn.execute(_dollar(MOVIMIENTO_LOCK), nombre)
+                row = await conn.fetchrow(
+                    _dollar(query), nombre, tipo, *params, usuario_id, cotizacion_id, *params
+                )
+            if row is None:
+                raise Exception(f"No se encontró el producto: {nombre}")
+            return dict(row), 1
+
+        return await self._run(caller, query, None, movimiento)
+
+    async def update_product_units(self, nombre, nuevas_unidades):
+        try:
+            try:
+                nuevas_unidades = int(nuevas_unidades)
+                if nuevas_unidades < 0:
+                    raise ValueError
+            except ValueError:
+                raise ValueError("Las unidades deben ser un número entero positivo")
+
+            result = await self._append_movement(
+                'update_product_units', nombre, 'ajuste', AJUSTE_CANTIDAD, (nuevas_unidades,)
+            )
+            return result['unidades']
+        except Exception as e:
+            raise Exception(f"Error actualizando unidades: {str(e)}")
+
+    async def restock_product(self, nombre, unidades, usuario_id=None):
+        try:
+            unidades = int(unidades)
+            if unidades <= 0:
+                raise ValueError("Las unidades deben ser un número entero positivo")
+            result = await self._append_movement(
+                'restock_product', nombre, 'reposicion', REPOSICION_CANTIDAD, (unidades,), usuario_id
+            )
+            return result['unidades']
+        except Exception as e:
+            raise Exception(f"Error reponiendo unidades: {str(e)}")
+
+    async def decrement_product_units(self, nombre, cantidad, usuario_id=None, cotizacion_id=None):
+        try:
+            cantidad = int(cantidad)
+            if cantidad <= 0:
+                raise ValueError("La cantidad debe ser un número entero positivo")
+            result = await self._append_movement(
+                'decrement_product_units', nombre, 'cotizacion', COTIZACION_CANTIDAD, (cantidad,),
+                usuario_id, cotizacion_id
+            )
+            if not result['aplicado']:
+                raise Exception(f"Stock insuficiente: {nombre}")
+            return result['unidades']
+        except Exception as e:
+            raise Exception(f"Error descontando unidades: {str(e)}")
+
+    async def decrement_products(self, cantidades, usuario_id=None, cotizacion_id=None):
+        """Ver Database.decrement_products"""
+        try:
+            if not cantidades:
+                return {'unidades': {}, 'rechazados': {}}
+            nombres, valores = _descuento_params(cantidades)
+
+            async def descuento(conn):
+                async with conn.transaction():
+                    await conn.execute(_dollar(DESCUENTO_LOCK), nombres)
+                    rows = await conn.fetch(
+                        _dollar(DESCUENTO_INSERT), nombres, valores, usuario_id, cotizacion_id
+                    )
+                return _descuento_resultado(cantidades, rows), len(rows)
+
+            return await self._run('decrement_products', DESCUENTO_INSERT, None, descuento)
+        except Exception as e:
+            raise Exception(f"Error descontando unidades: {str(e)}")
+
+    async def check_stock(self, nombre, cantidad):
+        try:
+            result = await self._execute_query('check_stock', STOCK_SELECT, nombre, fetch=True)
+            if not result:
+                raise Exception(f"Producto no encontrado: {nombre}")
+            return result[0]['unidades'] >= int(cantidad)
+        except Exception as e:
+            print(f"Error verificando stock: {str(e)}")
+            return False
+
+    async def update_user(self, id_number, username=None, password=None, role=None):
+        try:
+            update = _usuario_update(int(id_number), username, password, role)
+            if update is None:
+                return True
+
+            query, params = update
+            result = await self._execute_query('update_user', query, *params, fetch=True)
+            if not result:
+                raise Exception("Usuario no encontrado")
+            return result[0]
+        except Exception as e:
+            raise Exception(f"Error actualizando usuario: {str(e)}")
+
+    async def delete_user(self, id_number):
+        try:
+            if str(id_number) == 'admin':
+                raise ValueError("No se puede eliminar el usuario administrador")
+            result = await self._execute_query('delete_user', USUARIO_DELETE, int(id_number), fetch=True)
+            if not result:
+                raise Exception("Usuario no encontrado")
+            return True
+        except Exception as e:
+            raise Exception(f"Error eliminando usuario: {str(e)}")
+
+    async def add_user(self, id_number, username, password, role='client'):
+        try:
+            if not username or not password:
+                raise ValueError("Username y password son requeridos")
+            if role not in ('admin', 'client'):
+                raise ValueError("Rol inválido. Debe ser 'admin' o 'client'")
+            result = await self._execute_query(
+                'add_user', USUARIO_INSERT, int(id_number), username, password, role, fetch=True
+            )
+            return result[0] if result else None
+        except Exception as e:
+            raise Exception(f"Error agregando usuario: {str(e)}")
+
+    async def create_cotizacion(self, usuario_id, cliente_data, valores):
+        try:
+            result = await self._execute_query(
+                'create_cotizacion', COTIZACION_INSERT,
+                *_cotizacion_params(usuario_id, cliente_data, valores), fetch=True
+            )
+            return result[0]['id'] if result else None
+        except Exception as e:
+            raise Exception(f"Error creando cotización: {str(e)}")
+
+    async def create_cotizacion_with_details(self, usuario_id, cliente_data, valores, detalles_ambientes):
+        """Cotización y detalles en una sola transacción"""
+        async def cotizacion_con_detalles(conn):
+            async with conn.transaction():
+                cotizacion = await conn.fetchrow(
+                    _dollar(COTIZACION_INSERT), *_cotizacion_params(usuario_id, cliente_data, valores)
+                )
+                detalles = _detalle_params(cotizacion['id'], cotizacion['fecha'], detalles_ambientes)
+                await conn.executemany(_dollar(DETALLE_INSERT), detalles)
+            return cotizacion['id'], 1 + len(detalles)
+
+        try:
+            return await self._run('create_cotizacion_with_details', COTIZACION_INSERT, None,
+                                   cotizacion_con_detalles)
+        except Exception as e:
+            raise Exception(f"Error creando cotización: {str(e)}")
+
+    async def search_clientes(self, prefijo, tipo_doc=None, limite=8):
+        try:
+            rows = await self._execute_query(
+                'search_clientes', CLIENTES_SEARCH, *_clientes_search_params(prefijo, tipo_doc, limite),
+                fetch=True
+            )
+            return [_cliente_data(row) for row in rows]
+        except Exception as e:
+            print(f"Error buscando clientes: {str(e)}")
+            return []
+
+    async def get_cotizaciones_with_details(self, ids=None, desde=None, hasta=None):
+        try:
+            where, params = _cotizaciones_filter(ids, desde, hasta)
+            cotizaciones = await self._execute_query('get_cotizaciones_with_details', f"""
+                {COTIZACION_SELECT}
+                {where}
+                ORDER BY c.id
+            """, *params, fetch=True)
+            if not cotizaciones:
+                return []
+
+            fechas = [c['fecha'] for c in cotizaciones]
+            detalles = await self._execute_query(
+                'get_cotizaciones_with_details', DETALLES_SELECT,
+                [c['id'] for c in cotizaciones], min(fechas), max(fechas), fetch=True
+            )
+            return _cotizaciones_with_details(cotizaciones, detalles)
+        except Exception as e:
+            raise Exception(f"Error obteniendo cotizaciones: {str(e)}")
+
+    async def refresh_dashboard(self):
+        try:
+            for vista in DASHBOARD_VIEWS:
+                await self._execute_query(
+                    'refresh_dashboard', f"REFRESH MATERIALIZED VIEW CONCURRENTLY {vista}"
+                )
+        except Exception as e:
+            raise Exception(f"Error actualizando tablero: {str(e)}")
+
+    async def get_dashboard(self, dias=30, stock_minimo=10, limite=10):
+        try:
+            productos = await self._execute_query(
+                'get_dashboard', DASHBOARD_PRODUCTOS_SELECT, dias, limite, fetch=True
+            )
+            vendedores = await self._execute_query(
+                'get_dashboard', DASHBOARD_VENDEDORES_SELECT, dias, limite, fetch=True
+            )
+            stock_bajo = await self._execute_query(
+                'get_dashboard', STOCK_BAJO_SELECT, stock_minimo, fetch=True
+            )
+            return {
+                'productos': productos,
+                'vendedores': vendedores,
+                'stock_bajo': stock_bajo
+            }
+        except Exception as e:
+            raise Exception(f"Error obteniendo tablero: {str(e)}")
@@ -0,0 +1,32 @@
+from kivy.uix.screenmanager import Screen
+from kivy.uix.popup import Popup
+from kivy.uix.label import Label
+from kivy.uix.boxlayout import BoxLayout
+
+class BaseScreen(Screen):
+    def _show_popup(self, title, message, color=(1, 0, 0, 1)):
+        content = BoxLayout(orientation='vertical', padding=10)
+        label = Label(
+            text=message,
+            text_size=(280, None),
+            size_hint_y=None,
+            halign='center',
+            valign='middle'
+        )
+        label.bind(texture_size=lambda *x: setattr(label, 'height', label.texture_size[1]))
+        content.add_widget(label)
+        
+        popup = Popup(
+            title=title,
+            content=content,
+            size_hint=(None, None),
+            size=(300, label.height + 100),
+            auto_dismiss=True
+        )
+        popup.open()
+
+    def show_error(self, message):
+        self._show_popup('Error', message, color=(1, 0, 0, 1))
+
+    def show_success(self, message):
+        self._show_popup('Éxito', message, color=(0, 1, 0, 1))
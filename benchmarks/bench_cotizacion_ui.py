@@ -0,0 +1,154 @@
+"""Rendimiento de la grilla de CotizacionScreen sin ventana visible.
+
+Usa el proveedor de ventana SDL2 con el driver de video 'dummy' y el backend
+GL 'mock', construye la pantalla con un catálogo sintético de N productos,
+agrega M ambientes con agregar_ambiente y simula pulsaciones en celdas
+aleatorias. Termina con código 1 si el tiempo por pulsación o el número de
+widgets superan los presupuestos, para detectar regresiones antes de llegar
+a las tabletas. tests/test_cotizacion_ui_budget.py comprueba los mismos
+presupuestos con pytest.
+
+Uso: python benchmarks/bench_cotizacion_ui.py --productos 200 --ambientes 20
+"""
+import os
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_GL_BACKEND', 'mock')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import random
+import sys
+import time
+from array import array
+
+from common import RAIZ, percentile
+
+from kivy.lang import Builder
+
+import main
+from catalog import CatalogSnapshot
+
+
+def catalogo_sintetico(n):
+    return CatalogSnapshot(
+        array('q', range(1, n + 1)),
+        [f'Producto {i + 1}' for i in range(n)],
+        array('q', [10 ** 9] * n),
+        array('q', [(1000 + i) * 100 for i in range(n)])
+    )
+
+
+def contar_widgets(widget):
+    return sum(1 for _ in widget.walk(restrict=True))
+
+
+def celdas(screen):
+    return [
+        w for w in screen.ids.tabla_container.walk(restrict=True)
+        if hasattr(w, 'producto_idx')
+    ]
+
+
+def widgets_minimos(productos, ambientes):
+    """Contenedor + (encabezado y filas) x (GridLayout + etiqueta + una celda por producto)"""
+    return 1 + (ambientes + 1) * (productos + 2)
+
+
+def cargar_kv():
+    Builder.load_file(os.path.join(RAIZ, 'main.kv'))
+
+
+def medir(productos, ambientes, teclas, semilla=42):
+    """Construir la grilla y simular pulsaciones; devuelve la pantalla y los tiempos (s)"""
+    screen = main.CotizacionScreen(name='cotizacion')
+    screen.productos = catalogo_sintetico(productos)
+
+    inicio = time.perf_counter()
+    screen.crear_tabla()
+    crear_s = time.perf_counter() - inicio
+
+    tiempos_ambiente = []
+    for _ in range(ambientes - 1):
+        inicio = time.perf_counter()
+        screen.agregar_ambiente()
+        tiempos_ambiente.append(time.perf_counter() - inicio)
+
+    rnd = random.Random(semilla)
+    inputs = celdas(screen)
+    tiempos_tecla = []
+    for _ in range(teclas):
+        celda = rnd.choice(inputs)
+        digito = str(rnd.randint(1, 9))
+        inicio = time.perf_counter()
+        celda.insert_text(digito)
+        tiempos_tecla.append(time.perf_counter() - inicio)
+        if len(celda.text) >= 3:
+            celda.text = ''
+
+    return {
+        'screen': screen,
+        'crear_s': crear_s,
+        'ambiente_s': sorted(tiempos_ambiente),
+        'tecla_s': sorted(tiempos_tecla),
+    }
+
+
+def subtotal_celdas(screen):
+    """Subtotal esperado según el texto de las celdas"""
+    return sum(
+        int(c.text or '0') * screen.productos[c.producto_idx]['costo'] for c in celdas(screen)
+    )
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--productos', type=int, default=100)
+    parser.add_argument('--ambientes', type=int, default=10)
+    parser.add_argument('--teclas', type=int, default=500)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--presupuesto-tecla-ms', type=float, default=16.0,
+                        help="p95 máximo por pulsación (un frame a 60 Hz)")
+    parser.add_argument('--presupuesto-widgets', type=int,
+                        help="Máximo de widgets en la grilla (por defecto, el mínimo teórico)")
+    args = parser.parse_args()
+
+    cargar_kv()
+    resultado = medir(args.productos, args.ambientes, args.teclas, args.semilla)
+    screen = resultado['screen']
+    tiempos_tecla = resultado['tecla_s']
+    tiempos_ambiente = resultado['ambiente_s']
+    inputs = celdas(screen)
+
+    widgets = contar_widgets(screen.ids.tabla_container)
+    presupuesto_widgets = args.presupuesto_widgets or widgets_minimos(args.productos, args.ambientes)
+
+    tecla_p95 = percentile(tiempos_tecla, 95) * 1000
+    print(f"Catálogo: {args.productos} productos, {args.ambientes} ambientes, {len(inputs)} celdas")
+    print(f"crear_tabla:        {resultado['crear_s'] * 1000:8.1f} ms")
+    print(f"agregar_ambiente:   {percentile(tiempos_ambiente, 50) * 1000:8.1f} ms p50")
+    print(f"pulsación:          {percentile(tiempos_tecla, 50) * 1000:8.2f} ms p50, {tecla_p95:.2f} ms p95")
+    print(f"widgets en grilla:  {widgets:8d} (presupuesto {presupuesto_widgets})")
+    total_esperado = subtotal_celdas(screen)
+    print(f"subtotal del modelo: {screen.cotizacion.valores()['subtotal']} (esperado {total_esperado})")
+
+    fallas = []
+    if tecla_p95 > args.presupuesto_tecla_ms:
+        fallas.append(f"p95 por pulsación {tecla_p95:.2f} ms > {args.presupuesto_tecla_ms} ms")
+    if widgets > presupuesto_widgets:
+        fallas.append(f"{widgets} widgets > {presupuesto_widgets}")
+    if screen.cotizacion.valores()['subtotal'] != total_esperado:
+        fallas.append("los totales del modelo no coinciden con las celdas")
+
+    if fallas:
+        print("\n❌ Presupuesto excedido:")
+        for falla in fallas:
+            print(f"  - {falla}")
+        return 1
+    print("\n✅ Dentro del presupuesto")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_bench())
@@ -0,0 +1,201 @@
+"""Benchmark de los métodos de Database contra un Postgres local.
+
+Siembra usuarios, productos y cotizaciones a la escala indicada y mide las
+rutas críticas (login, listado de productos, inserción de cotización,
+actualización y descuento de inventario, historial y búsqueda de clientes), reportando throughput y
+latencias p50/p99.
+
+ATENCIÓN: --sembrar vacía las tablas de la base indicada. Use una base
+dedicada (por defecto 'colva_bench').
+
+Ejemplos:
+    python benchmarks/bench_database.py --sembrar --escala 100000
+    python benchmarks/bench_database.py --json actual.json --baseline base.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import add_db_arguments, local_db_config, resumen
+
+from database import Database
+
+USUARIO_BASE = 10000000
+PASSWORD = 'clave123'
+CLIENTE = {
+    'tipo_documento': 'Cédula de Ciudadanía',
+    'numero_documento': '1234567890',
+    'nombres': 'Cliente',
+    'apellidos': 'Benchmark',
+    'telefono': '3000000000',
+    'email': 'bench@example.com'
+}
+
+
+def sembrar(db, escala):
+    """Vaciar y poblar las tablas con datos sintéticos generados en el servidor"""
+    db.migrate_database()
+    db._execute_query(
+        "TRUNCATE cotizacion_detalles, cotizaciones, clientes, movimientos_inventario, "
+        "inventario_snapshots, productos, usuarios RESTART IDENTITY CASCADE"
+    )
+    # Particiones para el año de historial sembrado
+    db.ensure_cotizacion_partitions(desde=datetime.now() - timedelta(days=366))
+    usuarios = max(10, escala // 100)
+    db._execute_query("""
+        INSERT INTO usuarios (id, username, password, role)
+        SELECT %s + g, 'vendedor' || g, %s, 'client'
+        FROM generate_series(1, %s) g
+    """, (USUARIO_BASE, PASSWORD, usuarios))
+    db._execute_query("""
+        INSERT INTO productos (nombre, unidades, costo)
+        SELECT 'Producto ' || lpad(g::text, 7, '0'), 1000000000, 1000 + g %% 10000
+        FROM generate_series(1, %s) g
+    """, (escala,))
+    db._execute_query("""
+        INSERT INTO movimientos_inventario (producto_id, tipo, cantidad)
+        SELECT id, 'ajuste', unidades FROM productos
+    """)
+    db.snapshot_inventory()
+    clientes = max(10, escala // 10)
+    db._execute_query("""
+        INSERT INTO clientes (tipo_doc, num_doc, nombres, apellidos, telefono, email)
+        SELECT 'Cédula de Ciudadanía', lpad(g::text, 10, '0'), 'Cliente', 'Sintético',
+               '3000000000', 'cliente' || g || '@example.com'
+        FROM generate_series(1, %s) g
+    """, (clientes,))
+    db._execute_query("""
+        INSERT INTO cotizaciones (usuario_id, fecha, cliente_id, subtotal, iva, total)
+        SELECT %s + 1 + g %% %s,
+               NOW() - (g %% 365) * INTERVAL '1 day' - (g %% 86400) * INTERVAL '1 second',
+               1 + g %% %s, 6000, 1140, 7140
+        FROM generate_series(1, %s) g
+    """, (USUARIO_BASE, usuarios, clientes, escala))
+    db._execute_query("""
+        INSERT INTO cotizacion_detalles (
+            cotizacion_id, cotizacion_fecha, ambiente, producto_id, cantidad, precio_unitario
+        )
+        SELECT c.id, c.fecha, a, 1 + (c.id * a) %% %s, 2, 1000
+        FROM cotizaciones c CROSS JOIN generate_series(1, 3) a
+    """, (escala,))
+    db._execute_query("ANALYZE")
+    return usuarios
+
+
+def contar(db):
+    fila = db._execute_query("""
+        SELECT (SELECT COUNT(*) FROM usuarios WHERE id > %s) AS usuarios,
+               (SELECT COUNT(*) FROM productos) AS productos,
+               (SELECT MAX(id) FROM cotizaciones) AS max_cotizacion
+    """, (USUARIO_BASE,), fetch=True)[0]
+    return fila['usuarios'], fila['productos'], fila['max_cotizacion'] or 0
+
+
+def medir(fn, iteraciones):
+    latencias = []
+    inicio = time.perf_counter()
+    for i in range(iteraciones):
+        t = time.perf_counter()
+        fn(i)
+        latencias.append(time.perf_counter() - t)
+    return resumen(latencias, time.perf_counter() - inicio)
+
+
+def operaciones(db, usuarios, productos, max_cotizacion, rnd):
+    hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def producto_id():
+        return rnd.randint(1, productos)
+
+    def historial_dia(i):
+        dia = hoy - timedelta(days=rnd.randint(1, 364))
+        return db.get_cotizaciones_with_details(desde=dia, hasta=dia + timedelta(days=1))
+
+    return {
+        'login': lambda i: db.validate_user(USUARIO_BASE + rnd.randint(1, usuarios), PASSWORD),
+        'listado_productos': lambda i: db.get_all_products(),
+        'insertar_cotizacion': lambda i: db.create_cotizacion_with_details(
+            USUARIO_BASE + rnd.randint(1, usuarios), CLIENTE,
+            {'subtotal': 6000, 'iva': 1140, 'total': 7140},
+            {1: {producto_id(): {'cantidad': 2, 'precio_unitario': 1000}},
+             2: {producto_id(): {'cantidad': 1, 'precio_unitario': 1000}}}
+        ),
+        'actualizar_inventario': lambda i: db.update_product_units(
+            f'Producto {producto_id():07d}', 1000000000 - i
+        ),
+        'descontar_inventario': lambda i: db.decrement_product_units(f'Producto {producto_id():07d}', 1),
+        'historial_por_dia': historial_dia,
+        'historial_por_ids': lambda i: db.get_cotizaciones_with_details(
+            ids=[rnd.randint(1, max_cotizacion) for _ in range(20)]
+        ),
+        'buscar_cliente': lambda i: db.search_clientes(f'{rnd.randint(0, 99999):05d}'),
+    }
+
+
+def comparar(resultados, baseline, tolerancia):
+    regresiones = []
+    for nombre, actual in resultados.items():
+        base = baseline.get(nombre)
+        if base and actual['p99_ms'] > base['p99_ms'] * (1 + tolerancia):
+            regresiones.append(
+                f"{nombre}: p99 {actual['p99_ms']:.1f} ms vs {base['p99_ms']:.1f} ms en la base"
+            )
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_db_arguments(parser)
+    parser.add_argument('--escala', type=int, default=1000,
+                        help="Filas de productos y cotizaciones a sembrar (1e3 a 1e6)")
+    parser.add_argument('--sembrar', action='store_true', help="Vaciar y poblar las tablas")
+    parser.add_argument('--iteraciones', type=int, default=200)
+    parser.add_argument('--iteraciones-listado', type=int, default=20,
+                        help="Iteraciones del listado completo de productos")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--json', help="Guardar resultados en este archivo")
+    parser.add_argument('--baseline', help="Resultados previos para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help="Aumento de p99 permitido respecto a la base (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    db = Database(local_db_config(args))
+    if args.sembrar:
+        inicio = time.perf_counter()
+        # La siembra a escala 1e6 tarda más que el límite por sentencia de la app
+        sembrar(Database(local_db_config(args), statement_timeout_ms=None), args.escala)
+        print(f"Datos sembrados (escala {args.escala}) en {time.perf_counter() - inicio:.1f} s")
+
+    usuarios, productos, max_cotizacion = contar(db)
+    if not usuarios or not productos or not max_cotizacion:
+        print("La base está vacía; ejecute con --sembrar")
+        return 1
+
+    rnd = random.Random(args.semilla)
+    resultados = {}
+    print(f"{'operación':<24} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'máx ms':>10}")
+    for nombre, fn in operaciones(db, usuarios, productos, max_cotizacion, rnd).items():
+        iteraciones = args.iteraciones_listado if nombre == 'listado_productos' else args.iteraciones
+        r = resultados[nombre] = medir(fn, iteraciones)
+        print(f"{nombre:<24} {r['ops_s']:>10.1f} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {r['max_ms']:>10.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'escala': productos, 'resultados': resultados}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regresiones = comparar(resultados, json.load(f)['resultados'], args.tolerancia)
+        if regresiones:
+            print("\n❌ Regresiones detectadas:")
+            for r in regresiones:
+                print(f"  - {r}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
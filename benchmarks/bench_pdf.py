@@ -0,0 +1,66 @@
+"""Tiempo de renderizado de cotizaciones en PDF para 1, 50 y 500 líneas.
+
+Uso: python benchmarks/bench_pdf.py [--repeticiones N]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quote_pdf import get_renderer
+
+CLIENTE = {
+    'tipo_documento': 'Cédula de Ciudadanía',
+    'numero_documento': '1072649746',
+    'nombres': 'Cliente',
+    'apellidos': 'De Prueba',
+    'telefono': '3001234567',
+    'email': 'cliente@example.com'
+}
+
+
+def cotizacion_sintetica(lineas, productos_por_ambiente=10):
+    detalles = {}
+    subtotal = 0
+    for i in range(lineas):
+        ambiente = i // productos_por_ambiente + 1
+        precio = 10000.0 + i
+        detalles.setdefault(ambiente, {})[i + 1] = {
+            'nombre': f'Producto {i + 1}',
+            'cantidad': 2,
+            'precio_unitario': precio
+        }
+        subtotal += 2 * precio
+    iva = subtotal * 0.19
+    valores = {'subtotal': subtotal, 'iva': iva, 'total': subtotal + iva}
+    return valores, detalles
+
+
+def medir(lineas, repeticiones):
+    valores, detalles = cotizacion_sintetica(lineas)
+    renderer = get_renderer()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        renderer.render(io.BytesIO(), CLIENTE, valores, detalles)
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2], tiempos[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'líneas':>8} {'mediana ms':>12} {'mínimo ms':>12}")
+    for lineas in (1, 50, 500):
+        mediana, minimo = medir(lineas, args.repeticiones)
+        print(f"{lineas:>8} {mediana * 1000:>12.2f} {minimo * 1000:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Tiempo de cálculo de totales de una cotización según productos y ambientes.
+
+Uso: python benchmarks/bench_quote_engine.py [--repeticiones N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quote_engine import Cotizacion
+
+
+def cotizacion_sintetica(num_productos, num_ambientes):
+    productos = [
+        {'id': i, 'nombre': f'Producto {i}', 'unidades': 1000, 'costo': 10000 + i}
+        for i in range(num_productos)
+    ]
+    cotizacion = Cotizacion(productos)
+    for _ in range(num_ambientes):
+        num = cotizacion.agregar_ambiente()
+        for idx in range(0, num_productos, 3):
+            cotizacion.set_cantidad(num, idx, 2)
+    return cotizacion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'productos':>10} {'ambientes':>10} {'valores() µs':>14} {'detalles() µs':>14}")
+    for num_productos, num_ambientes in ((10, 1), (50, 5), (500, 20)):
+        cotizacion = cotizacion_sintetica(num_productos, num_ambientes)
+
+        inicio = time.perf_counter()
+        for _ in range(args.repeticiones):
+            cotizacion.valores()
+        valores_us = (time.perf_counter() - inicio) / args.repeticiones * 1e6
+
+        inicio = time.perf_counter()
+        for _ in range(args.repeticiones):
+            cotizacion.detalles_ambientes()
+        detalles_us = (time.perf_counter() - inicio) / args.repeticiones * 1e6
+
+        print(f"{num_productos:>10} {num_ambientes:>10} {valores_us:>14.1f} {detalles_us:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Reporte de tiempo de importación de main.py usando `python -X importtime`.
+
+Uso: python benchmarks/bench_startup.py [--top N] [--limite-ms MS] [--modulo main]
+
+Con --limite-ms el script termina con código 1 si la importación supera el
+límite, para detectar regresiones de arranque.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def medir_importacion(modulo):
+    env = dict(os.environ, KIVY_NO_ARGS='1', KIVY_NO_CONSOLELOG='1')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+        cwd=RAIZ, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else 'error importando')
+
+    registros = []
+    for linea in proc.stderr.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        # La sangría del nombre indica el nivel de anidamiento
+        registros.append((nombre[1:].rstrip(), int(propio), int(acumulado)))
+    return registros
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modulo', default='main')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--limite-ms', type=float)
+    args = parser.parse_args()
+
+    registros = medir_importacion(args.modulo)
+    # Solo los paquetes de primer nivel (sin sangría) suman el total real
+    nivel_superior = [r for r in registros if not r[0].startswith(' ')]
+    total_ms = sum(r[2] for r in nivel_superior) / 1000
+
+    print(f"Importación de '{args.modulo}': {total_ms:.1f} ms\n")
+    print(f"{'acumulado ms':>13} {'propio ms':>10}  módulo")
+    for nombre, propio, acumulado in sorted(nivel_superior, key=lambda r: -r[2])[:args.top]:
+        print(f"{acumulado / 1000:>13.1f} {propio / 1000:>10.1f}  {nombre}")
+
+    pesados = [r for r in registros if r[0].strip().split('.')[0] == 'reportlab']
+    if pesados:
+        print("\n⚠️  reportlab se importa al arrancar; debería cargarse solo al generar el PDF")
+
+    if args.limite_ms is not None and total_ms > args.limite_ms:
+        print(f"\n❌ La importación supera el límite de {args.limite_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
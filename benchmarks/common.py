@@ -0,0 +1,47 @@
+"""Utilidades compartidas por los scripts de benchmarks"""
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+def percentile(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    idx = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[idx]
+
+
+def resumen(latencias_s, duracion_s):
+    """Throughput y percentiles (ms) de una lista de latencias en segundos"""
+    ordenadas = sorted(latencias_s)
+    return {
+        'operaciones': len(ordenadas),
+        'ops_s': len(ordenadas) / duracion_s if duracion_s else 0.0,
+        'p50_ms': percentile(ordenadas, 50) * 1000,
+        'p99_ms': percentile(ordenadas, 99) * 1000,
+        'max_ms': (ordenadas[-1] * 1000) if ordenadas else 0.0
+    }
+
+
+def local_db_config(args):
+    """Configuración de conexión para benchmarks (Postgres local, sin SSL por defecto)"""
+    return {
+        'host': args.host,
+        'port': args.port,
+        'user': args.user,
+        'password': args.password,
+        'database': args.database,
+        'sslmode': args.sslmode
+    }
+
+
+def add_db_arguments(parser):
+    parser.add_argument('--host', default=os.getenv('BENCH_DB_HOST', 'localhost'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('BENCH_DB_PORT', '5432')))
+    parser.add_argument('--user', default=os.getenv('BENCH_DB_USER', 'postgres'))
+    parser.add_argument('--password', default=os.getenv('BENCH_DB_PASSWORD', ''))
+    parser.add_argument('--database', default=os.getenv('BENCH_DB_NAME', 'colva_bench'))
+    parser.add_argument('--sslmode', default=os.getenv('BENCH_DB_SSLMODE', 'disable'))
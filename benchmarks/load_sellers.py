@@ -0,0 +1,174 @@
+"""Generador de carga: N vendedores concurrentes sobre el mismo Postgres.
+
+Cada vendedor (un hilo) repite el flujo de la app: login -> listar productos
+-> armar cotización -> guardarla -> descontar inventario (movimientos del
+libro, como actualizar_inventario). Al final reporta throughput, errores por
+tipo y si el stock final (vista stock_actual) es consistente con lo cotizado:
+cada unidad cotizada debe estar descontada una sola vez o rechazada por falta
+de stock.
+
+Requiere una base sembrada con benchmarks/bench_database.py --sembrar.
+
+Uso: python benchmarks/load_sellers.py --vendedores 30 --duracion 60
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from common import add_db_arguments, local_db_config, resumen
+from bench_database import CLIENTE, PASSWORD, USUARIO_BASE
+
+from database import Database
+from quote_engine import Cotizacion
+
+
+class Vendedor(threading.Thread):
+    def __init__(self, db, usuario_id, args, deadline, semilla):
+        super().__init__(daemon=True)
+        self.db = db
+        self.usuario_id = usuario_id
+        self.args = args
+        self.deadline = deadline
+        self.rnd = random.Random(semilla)
+        self.latencias = []
+        self.errores = Counter()
+        self.rechazados = Counter()  # producto_id -> unidades sin descontar
+
+    def flujo(self):
+        if not self.db.validate_user(self.usuario_id, PASSWORD):
+            raise Exception("Login rechazado")
+
+        productos = self.db.get_all_products()
+        calientes = productos[:self.args.productos_calientes]
+        elegidos = self.rnd.sample(calientes, min(len(calientes), self.args.lineas))
+
+        cotizacion = Cotizacion(elegidos)
+        for _ in range(self.args.ambientes):
+            num = cotizacion.agregar_ambiente()
+            for idx in range(len(elegidos)):
+                cotizacion.set_cantidad(num, idx, self.rnd.randint(0, 2))
+        detalles = cotizacion.detalles_ambientes()
+        if not detalles:
+            return
+
+        cotizacion_id = self.db.create_cotizacion_with_details(
+            self.usuario_id, CLIENTE, cotizacion.valores(), detalles
+        )
+
+        # Igual que actualizar_inventario: un descuento por producto; los que fallan
+        # se cuentan y se sigue con el resto
+        for producto, cantidad in zip(elegidos, cotizacion.cantidades_por_producto()):
+            if cantidad <= 0:
+                continue
+            try:
+                self.db.decrement_product_units(
+                    producto['nombre'], cantidad,
+                    usuario_id=self.usuario_id, cotizacion_id=cotizacion_id
+                )
+            except Exception as e:
+                self.errores[str(e).split(':')[0]] += 1
+                self.rechazados[producto['id']] += cantidad
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            inicio = time.perf_counter()
+            try:
+                self.flujo()
+                self.latencias.append(time.perf_counter() - inicio)
+            except Exception as e:
+                self.errores[str(e).split(':')[0]] += 1
+
+
+def stock_actual(db, ids):
+    filas = db._execute_query(
+        "SELECT producto_id, unidades FROM stock_actual WHERE producto_id = ANY(%s)", (ids,), fetch=True
+    )
+    return {f['producto_id']: f['unidades'] for f in filas}
+
+
+def cantidades_descontadas(db, desde_id, ids):
+    filas = db._execute_query("""
+        SELECT producto_id, -SUM(cantidad) AS cantidad
+        FROM movimientos_inventario
+        WHERE tipo = 'cotizacion' AND cotizacion_id > %s AND producto_id = ANY(%s)
+        GROUP BY producto_id
+    """, (desde_id, ids), fetch=True)
+    return {f['producto_id']: f['cantidad'] for f in filas}
+
+
+def cantidades_cotizadas(db, desde_id, ids):
+    filas = db._execute_query("""
+        SELECT producto_id, SUM(cantidad) AS cantidad
+        FROM cotizacion_detalles
+        WHERE cotizacion_id > %s AND producto_id = ANY(%s)
+        GROUP BY producto_id
+    """, (desde_id, ids), fetch=True)
+    return {f['producto_id']: f['cantidad'] for f in filas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_db_arguments(parser)
+    parser.add_argument('--vendedores', type=int, default=20)
+    parser.add_argument('--duracion', type=float, default=30, help="Segundos de carga")
+    parser.add_argument('--productos-calientes', type=int, default=20,
+                        help="Tamaño del subconjunto de productos más cotizados")
+    parser.add_argument('--lineas', type=int, default=5, help="Productos por cotización")
+    parser.add_argument('--ambientes', type=int, default=2)
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+
+    db = Database(local_db_config(args))
+    calientes = [p['id'] for p in db.get_all_products()[:args.productos_calientes]]
+    if not calientes:
+        print("La base está vacía; siembre con bench_database.py --sembrar")
+        return 1
+    stock_inicial = stock_actual(db, calientes)
+    max_cotizacion = db._execute_query(
+        "SELECT COALESCE(MAX(id), 0) AS id FROM cotizaciones", fetch=True
+    )[0]['id']
+
+    deadline = time.monotonic() + args.duracion
+    vendedores = [
+        Vendedor(db, USUARIO_BASE + 1 + i, args, deadline, args.semilla + i)
+        for i in range(args.vendedores)
+    ]
+    inicio = time.perf_counter()
+    for v in vendedores:
+        v.start()
+    for v in vendedores:
+        v.join()
+    duracion = time.perf_counter() - inicio
+
+    latencias = [l for v in vendedores for l in v.latencias]
+    errores = sum((v.errores for v in vendedores), Counter())
+    r = resumen(latencias, duracion)
+    print(f"Vendedores: {args.vendedores}, duración: {duracion:.1f} s")
+    print(f"Cotizaciones completas: {r['operaciones']} ({r['ops_s']:.1f}/s)")
+    print(f"Latencia del flujo: p50 {r['p50_ms']:.0f} ms, p99 {r['p99_ms']:.0f} ms, máx {r['max_ms']:.0f} ms")
+    print(f"Errores: {sum(errores.values())}")
+    for tipo, n in errores.most_common():
+        print(f"  {n:>6}  {tipo}")
+
+    final = stock_actual(db, calientes)
+    cotizado = cantidades_cotizadas(db, max_cotizacion, calientes)
+    descontado = cantidades_descontadas(db, max_cotizacion, calientes)
+    rechazado = sum((v.rechazados for v in vendedores), Counter())
+    inconsistentes = []
+    for pid in calientes:
+        esperado = stock_inicial[pid] - descontado.get(pid, 0)
+        sin_cuadrar = cotizado.get(pid, 0) - descontado.get(pid, 0) - rechazado[pid]
+        if final[pid] != esperado or final[pid] < 0 or sin_cuadrar:
+            inconsistentes.append((pid, esperado, final[pid], sin_cuadrar))
+    print(f"\nConsistencia de stock: {len(calientes) - len(inconsistentes)}/{len(calientes)} productos correctos")
+    for pid, esperado, actual, sin_cuadrar in inconsistentes[:10]:
+        print(f"  producto {pid}: esperado {esperado}, actual {actual}, "
+              f"unidades cotizadas sin descontar ni rechazar {sin_cuadrar}")
+    return 1 if inconsistentes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
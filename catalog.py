@@ -0,0 +1,173 @@
+"""Copia local del catálogo de productos que se sincroniza por diferencias.
+
+La primera llamada a refresh() trae el catálogo completo; las siguientes solo
+piden a la base los productos modificados o eliminados desde la última
+versión recibida (Database.get_product_changes_since).
+
+Los productos se guardan por columnas (array de enteros para id, unidades y
+costo en centavos) con índices id -> posición y nombre -> posición, en lugar
+de una lista de diccionarios.
+"""
+import threading
+from array import array
+
+from quote_engine import to_cents, from_cents
+
+
+class CatalogSnapshot:
+    """Copia inmutable del catálogo ordenada por nombre.
+
+    Las pantallas la usan como lista de productos: snapshot[i] devuelve un
+    diccionario {'id', 'nombre', 'unidades', 'costo'}, pero las columnas se
+    pueden leer directamente (ids, nombres, unidades, costos_cents).
+    """
+
+    def __init__(self, ids, nombres, unidades, costos_cents):
+        self.ids = ids
+        self.nombres = nombres
+        self.unidades = unidades
+        self.costos_cents = costos_cents
+        self._por_id = {producto_id: i for i, producto_id in enumerate(ids)}
+        self._por_nombre = {nombre: i for i, nombre in enumerate(nombres)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return {
+            'id': self.ids[i],
+            'nombre': self.nombres[i],
+            'unidades': self.unidades[i],
+            'costo': from_cents(self.costos_cents[i])
+        }
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.ids)))
+
+    def index_of_id(self, producto_id):
+        return self._por_id.get(producto_id)
+
+    def index_of_nombre(self, nombre):
+        return self._por_nombre.get(nombre)
+
+
+class ProductCatalog:
+    def __init__(self, db):
+        self.db = db
+        self.version = None
+        self.ids = array('q')
+        self.nombres = []
+        self.unidades = array('q')
+        self.costos_cents = array('q')
+        self._por_id = {}  # id -> posición
+        self._por_nombre = {}  # nombre -> posición
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _clear(self):
+        self.ids = array('q')
+        self.nombres = []
+        self.unidades = array('q')
+        self.costos_cents = array('q')
+        self._por_id.clear()
+        self._por_nombre.clear()
+
+    def _upsert(self, producto):
+        i = self._por_id.get(producto['id'])
+        if i is None:
+            i = len(self.ids)
+            self.ids.append(producto['id'])
+            self.nombres.append(producto['nombre'])
+            self.unidades.append(producto['unidades'])
+            self.costos_cents.append(to_cents(producto['costo']))
+            self._por_id[producto['id']] = i
+        else:
+            if self._por_nombre.get(self.nombres[i]) == i:
+                del self._por_nombre[self.nombres[i]]
+            self.nombres[i] = producto['nombre']
+            self.unidades[i] = producto['unidades']
+            self.costos_cents[i] = to_cents(producto['costo'])
+        self._por_nombre[producto['nombre']] = i
+
+    def _remove(self, producto_id):
+        """Quitar moviendo el último producto a la posición liberada"""
+        i = self._por_id.pop(producto_id, None)
+        if i is None:
+            return
+        if self._por_nombre.get(self.nombres[i]) == i:
+            del self._por_nombre[self.nombres[i]]
+        ultimo = len(self.ids) - 1
+        if i != ultimo:
+            self.ids[i] = self.ids[ultimo]
+            self.nombres[i] = self.nombres[ultimo]
+            self.unidades[i] = self.unidades[ultimo]
+            self.costos_cents[i] = self.costos_cents[ultimo]
+            self._por_id[self.ids[i]] = i
+            self._por_nombre[self.nombres[i]] = i
+        self.ids.pop()
+        self.nombres.pop()
+        self.unidades.pop()
+        self.costos_cents.pop()
+
+    def refresh(self):
+        """Aplicar los cambios pendientes; si la consulta falla se conserva la copia actual"""
+        with self._lock:
+            try:
+                cambios = self.db.get_product_changes_since(self.version or 0)
+            except Exception as e:
+                print(f"Error sincronizando catálogo: {str(e)}")
+                return False
+
+            carga_completa = self.version is None
+            if carga_completa:
+                self._clear()
+            # Primero las eliminaciones: un producto nuevo puede reutilizar el nombre
+            for producto_id in cambios['deleted']:
+                self._remove(producto_id)
+            for producto in cambios['changed']:
+                self._upsert(producto)
+            self.version = cambios['version']
+            hubo_cambios = carga_completa or bool(cambios['changed'] or cambios['deleted'])
+            if hubo_cambios:
+                self._snapshot = None
+            return hubo_cambios
+
+    def invalidate(self):
+        """Forzar una carga completa en el próximo refresh()"""
+        with self._lock:
+            self.version = None
+
+    def snapshot(self):
+        """Productos vigentes ordenados por nombre; se reutiliza mientras no haya cambios"""
+        with self._lock:
+            if self._snapshot is None:
+                orden = sorted(range(len(self.ids)), key=self.nombres.__getitem__)
+                self._snapshot = CatalogSnapshot(
+                    array('q', (self.ids[i] for i in orden)),
+                    [self.nombres[i] for i in orden],
+                    array('q', (self.unidades[i] for i in orden)),
+                    array('q', (self.costos_cents[i] for i in orden))
+                )
+            return self._snapshot
+
+    def productos(self):
+        """Productos vigentes ordenados por nombre como lista de diccionarios"""
+        return list(self.snapshot())
+
+    def _row(self, i):
+        return {
+            'id': self.ids[i],
+            'nombre': self.nombres[i],
+            'unidades': self.unidades[i],
+            'costo': from_cents(self.costos_cents[i])
+        }
+
+    def get(self, nombre):
+        with self._lock:
+            i = self._por_nombre.get(nombre)
+            return None if i is None else self._row(i)
+
+    def get_by_id(self, producto_id):
+        with self._lock:
+            i = self._por_id.get(producto_id)
+            return None if i is None else self._row(i)
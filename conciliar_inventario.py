@@ -0,0 +1,48 @@
+"""Guardar fotos del inventario y conciliar el libro de movimientos.
+
+Cada foto registra el stock de un producto con los movimientos anteriores a
+una marca de transacción; el stock vigente se calcula como la última foto
+más los movimientos posteriores.
+La conciliación comprueba que cada foto sea igual a la anterior más los
+movimientos entre ambas y que ningún producto quede con stock negativo.
+
+Ejemplos:
+    python conciliar_inventario.py
+    python conciliar_inventario.py --sin-fotos
+"""
+import argparse
+import sys
+
+from database import Database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fotos y conciliación del inventario")
+    parser.add_argument('--sin-fotos', action='store_true',
+                        help="Solo conciliar, sin guardar fotos nuevas")
+    args = parser.parse_args(argv)
+
+    db = Database()
+    try:
+        if not args.sin_fotos:
+            print(f"Fotos nuevas: {db.snapshot_inventory()}")
+        diferencias = db.reconcile_inventory()
+    except Exception as e:
+        print(f"❌ {str(e)}")
+        return 1
+
+    if not diferencias:
+        print("✅ El inventario cuadra")
+        return 0
+    print(f"❌ {len(diferencias)} diferencias:")
+    for d in diferencias:
+        if d['hasta_version'] is None:
+            print(f"  - producto {d['producto_id']}: stock negativo ({d['calculadas']})")
+        else:
+            print(f"  - producto {d['producto_id']}, foto {d['hasta_version']}: "
+                  f"foto {d['registradas']} vs calculado {d['calculadas']}")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
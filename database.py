@@ -1,7 +1,20 @@
+import logging
 import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
+import psycopg2.pool
 from dotenv import load_dotenv
+from db_resilience import CircuitBreaker, DatabaseUnavailableError, backoff_delays
+from query_stats import QueryStats
+
+logger = logging.getLogger('colva.db')
 
 # Load environment variables
 load_dotenv()
@@ -12,32 +25,892 @@ DB_CONFIG = {
     'user': os.getenv('DB_USER'),
     'password': os.getenv('DB_PASSWORD'),
     'database': os.getenv('DB_NAME'),
-    'port': int(os.getenv('DB_PORT')),
-    'sslmode': 'require'
+    'port': int(os.getenv('DB_PORT', '5432')),
+    'sslmode': 'require',
+    # Sin estos límites una red colgada bloquea la consulta (y la interfaz) indefinidamente
+    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+    'keepalives': 1,
+    'keepalives_idle': 10,
+    'keepalives_interval': 5,
+    'keepalives_count': 3
 }
 
+# Tiempo máximo (ms) de una sentencia en el servidor; se fija por transacción con
+# SET LOCAL porque el pooler de Supabase no acepta 'options' al conectar
+STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '15000'))
+# Plazo total (s) de una llamada, reintentos incluidos
+CALL_DEADLINE = float(os.getenv('DB_CALL_DEADLINE', '20'))
+DB_RETRIES = int(os.getenv('DB_RETRIES', '2'))
+
+# Mantenimiento y migraciones: no son escrituras de un usuario (no desvían sus
+# lecturas al primario)
+MAINTENANCE_METHODS = frozenset({
+    'migrate_database', 'ensure_cotizacion_partitions',
+    'archive_cotizaciones', 'refresh_dashboard', 'snapshot_inventory',
+})
+# Pueden tardar más que STATEMENT_TIMEOUT_MS
+UNTIMED_METHODS = MAINTENANCE_METHODS | frozenset({'reconcile_inventory'})
+
+def _replica_configs(valor):
+    """Réplicas de lectura de DB_REPLICAS ("host[:puerto],host[:puerto]"), con las credenciales de DB_CONFIG"""
+    replicas = []
+    for endpoint in filter(None, (e.strip() for e in (valor or '').split(','))):
+        host, _, port = endpoint.partition(':')
+        replicas.append({**DB_CONFIG, 'host': host, 'port': int(port or DB_CONFIG['port'])})
+    return replicas
+
+REPLICA_CONFIGS = _replica_configs(os.getenv('DB_REPLICAS'))
+
+# Retraso máximo (s) de una réplica para recibir lecturas
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '5'))
+# Cada cuántos segundos se vuelve a medir el retraso de una réplica
+REPLICA_CHECK_INTERVAL = 10
+# Tras una escritura, las lecturas van al primario durante estos segundos (leer lo escrito)
+READ_YOUR_WRITES_WINDOW = float(os.getenv('DB_READ_YOUR_WRITES', '5'))
+
+# Métodos de solo lectura que pueden atenderse desde una réplica
+REPLICA_READS = frozenset({
+    'get_user_role', 'get_user_data', 'get_all_users', 'get_all_products',
+    'check_stock', 'search_clientes', 'get_cotizaciones_with_details', 'get_dashboard',
+})
+# Lecturas que siempre van al primario (marcas de sincronización, login) y no
+# cuentan como escrituras
+PRIMARY_READS = frozenset({
+    'validate_user', 'get_catalog_version', 'get_catalog', 'get_product_changes_since',
+    'get_products_changed_since', 'reconcile_inventory', 'get_schema_version',
+})
+
+# Métodos que se pueden repetir sin cambiar el resultado si la conexión se cae
+# durante la consulta; los demás solo se reintentan si no llegaron a enviarse
+IDEMPOTENT_METHODS = REPLICA_READS | PRIMARY_READS | frozenset({
+    'update_user', 'delete_user', 'delete_product', 'update_product_units',
+    'refresh_dashboard', 'snapshot_inventory',
+})
+
+
+class _TransientError(Exception):
+    """Falla de conexión; `sent` indica si la consulta pudo llegar al servidor"""
+
+    def __init__(self, error, sent):
+        super().__init__(str(error))
+        self.sent = sent
+
+# Umbral (ms) a partir del cual se registra una consulta como lenta
+SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '500'))
+
+# Meses futuros para los que se crean particiones al iniciar
+PARTITION_MONTHS_AHEAD = 3
+
+# Versión del esquema que espera este código; se sube al cambiar migrate_database()
+SCHEMA_VERSION = 1
+# Clave del bloqueo consultivo que serializa las migraciones
+SCHEMA_LOCK_KEY = 7210431
+
+# Cotizaciones y detalles se particionan por mes; los detalles llevan la fecha
+# de su cotización para quedar en la partición del mismo mes
+COTIZACIONES_DDL = """
+    CREATE TABLE IF NOT EXISTS cotizaciones (
+        id SERIAL,
+        usuario_id INT NOT NULL REFERENCES usuarios(id),
+        fecha TIMESTAMP NOT NULL DEFAULT NOW(),
+        cliente_id INT REFERENCES clientes(id),
+        -- Datos copiados del cliente, solo en cotizaciones anteriores al directorio
+        cliente_tipo_doc VARCHAR(50),
+        cliente_num_doc VARCHAR(50),
+        cliente_nombres VARCHAR(255),
+        cliente_apellidos VARCHAR(255),
+        cliente_telefono VARCHAR(50),
+        cliente_email VARCHAR(255),
+        subtotal NUMERIC(10,2) NOT NULL,
+        iva NUMERIC(10,2) NOT NULL,
+        total NUMERIC(10,2) NOT NULL,
+        PRIMARY KEY (id, fecha)
+    ) PARTITION BY RANGE (fecha)
+"""
+
+DETALLES_DDL = """
+    CREATE TABLE IF NOT EXISTS cotizacion_detalles (
+        id SERIAL,
+        cotizacion_id INT NOT NULL,
+        cotizacion_fecha TIMESTAMP NOT NULL,
+        ambiente INT NOT NULL,
+        producto_id INT NOT NULL REFERENCES productos(id),
+        cantidad INT NOT NULL,
+        precio_unitario NUMERIC(10,2) NOT NULL,
+        PRIMARY KEY (id, cotizacion_fecha),
+        FOREIGN KEY (cotizacion_id, cotizacion_fecha) REFERENCES cotizaciones(id, fecha)
+    ) PARTITION BY RANGE (cotizacion_fecha)
+"""
+
+def _month_start(d):
+    return date(d.year, d.month, 1)
+
+def _add_months(d, meses):
+    total = d.year * 12 + d.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+def _partition_ddl(desde, hasta):
+    """Particiones mensuales de cotizaciones y detalles entre dos meses (inclusive)"""
+    sentencias = []
+    mes = _month_start(desde)
+    while mes <= hasta:
+        siguiente = _add_months(mes, 1)
+        sufijo = mes.strftime('%Y_%m')
+        for tabla in ('cotizaciones', 'cotizacion_detalles'):
+            sentencias.append(
+                f"CREATE TABLE IF NOT EXISTS {tabla}_{sufijo} PARTITION OF {tabla} "
+                f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{siguiente.isoformat()}')"
+            )
+        mes = siguiente
+    return sentencias
+
+def _month_partition_script(mes):
+    """Crear las particiones de un mes pasando a ellas las filas que ya estén en las
+    particiones por defecto (si no, el ATTACH fallaría).
+
+    Las tablas se crean sueltas, se llenan con las filas del mes que se borran de
+    la partición por defecto y se adjuntan; todo en una transacción.
+    """
+    siguiente = _add_months(mes, 1)
+    sufijo = mes.strftime('%Y_%m')
+    rango = f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{siguiente.isoformat()}')"
+    script = ["LOCK TABLE cotizaciones_default, cotizacion_detalles_default IN ACCESS EXCLUSIVE MODE"]
+    # Primero los detalles: referencian a las cotizaciones del mismo mes
+    for tabla, columna in (('cotizacion_detalles', 'cotizacion_fecha'), ('cotizaciones', 'fecha')):
+        script += [
+            f"CREATE TABLE {tabla}_{sufijo} (LIKE {tabla} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+            f"""WITH movidas AS (
+                    DELETE FROM {tabla}_default
+                    WHERE {columna} >= '{mes.isoformat()}' AND {columna} < '{siguiente.isoformat()}'
+                    RETURNING *
+                )
+                INSERT INTO {tabla}_{sufijo} SELECT * FROM movidas""",
+        ]
+    script += [
+        f"ALTER TABLE cotizaciones ATTACH PARTITION cotizaciones_{sufijo} {rango}",
+        f"ALTER TABLE cotizacion_detalles ATTACH PARTITION cotizacion_detalles_{sufijo} {rango}",
+    ]
+    return script
+
+# La cotización guarda solo la referencia al cliente; el cliente se crea o
+# actualiza (por tipo y número de documento) en la misma sentencia
+CLIENTE_UPSERT = """
+    INSERT INTO clientes (tipo_doc, num_doc, nombres, apellidos, telefono, email)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (tipo_doc, num_doc) DO UPDATE
+    SET nombres = EXCLUDED.nombres, apellidos = EXCLUDED.apellidos,
+        telefono = EXCLUDED.telefono, email = EXCLUDED.email, updated_at = NOW()
+    RETURNING id
+"""
+
+COTIZACION_INSERT = f"""
+    WITH cliente AS ({CLIENTE_UPSERT})
+    INSERT INTO cotizaciones (usuario_id, cliente_id, subtotal, iva, total)
+    SELECT %s, cliente.id, %s, %s, %s FROM cliente
+    RETURNING id, fecha
+"""
+
+def _cotizacion_params(usuario_id, cliente_data, valores):
+    return (
+        cliente_data['tipo_documento'],
+        cliente_data['numero_documento'],
+        cliente_data['nombres'],
+        cliente_data['apellidos'],
+        cliente_data['telefono'],
+        cliente_data['email'],
+        usuario_id,
+        valores['subtotal'],
+        valores['iva'],
+        valores['total']
+    )
+
+# Las cotizaciones anteriores al directorio de clientes conservan sus propias columnas
+COTIZACION_SELECT = """
+    SELECT c.id, c.usuario_id, c.fecha, c.subtotal, c.iva, c.total,
+           COALESCE(cl.tipo_doc, c.cliente_tipo_doc) AS cliente_tipo_doc,
+           COALESCE(cl.num_doc, c.cliente_num_doc) AS cliente_num_doc,
+           COALESCE(cl.nombres, c.cliente_nombres) AS cliente_nombres,
+           COALESCE(cl.apellidos, c.cliente_apellidos) AS cliente_apellidos,
+           COALESCE(cl.telefono, c.cliente_telefono) AS cliente_telefono,
+           COALESCE(cl.email, c.cliente_email) AS cliente_email
+    FROM cotizaciones c
+    LEFT JOIN clientes cl ON cl.id = c.cliente_id
+"""
+
+def _cliente_data(row):
+    return {
+        'tipo_documento': row['cliente_tipo_doc'],
+        'numero_documento': row['cliente_num_doc'],
+        'nombres': row['cliente_nombres'],
+        'apellidos': row['cliente_apellidos'],
+        'telefono': row['cliente_telefono'],
+        'email': row['cliente_email']
+    }
+
+# Clave (primer entero) de los bloqueos consultivos que serializan los descuentos
+# de un mismo producto; el segundo entero es el id del producto
+STOCK_LOCK_KEY = 7301
+
+# xid más alto que modificó el catálogo y xmin del snapshot actual
+CATALOG_VERSION_SELECT = """
+    SELECT GREATEST(
+               (SELECT MAX(version) FROM productos),
+               (SELECT MAX(version) FROM productos_eliminados),
+               (SELECT MAX(version) FROM movimientos_inventario),
+               0
+           ) AS version,
+           pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS marca
+"""
+
+def _stable_catalog_version(row):
+    """La versión solo identifica el catálogo si es menor que el xmin: entonces todas
+    las transacciones que pudieron modificarlo terminaron y cualquier cambio
+    posterior tendrá un xid mayor. Si no, hay transacciones abiertas más antiguas
+    que la última confirmada (el orden de confirmación no sigue al de los xid)
+    y se devuelve None."""
+    return row['version'] if row['version'] < row['marca'] else None
+
+# Stock vigente: última foto de cada producto más los movimientos que no cubre.
+# Una foto cubre los movimientos con version (xid) menor que su hasta_version
+STOCK_ACTUAL_VIEW = """
+    CREATE OR REPLACE VIEW stock_actual AS
+    SELECT p.id AS producto_id,
+           (COALESCE(s.unidades, 0) + COALESCE(t.delta, 0))::int AS unidades
+    FROM productos p
+    LEFT JOIN LATERAL (
+        SELECT unidades, hasta_version
+        FROM inventario_snapshots
+        WHERE producto_id = p.id
+        ORDER BY hasta_version DESC
+        LIMIT 1
+    ) s ON true
+    LEFT JOIN LATERAL (
+        SELECT SUM(cantidad) AS delta
+        FROM movimientos_inventario m
+        WHERE m.producto_id = p.id AND m.version >= COALESCE(s.hasta_version, 0)
+    ) t ON true
+"""
+
+# Vistas materializadas del tablero de administración
+DASHBOARD_VIEWS = ('ventas_producto_dia', 'ventas_vendedor_dia')
+
+def _without_deleted_at(row):
+    row.pop('deleted_at', None)
+    return row
+
+# Sentencias compartidas con async_database, que cambia los %s por $1, $2...
+# Los parámetros de tipo ambiguo llevan conversión explícita para asyncpg
+
+USUARIO_PASSWORD_SELECT = "SELECT password FROM usuarios WHERE id = %s"
+USUARIO_ROL_SELECT = "SELECT role FROM usuarios WHERE id = %s"
+USUARIO_SELECT = "SELECT id, username, role FROM usuarios WHERE id = %s"
+USUARIOS_SELECT = "SELECT id, username, role FROM usuarios"
+USUARIO_INSERT = """
+    INSERT INTO usuarios (id, username, password, role)
+    VALUES (%s, %s, %s, %s)
+    RETURNING id, username, role
+"""
+USUARIO_DELETE = "DELETE FROM usuarios WHERE id = %s RETURNING id"
+
+def _usuario_update(id_number, username=None, password=None, role=None):
+    """Sentencia y parámetros para actualizar un usuario, o None si no hay cambios"""
+    updates = []
+    params = []
+    if username:
+        updates.append("username = %s")
+        params.append(username)
+    if password:
+        updates.append("password = %s")
+        params.append(password)
+    if role and str(id_number) != 'admin':
+        if role not in ('admin', 'client'):
+            raise ValueError("Rol inválido. Debe ser 'admin' o 'client'")
+        updates.append("role = %s")
+        params.append(role)
+    if not updates:
+        return None
+    params.append(id_number)
+    return f"""
+        UPDATE usuarios
+        SET {', '.join(updates)}
+        WHERE id = %s
+        RETURNING id, username, role
+    """, params
+
+PRODUCTOS_SELECT = """
+    SELECT p.id, p.nombre, s.unidades, p.costo::numeric(15,2) as costo
+    FROM productos p
+    JOIN stock_actual s ON s.producto_id = p.id
+    WHERE p.deleted_at IS NULL
+    ORDER BY p.nombre
+"""
+
+# Marca de sincronización por versión: xmin del snapshot actual
+VERSION_WATERMARK_SELECT = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS version"
+
+# Un movimiento de inventario también cuenta como cambio del producto
+PRODUCT_CHANGES_SELECT = """
+    SELECT p.id, p.nombre, s.unidades, p.costo::numeric(15,2) as costo, p.deleted_at
+    FROM productos p
+    JOIN stock_actual s ON s.producto_id = p.id
+    WHERE p.version >= %s
+       OR p.id IN (SELECT producto_id FROM movimientos_inventario WHERE version >= %s)
+    ORDER BY p.nombre
+"""
+PRODUCTOS_ELIMINADOS_SELECT = "SELECT producto_id FROM productos_eliminados WHERE version >= %s"
+
+# Marca de sincronización por fecha: inicio de la transacción abierta más antigua
+TIMESTAMP_WATERMARK_SELECT = """
+    SELECT pg_has_role('pg_read_all_stats', 'USAGE') AS permitido,
+           LEAST(
+               NOW(),
+               (SELECT MIN(xact_start) FROM pg_stat_activity
+                WHERE datname = current_database() AND xact_start IS NOT NULL)
+           ) AS ts
+"""
+PRODUCTS_CHANGED_SELECT = """
+    SELECT p.id, p.nombre, s.unidades, p.costo::numeric(15,2) as costo, p.deleted_at
+    FROM productos p
+    JOIN stock_actual s ON s.producto_id = p.id
+    WHERE p.updated_at >= %s
+       OR p.id IN (SELECT producto_id FROM movimientos_inventario WHERE fecha >= %s)
+    ORDER BY p.nombre
+"""
+
+PRODUCTO_DELETE = """
+    UPDATE productos
+    SET deleted_at = NOW()
+    WHERE nombre = %s AND deleted_at IS NULL
+    RETURNING id
+"""
+
+# Un producto eliminado lógicamente con el mismo nombre se reactiva; el ajuste
+# lleva su stock a las unidades indicadas
+PRODUCTO_INSERT = """
+    WITH producto AS (
+        INSERT INTO productos (nombre, unidades, costo)
+        VALUES (%s, %s::int, %s::numeric(15,2))
+        ON CONFLICT (nombre) DO UPDATE
+        SET unidades = EXCLUDED.unidades, costo = EXCLUDED.costo, deleted_at = NULL
+        WHERE productos.deleted_at IS NOT NULL
+        RETURNING id, nombre, costo
+    ), ajuste AS (
+        INSERT INTO movimientos_inventario (producto_id, tipo, cantidad)
+        SELECT p.id, 'ajuste',
+               %s::int - COALESCE((SELECT unidades FROM stock_actual WHERE producto_id = p.id), 0)
+        FROM producto p
+    )
+    SELECT * FROM producto
+"""
+
+# Serializa los movimientos de un producto hasta el fin de la transacción
+MOVIMIENTO_LOCK = f"""
+    SELECT pg_advisory_xact_lock({STOCK_LOCK_KEY}, id)
+    FROM productos WHERE nombre = %s AND deleted_at IS NULL
+"""
+
+def _movimiento_insert(cantidad_sql):
+    """Sentencia que registra un movimiento y devuelve {unidades, aplicado}.
+
+    `cantidad_sql` es la expresión de la cantidad (puede usar `actual`, el stock
+    antes del movimiento). Parámetros: nombre, tipo, los de la cantidad,
+    usuario_id, cotizacion_id y otra vez los de la cantidad.
+    """
+    return f"""
+        WITH stock AS (
+            SELECT s.producto_id, s.unidades AS actual
+            FROM stock_actual s
+            JOIN productos p ON p.id = s.producto_id
+            WHERE p.nombre = %s AND p.deleted_at IS NULL
+        ), movimiento AS (
+            INSERT INTO movimientos_inventario (producto_id, tipo, cantidad, usuario_id, cotizacion_id)
+            SELECT producto_id, %s::text, {cantidad_sql}, %s::int, %s::int
+            FROM stock
+            WHERE actual + {cantidad_sql} >= 0
+            RETURNING cantidad
+        )
+        SELECT actual + COALESCE((SELECT cantidad FROM movimiento), 0) AS unidades,
+               EXISTS (SELECT 1 FROM movimiento) AS aplicado
+        FROM stock
+    """
+
+# Expresiones de cantidad de cada tipo de movimiento
+AJUSTE_CANTIDAD = '(%s::int - actual)'
+REPOSICION_CANTIDAD = '%s::int'
+COTIZACION_CANTIDAD = '-%s::int'
+
+# Descuento de todas las líneas de una cotización en una transacción: los productos
+# se bloquean en orden de id para que dos descuentos simultáneos no se crucen
+DESCUENTO_LOCK = f"""
+    SELECT pg_advisory_xact_lock({STOCK_LOCK_KEY}, id)
+    FROM productos WHERE nombre = ANY(%s::text[]) AND deleted_at IS NULL
+    ORDER BY id
+"""
+
+# Cada producto se descuenta solo si le alcanza el stock; los demás no impiden el resto.
+# Parámetros: nombres, cantidades, usuario_id, cotizacion_id
+DESCUENTO_INSERT = """
+    WITH pedido AS (
+        SELECT * FROM unnest(%s::text[], %s::int[]) AS t(nombre, cantidad)
+    ), stock AS (
+        SELECT pe.nombre, pe.cantidad, s.producto_id, s.unidades AS actual
+        FROM pedido pe
+        JOIN productos p ON p.nombre = pe.nombre AND p.deleted_at IS NULL
+        JOIN stock_actual s ON s.producto_id = p.id
+    ), movimiento AS (
+        INSERT INTO movimientos_inventario (producto_id, tipo, cantidad, usuario_id, cotizacion_id)
+        SELECT producto_id, 'cotizacion', -cantidad, %s::int, %s::int
+        FROM stock
+        WHERE actual >= cantidad
+        RETURNING producto_id
+    )
+    SELECT s.nombre,
+           s.actual - CASE WHEN m.producto_id IS NULL THEN 0 ELSE s.cantidad END AS unidades,
+           m.producto_id IS NOT NULL AS aplicado
+    FROM stock s
+    LEFT JOIN movimiento m ON m.producto_id = s.producto_id
+"""
+
+def _descuento_params(cantidades):
+    """Nombres y cantidades (enteros positivos) de un descuento {nombre: cantidad}"""
+    nombres = list(cantidades)
+    valores = []
+    for nombre in nombres:
+        cantidad = int(cantidades[nombre])
+        if cantidad <= 0:
+            raise ValueError(f"La cantidad de {nombre} debe ser un número entero positivo")
+        valores.append(cantidad)
+    return nombres, valores
+
+def _descuento_resultado(cantidades, rows):
+    """{'unidades': {nombre: restantes}, 'rechazados': {nombre: motivo}}"""
+    unidades = {r['nombre']: r['unidades'] for r in rows if r['aplicado']}
+    encontrados = {r['nombre'] for r in rows}
+    rechazados = {
+        nombre: (f"Stock insuficiente: {nombre}" if nombre in encontrados
+                 else f"No se encontró el producto: {nombre}")
+        for nombre in cantidades if nombre not in unidades
+    }
+    return {'unidades': unidades, 'rechazados': rechazados}
+
+STOCK_SELECT = """
+    SELECT s.unidades
+    FROM stock_actual s
+    JOIN productos p ON p.id = s.producto_id
+    WHERE p.nombre = %s AND p.deleted_at IS NULL
+"""
+
+DETALLE_INSERT = """
+    INSERT INTO cotizacion_detalles (
+        cotizacion_id, cotizacion_fecha, ambiente, producto_id,
+        cantidad, precio_unitario
+    ) VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+def _detalle_params(cotizacion_id, fecha, detalles_ambientes):
+    return [
+        (cotizacion_id, fecha, ambiente_num, producto_id,
+         detalle['cantidad'], detalle['precio_unitario'])
+        for ambiente_num, productos in detalles_ambientes.items()
+        for producto_id, detalle in productos.items()
+    ]
+
+def _detalle_columnas(detalles_ambientes):
+    """Ambientes, productos, cantidades y precios de los detalles, columna por columna"""
+    columnas = ([], [], [], [])
+    for ambiente_num, productos in detalles_ambientes.items():
+        for producto_id, detalle in productos.items():
+            for columna, valor in zip(columnas, (ambiente_num, producto_id,
+                                                  detalle['cantidad'], detalle['precio_unitario'])):
+                columna.append(valor)
+    return columnas
+
+# Cliente, cotización y detalles en una sola sentencia (una transacción): si falla
+# un detalle no queda una cotización a medias. Parámetros: los de _cotizacion_params
+# y las columnas de _detalle_columnas
+COTIZACION_DETALLES_INSERT = f"""
+    WITH cliente AS ({CLIENTE_UPSERT}), cotizacion AS (
+        INSERT INTO cotizaciones (usuario_id, cliente_id, subtotal, iva, total)
+        SELECT %s, cliente.id, %s, %s, %s FROM cliente
+        RETURNING id, fecha
+    ), detalles AS (
+        INSERT INTO cotizacion_detalles (
+            cotizacion_id, cotizacion_fecha, ambiente, producto_id,
+            cantidad, precio_unitario
+        )
+        SELECT cotizacion.id, cotizacion.fecha, d.ambiente, d.producto_id, d.cantidad, d.precio_unitario
+        FROM cotizacion
+        CROSS JOIN unnest(%s::int[], %s::int[], %s::int[], %s::numeric[])
+             AS d(ambiente, producto_id, cantidad, precio_unitario)
+    )
+    SELECT id FROM cotizacion
+"""
+
+CLIENTES_SEARCH = """
+    SELECT tipo_doc AS cliente_tipo_doc, num_doc AS cliente_num_doc,
+           nombres AS cliente_nombres, apellidos AS cliente_apellidos,
+           telefono AS cliente_telefono, email AS cliente_email
+    FROM clientes
+    WHERE num_doc LIKE %s AND (%s::text IS NULL OR tipo_doc = %s)
+    ORDER BY num_doc
+    LIMIT %s
+"""
+
+def _clientes_search_params(prefijo, tipo_doc, limite):
+    patron = prefijo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return (patron, tipo_doc or None, tipo_doc or None, limite)
+
+def _cotizaciones_filter(ids=None, desde=None, hasta=None):
+    """Cláusula WHERE y parámetros para filtrar cotizaciones por IDs o rango de fechas"""
+    condiciones = []
+    params = []
+    if ids:
+        condiciones.append("c.id = ANY(%s)")
+        params.append(list(ids))
+    if desde:
+        condiciones.append("c.fecha >= %s")
+        params.append(desde)
+    if hasta:
+        condiciones.append("c.fecha < %s")
+        params.append(hasta)
+    return (f"WHERE {' AND '.join(condiciones)}" if condiciones else ""), params
+
+# El rango de fechas limita la búsqueda a las particiones de esas cotizaciones
+DETALLES_SELECT = """
+    SELECT d.cotizacion_id, d.ambiente, d.producto_id, d.cantidad,
+           d.precio_unitario, p.nombre
+    FROM cotizacion_detalles d
+    JOIN productos p ON p.id = d.producto_id
+    WHERE d.cotizacion_id = ANY(%s)
+      AND d.cotizacion_fecha BETWEEN %s AND %s
+    ORDER BY d.cotizacion_id, d.ambiente, d.id
+"""
+
+def _cotizaciones_with_details(cotizaciones, detalles):
+    detalles_por_cotizacion = {}
+    for d in detalles:
+        ambientes = detalles_por_cotizacion.setdefault(d['cotizacion_id'], {})
+        ambientes.setdefault(d['ambiente'], {})[d['producto_id']] = {
+            'nombre': d['nombre'],
+            'cantidad': d['cantidad'],
+            'precio_unitario': d['precio_unitario']
+        }
+    return [{
+        'id': c['id'],
+        'usuario_id': c['usuario_id'],
+        'fecha': c['fecha'],
+        'cliente_data': _cliente_data(c),
+        'valores': {
+            'subtotal': c['subtotal'],
+            'iva': c['iva'],
+            'total': c['total']
+        },
+        'detalles_ambientes': detalles_por_cotizacion.get(c['id'], {})
+    } for c in cotizaciones]
+
+DASHBOARD_PRODUCTOS_SELECT = """
+    SELECT v.producto_id, p.nombre,
+           SUM(v.unidades)::bigint AS unidades,
+           SUM(v.ingresos)::numeric(15,2) AS ingresos
+    FROM ventas_producto_dia v
+    JOIN productos p ON p.id = v.producto_id
+    WHERE v.dia > CURRENT_DATE - %s::int
+    GROUP BY v.producto_id, p.nombre
+    ORDER BY unidades DESC
+    LIMIT %s
+"""
+DASHBOARD_VENDEDORES_SELECT = """
+    SELECT v.usuario_id, u.username,
+           SUM(v.cotizaciones)::bigint AS cotizaciones,
+           SUM(v.ingresos)::numeric(15,2) AS ingresos
+    FROM ventas_vendedor_dia v
+    JOIN usuarios u ON u.id = v.usuario_id
+    WHERE v.dia > CURRENT_DATE - %s::int
+    GROUP BY v.usuario_id, u.username
+    ORDER BY ingresos DESC
+    LIMIT %s
+"""
+STOCK_BAJO_SELECT = """
+    SELECT p.id, p.nombre, s.unidades
+    FROM productos p
+    JOIN stock_actual s ON s.producto_id = p.id
+    WHERE s.unidades <= %s AND p.deleted_at IS NULL
+    ORDER BY s.unidades, p.nombre
+"""
+
+class _Replica:
+    """Réplica de lectura con su retraso medido periódicamente"""
+
+    def __init__(self, config, pool_size=None):
+        self.config = config
+        self.lag = None
+        self.healthy = False
+        self.checked_at = None
+        self.pool_size = pool_size
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(pool_size) if pool_size else None
+
+    def connect(self):
+        if not self.pool_size:
+            conn = psycopg2.connect(**self.config)
+        else:
+            self._slots.acquire()
+            try:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(0, self.pool_size, **self.config)
+                conn = self._pool.getconn()
+            except Exception:
+                self._slots.release()
+                raise
+        conn.set_session(readonly=True, autocommit=True)
+        return conn
+
+    def release(self, conn):
+        if not self.pool_size:
+            conn.close()
+            return
+        try:
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @property
+    def name(self):
+        return f"{self.config['host']}:{self.config['port']}"
+
+    def check(self, max_lag):
+        """Medir el retraso; una réplica al día con el WAL recibido tiene retraso 0"""
+        self.checked_at = time.monotonic()
+        conn = None
+        try:
+            conn = psycopg2.connect(**self.config)
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() THEN NULL
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+                END
+            """)
+            lag = cur.fetchone()[0]
+            self.lag = float(lag) if lag is not None else None
+            self.healthy = self.lag is not None and self.lag <= max_lag
+        except psycopg2.Error as e:
+            print(f"Réplica {self.name} no disponible: {str(e)}")
+            self.lag = None
+            self.healthy = False
+        finally:
+            if conn:
+                conn.close()
+        return self.healthy
+
+
 class Database:
-    def __init__(self):
-        self.config = DB_CONFIG
+    def __init__(self, config=None, slow_query_ms=SLOW_QUERY_MS, pool_size=None, replicas=None,
+                 max_replica_lag=REPLICA_MAX_LAG, statement_timeout_ms=STATEMENT_TIMEOUT_MS):
+        self.config = config or DB_CONFIG
+        # None o 0 desactiva el límite (cargas masivas, scripts de mantenimiento)
+        self.statement_timeout_ms = statement_timeout_ms
+        self.stats = QueryStats(slow_query_ms)
+        self.pool = None
+        if pool_size:
+            # Pool para procesos de servidor; el semáforo hace esperar en vez de fallar al agotarse
+            self.pool = psycopg2.pool.ThreadedConnectionPool(1, pool_size, **self.config)
+            self._pool_slots = threading.BoundedSemaphore(pool_size)
+        # Las réplicas de DB_REPLICAS solo se usan con la configuración por defecto
+        if replicas is None:
+            replicas = REPLICA_CONFIGS if config is None else []
+        self.replicas = [_Replica(r, pool_size) for r in replicas]
+        self.max_replica_lag = max_replica_lag
+        self._replica_turn = 0
+        self._last_writes = {}  # sesión -> momento de su última escritura
+        self._routing = threading.local()
+        self._routing_lock = threading.Lock()
+        self.breaker = CircuitBreaker()
+        if self.replicas:
+            # El retraso se mide en segundo plano, nunca en el camino de una lectura
+            threading.Thread(target=self._monitor_replicas, name='replica-lag', daemon=True).start()
 
     def _get_connection(self):
+        if self.pool:
+            self._pool_slots.acquire()
+            try:
+                return self.pool.getconn()
+            except Exception:
+                self._pool_slots.release()
+                raise
         return psycopg2.connect(**self.config)
 
+    def _release_connection(self, conn):
+        if self.pool:
+            try:
+                self.pool.putconn(conn, close=bool(conn.closed))
+            finally:
+                self._pool_slots.release()
+        else:
+            conn.close()
+
+    def _pick_replica(self, caller):
+        """Réplica para una lectura, o None si debe ir al primario"""
+        if not self.replicas or caller not in REPLICA_READS:
+            return None
+        sesion = getattr(self._routing, 'sesion', None)
+        with self._routing_lock:
+            ultima = self._last_writes.get(sesion)
+            if ultima is not None and time.monotonic() - ultima < READ_YOUR_WRITES_WINDOW:
+                return None
+            turn = self._replica_turn
+            self._replica_turn += 1
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(turn + i) % len(self.replicas)]
+            if replica.healthy:
+                return replica
+        return None
+
+    def _note_write(self, caller):
+        if (caller in REPLICA_READS or caller in PRIMARY_READS
+                or caller in MAINTENANCE_METHODS or not self.replicas):
+            return
+        ahora = time.monotonic()
+        sesion = getattr(self._routing, 'sesion', None)
+        with self._routing_lock:
+            # Las sesiones fuera de la ventana ya leen de las réplicas: no hace falta recordarlas
+            self._last_writes = {
+                s: t for s, t in self._last_writes.items()
+                if ahora - t < READ_YOUR_WRITES_WINDOW
+            }
+            self._last_writes[sesion] = ahora
+
+    @contextmanager
+    def read_session(self, sesion):
+        """Atribuir a `sesion` las consultas del bloque en este hilo.
+
+        Leer lo escrito se aplica por sesión: tras una escritura solo las lecturas
+        de esa misma sesión van al primario. Sin sesión (la aplicación local)
+        todas las consultas comparten una.
+        """
+        anterior = getattr(self._routing, 'sesion', None)
+        self._routing.sesion = sesion
+        try:
+            yield
+        finally:
+            self._routing.sesion = anterior
+
+    def _monitor_replicas(self):
+        while True:
+            for replica in self.replicas:
+                try:
+                    replica.check(self.max_replica_lag)
+                except Exception as e:
+                    print(f"Réplica {replica.name}: {str(e)}")
+                    replica.healthy = False
+            time.sleep(REPLICA_CHECK_INTERVAL)
+
+    def circuit_status(self):
+        """Estado del cortacircuitos del primario"""
+        return self.breaker.status()
+
+    def replica_status(self):
+        """Estado de cada réplica: retraso medido (s) y si recibe lecturas"""
+        return [
+            {'replica': r.name, 'lag': r.lag, 'healthy': r.healthy}
+            for r in self.replicas
+        ]
+
+    def _caller_name(self):
+        """Primer método público en la pila de llamadas.
+
+        Los auxiliares privados (_execute_query, _append_movement, ...) se saltan:
+        las métricas, el enrutamiento a réplicas y los reintentos se deciden por
+        el método público que los usa.
+        """
+        frame = sys._getframe(2)
+        while frame and frame.f_code.co_name.startswith('_'):
+            frame = frame.f_back
+        return frame.f_code.co_name if frame else '?'
+
+    def get_query_stats(self):
+        return self.stats.snapshot()
+
+    def dump_query_stats(self):
+        return self.stats.report()
+
     def _execute_query(self, query, params=None, fetch=False):
+        caller = self._caller_name()
+        if fetch:
+            replica = self._pick_replica(caller)
+            if replica:
+                try:
+                    return self._execute_on_replica(replica, caller, query, params)
+                except psycopg2.OperationalError as e:
+                    # Réplica caída: se descarta hasta la próxima medición y se lee del primario
+                    print(f"Réplica {replica.name} no disponible: {str(e)}")
+                    replica.healthy = False
+        self._note_write(caller)
+
+        try:
+            self.breaker.before_call()
+        except DatabaseUnavailableError:
+            self.stats.record_event(caller, 'rejected')
+            raise
+        prefijo = ''
+        if self.statement_timeout_ms and caller not in UNTIMED_METHODS:
+            prefijo = f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)};\n"
+
+        limite = time.monotonic() + CALL_DEADLINE
+        esperas = backoff_delays(DB_RETRIES)
+        while True:
+            try:
+                result = self._execute_once(caller, query, params, fetch, prefijo)
+            except _TransientError as e:
+                espera = next(esperas, None)
+                if (espera is None or time.monotonic() + espera >= limite
+                        or (e.sent and caller not in IDEMPOTENT_METHODS)):
+                    self.breaker.record_failure()
+                    raise Exception(f"No se pudo conectar con la base de datos: {str(e)}")
+                self.stats.record_event(caller, 'retries')
+                time.sleep(espera)
+                continue
+            except Exception:
+                # Error de datos o de la consulta: el servidor respondió
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def _execute_once(self, caller, query, params, fetch, prefijo=''):
         conn = None
+        cur = None
+        sent = False
+        connect_ms = execute_ms = fetch_ms = 0.0
+        rows = 0
+        error = False
+        inicio = time.perf_counter()
         try:
             conn = self._get_connection()
+            connect_ms = (time.perf_counter() - inicio) * 1000
+
+            inicio = time.perf_counter()
             cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            cur.execute(query, params)
-            
+            sent = True
+            cur.execute(prefijo + query, params)
+            execute_ms = (time.perf_counter() - inicio) * 1000
+
+            inicio = time.perf_counter()
             if fetch:
-                result = cur.fetchall()
+                result = [dict(row) for row in cur.fetchall()]
+                rows = len(result)
             else:
                 result = cur.rowcount
-                
+                rows = max(result, 0)
+            fetch_ms = (time.perf_counter() - inicio) * 1000
+
+            inicio = time.perf_counter()
             conn.commit()
-            return [dict(row) for row in result] if fetch else result
+            execute_ms += (time.perf_counter() - inicio) * 1000
+            return result
         except psycopg2.IntegrityError as e:
+            error = True
             if conn:
                 conn.rollback()
             if 'unique constraint' in str(e).lower():
@@ -49,139 +922,472 @@ class Database:
             elif 'check constraint' in str(e).lower():
                 raise Exception("Valor fuera de rango permitido")
             raise Exception(f"Error de integridad: {str(e)}")
+        except psycopg2.errors.QueryCanceled as e:
+            error = True
+            self.stats.record_event(caller, 'timeouts')
+            if conn and not conn.closed:
+                conn.rollback()
+            raise Exception(f"La consulta superó el tiempo límite: {str(e)}")
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            error = True
+            if conn and not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise _TransientError(e, sent)
         except psycopg2.Error as e:
+            error = True
             if conn:
                 conn.rollback()
             raise Exception(f"Error en la base de datos: {str(e)}")
         finally:
-            if cur:
+            if cur and not cur.closed:
                 cur.close()
             if conn:
-                conn.close()
+                self._release_connection(conn)
+            if not conn:
+                connect_ms = (time.perf_counter() - inicio) * 1000
+            self.stats.record(caller, query, params,
+                              connect_ms, execute_ms, fetch_ms, rows, error)
 
-    def initialize_database(self):
+    def _execute_on_replica(self, replica, caller, query, params):
+        """Lectura en una réplica; los errores de conexión se propagan para caer al primario"""
+        conn = None
+        rows = 0
+        error = False
+        inicio = time.perf_counter()
+        connect_ms = execute_ms = 0.0
         try:
-            # Crear tablas si no existen (sin DROP)
-            self._execute_query("""
-                CREATE TABLE IF NOT EXISTS usuarios (
-                    id INT PRIMARY KEY,
-                    username VARCHAR(255) NOT NULL,
-                    password VARCHAR(255) NOT NULL,
-                    role VARCHAR(50) NOT NULL CHECK (role IN ('admin', 'client'))
-                )
-            """)
-            
-            # Crear tabla productos si no existe (sin DROP)
-            self._execute_query("""
-                CREATE TABLE IF NOT EXISTS productos (
-                    id SERIAL PRIMARY KEY,
-                    nombre VARCHAR(255) UNIQUE NOT NULL,
-                    unidades INT NOT NULL CHECK (unidades >= 0),
-                    costo NUMERIC(15,2) NOT NULL CHECK (costo > 0)
-                )
-            """)
+            conn = replica.connect()
+            connect_ms = (time.perf_counter() - inicio) * 1000
+            inicio = time.perf_counter()
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute(query, params)
+                result = [dict(row) for row in cur.fetchall()]
+            rows = len(result)
+            execute_ms = (time.perf_counter() - inicio) * 1000
+            return result
+        except psycopg2.OperationalError:
+            error = True
+            raise
+        except psycopg2.Error as e:
+            error = True
+            raise Exception(f"Error en la base de datos: {str(e)}")
+        finally:
+            if conn:
+                replica.release(conn)
+            self.stats.record(f'{caller}@replica', query, params,
+                              connect_ms, execute_ms, 0.0, rows, error)
 
-            # Crear tabla cotizaciones
-            self._execute_query("""
-                CREATE TABLE IF NOT EXISTS cotizaciones (
-                    id SERIAL PRIMARY KEY,
-                    usuario_id INT NOT NULL,
-                    fecha TIMESTAMP DEFAULT NOW(),
-                    cliente_tipo_doc VARCHAR(50) NOT NULL,
-                    cliente_num_doc VARCHAR(50) NOT NULL,
-                    cliente_nombres VARCHAR(255) NOT NULL,
-                    cliente_apellidos VARCHAR(255) NOT NULL,
-                    cliente_telefono VARCHAR(50) NOT NULL,
-                    cliente_email VARCHAR(255) NOT NULL,
-                    subtotal NUMERIC(10,2) NOT NULL,
-                    iva NUMERIC(10,2) NOT NULL,
-                    total NUMERIC(10,2) NOT NULL,
-                    FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-                )
-            """)
+    def initialize_database(self):
+        """Comprobar que la base tenga el esquema que espera esta versión de la aplicación.
 
-            # Crear tabla cotizacion_detalles
-            self._execute_query("""
-                CREATE TABLE IF NOT EXISTS cotizacion_detalles (
-                    id SERIAL PRIMARY KEY,
-                    cotizacion_id INT NOT NULL,
-                    ambiente INT NOT NULL,
-                    producto_id INT NOT NULL,
-                    cantidad INT NOT NULL,
-                    precio_unitario NUMERIC(10,2) NOT NULL,
-                    FOREIGN KEY (cotizacion_id) REFERENCES cotizaciones(id),
-                    FOREIGN KEY (producto_id) REFERENCES productos(id)
-                )
-            """)
+        Solo lee la versión: las migraciones las aplica migrate_database() desde
+        migrar_base.py o al arrancar api_server.py, no cada inicio de la aplicación.
+        """
+        version = self.get_schema_version()
+        if version < SCHEMA_VERSION:
+            raise Exception(
+                f"Esquema de la base de datos desactualizado (v{version}, se requiere "
+                f"v{SCHEMA_VERSION}): ejecute python migrar_base.py"
+            )
 
-            # Verificar usuarios existentes
-            users = self._execute_query('SELECT * FROM usuarios', fetch=True)
-            if not users:
-                admin_user = {
-                    "id": 1072649746,
-                    "username": "admin",
-                    "password": "admin123",
-                    "role": "admin"
-                }
-                self._execute_query(
-                    'INSERT INTO usuarios (id, username, password, role) VALUES (%s, %s, %s, %s)',
-                    (admin_user['id'], admin_user['username'], admin_user['password'], admin_user['role'])
-                )
+    def get_schema_version(self):
+        """Versión del esquema aplicada (0 si la base nunca se migró)"""
+        existe = self._execute_query(
+            "SELECT to_regclass('esquema_version') IS NOT NULL AS existe", fetch=True
+        )[0]['existe']
+        if not existe:
+            return 0
+        return self._execute_query(
+            "SELECT COALESCE(MAX(version), 0) AS version FROM esquema_version", fetch=True
+        )[0]['version']
 
-            # Verificar si hay productos
-            products = self._execute_query('SELECT * FROM productos', fetch=True)
-            if not products:  # Solo insertar productos por defecto si no hay ninguno
-                productos_default = [
-                    {
-                        "nombre": "Google Assistant Nest",
-                        "unidades": 140,
-                        "costo": 223076.00
-                    },
-                    {
-                        "nombre": "Foco LED RGB Controlado",
-                        "unidades": 30,
-                        "costo": 61876.00
-                    },
-                    {
-                        "nombre": "Control Remoto Universal",
-                        "unidades": 25,
-                        "costo": 91636.00
-                    }
-                ]
-                
-                for producto in productos_default:
-                    try:
-                        self._execute_query(
-                            'INSERT INTO productos (nombre, unidades, costo) VALUES (%s, %s, %s)',
-                            (producto['nombre'], producto['unidades'], float(producto['costo']))
-                        )
-                    except Exception as e:
-                        print(f"Error insertando producto {producto['nombre']}: {str(e)}")
-                        continue
+    def migrate_database(self):
+        """Crear o actualizar el esquema hasta SCHEMA_VERSION en una sola transacción.
+
+        Si la base ya está al día solo se lee la versión. Las sentencias toman
+        bloqueos exclusivos sobre las tablas: se ejecutan una vez por despliegue
+        (migrar_base.py o api_server.py), no desde cada tableta.
+        Devuelve True si se aplicó la migración.
+        """
+        if self.get_schema_version() >= SCHEMA_VERSION:
+            return False
+
+        # Cotizaciones particionadas por mes (las tablas antiguas se migran una vez)
+        legacy = self._execute_query("""
+            SELECT relkind FROM pg_class
+            WHERE relname = 'cotizaciones' AND relnamespace = 'public'::regnamespace
+        """, fetch=True)
+        if legacy and legacy[0]['relkind'] == 'r':
+            cotizaciones = self._legacy_cotizaciones_script()
+        else:
+            cotizaciones = [COTIZACIONES_DDL, DETALLES_DDL]
+
+        script = [
+            # Dos migraciones simultáneas se ejecutan una detrás de otra
+            f"SELECT pg_advisory_xact_lock({SCHEMA_LOCK_KEY})",
+            """CREATE TABLE IF NOT EXISTS esquema_version (
+                   version INT NOT NULL,
+                   fecha TIMESTAMPTZ NOT NULL DEFAULT NOW()
+               )""",
+            """CREATE TABLE IF NOT EXISTS usuarios (
+                   id INT PRIMARY KEY,
+                   username VARCHAR(255) NOT NULL,
+                   password VARCHAR(255) NOT NULL,
+                   role VARCHAR(50) NOT NULL CHECK (role IN ('admin', 'client'))
+               )""",
+            """CREATE TABLE IF NOT EXISTS productos (
+                   id SERIAL PRIMARY KEY,
+                   nombre VARCHAR(255) UNIQUE NOT NULL,
+                   unidades INT NOT NULL CHECK (unidades >= 0),
+                   costo NUMERIC(15,2) NOT NULL CHECK (costo > 0)
+               )""",
+
+            # Directorio de clientes: las cotizaciones dejan de copiar los datos del cliente
+            """CREATE TABLE IF NOT EXISTS clientes (
+                   id SERIAL PRIMARY KEY,
+                   tipo_doc VARCHAR(50) NOT NULL,
+                   num_doc VARCHAR(50) NOT NULL,
+                   nombres VARCHAR(255) NOT NULL,
+                   apellidos VARCHAR(255) NOT NULL,
+                   telefono VARCHAR(50) NOT NULL,
+                   email VARCHAR(255) NOT NULL,
+                   updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+               )""",
+            "CREATE UNIQUE INDEX IF NOT EXISTS clientes_documento_idx ON clientes (tipo_doc, num_doc)",
+            # text_pattern_ops permite usar el índice en LIKE 'prefijo%' con cualquier collation
+            """CREATE INDEX IF NOT EXISTS clientes_num_doc_prefijo_idx
+               ON clientes (num_doc text_pattern_ops)""",
+            """CREATE INDEX IF NOT EXISTS clientes_apellidos_prefijo_idx
+               ON clientes (lower(apellidos) text_pattern_ops)""",
+
+            *cotizaciones,
+            "CREATE INDEX IF NOT EXISTS cotizaciones_usuario_idx ON cotizaciones (usuario_id, fecha)",
+            "CREATE INDEX IF NOT EXISTS cotizaciones_cliente_idx ON cotizaciones (cliente_id)",
+            """CREATE INDEX IF NOT EXISTS cotizacion_detalles_cotizacion_idx
+               ON cotizacion_detalles (cotizacion_id)""",
 
+            # Versionado del catálogo: cada fila guarda el ID de la transacción que la
+            # modificó por última vez y las eliminaciones quedan registradas
+            "ALTER TABLE productos ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0",
+            "CREATE INDEX IF NOT EXISTS productos_version_idx ON productos (version)",
+            # Fecha de última modificación y eliminación lógica (tombstone)
+            """ALTER TABLE productos
+               ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+               ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ""",
+            "CREATE INDEX IF NOT EXISTS productos_updated_at_idx ON productos (updated_at)",
+            """CREATE TABLE IF NOT EXISTS productos_eliminados (
+                   producto_id INT PRIMARY KEY,
+                   version BIGINT NOT NULL
+               )""",
+            """CREATE INDEX IF NOT EXISTS productos_eliminados_version_idx
+               ON productos_eliminados (version)""",
+            """CREATE OR REPLACE FUNCTION productos_set_version() RETURNS trigger AS $$
+               BEGIN
+                   NEW.version := pg_current_xact_id()::text::bigint;
+                   NEW.updated_at := NOW();
+                   RETURN NEW;
+               END;
+               $$ LANGUAGE plpgsql""",
+            """CREATE OR REPLACE FUNCTION productos_registrar_eliminado() RETURNS trigger AS $$
+               BEGIN
+                   INSERT INTO productos_eliminados (producto_id, version)
+                   VALUES (OLD.id, pg_current_xact_id()::text::bigint)
+                   ON CONFLICT (producto_id) DO UPDATE SET version = EXCLUDED.version;
+                   RETURN OLD;
+               END;
+               $$ LANGUAGE plpgsql""",
+            # El reemplazo va en la misma transacción que el resto: entre el DROP y el
+            # CREATE una escritura quedaría sin versión y la sincronización no la vería
+            "DROP TRIGGER IF EXISTS productos_version_trg ON productos",
+            """CREATE TRIGGER productos_version_trg
+               BEFORE INSERT OR UPDATE ON productos
+               FOR EACH ROW EXECUTE FUNCTION productos_set_version()""",
+            "DROP TRIGGER IF EXISTS productos_eliminado_trg ON productos",
+            """CREATE TRIGGER productos_eliminado_trg
+               AFTER DELETE ON productos
+               FOR EACH ROW EXECUTE FUNCTION productos_registrar_eliminado()""",
+
+            # Inventario como libro de movimientos (solo inserciones) con fotos periódicas;
+            # productos.unidades solo guarda las unidades iniciales del producto
+            """CREATE TABLE IF NOT EXISTS movimientos_inventario (
+                   id BIGSERIAL PRIMARY KEY,
+                   producto_id INT NOT NULL REFERENCES productos(id),
+                   tipo VARCHAR(20) NOT NULL CHECK (tipo IN ('cotizacion', 'reposicion', 'ajuste')),
+                   cantidad INT NOT NULL,
+                   fecha TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                   version BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint,
+                   usuario_id INT,
+                   cotizacion_id INT
+               )""",
+            """CREATE INDEX IF NOT EXISTS movimientos_inventario_producto_idx
+               ON movimientos_inventario (producto_id, version)""",
+            """CREATE INDEX IF NOT EXISTS movimientos_inventario_version_idx
+               ON movimientos_inventario (version)""",
+            # La fecha crece con el id: un índice BRIN es suficiente y casi no ocupa espacio
+            """CREATE INDEX IF NOT EXISTS movimientos_inventario_fecha_idx
+               ON movimientos_inventario USING brin (fecha)""",
+            # Las fotos delimitadas por id (primera versión) se descartan: son derivables
+            # del libro y snapshot_inventory() las vuelve a generar
+            """DO $$
+               BEGIN
+                   IF to_regclass('inventario_snapshots') IS NOT NULL AND NOT EXISTS (
+                       SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'inventario_snapshots' AND column_name = 'hasta_version'
+                   ) THEN
+                       DROP TABLE inventario_snapshots CASCADE;
+                   END IF;
+               END $$""",
+            """CREATE TABLE IF NOT EXISTS inventario_snapshots (
+                   producto_id INT NOT NULL REFERENCES productos(id),
+                   hasta_version BIGINT NOT NULL,
+                   unidades INT NOT NULL,
+                   fecha TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                   PRIMARY KEY (producto_id, hasta_version)
+               )""",
+            STOCK_ACTUAL_VIEW,
+
+            # El contador de una sola fila que versionaba el catálogo serializaba todas
+            # las escrituras de stock; la versión se deriva ahora de los xid (ver
+            # get_catalog_version)
+            "DROP TRIGGER IF EXISTS productos_catalogo_version_trg ON productos",
+            "DROP TRIGGER IF EXISTS movimientos_catalogo_version_trg ON movimientos_inventario",
+            "DROP FUNCTION IF EXISTS catalogo_incrementar_version()",
+            "DROP TABLE IF EXISTS catalogo_version",
+
+            # Pasar los clientes de cotizaciones antiguas al directorio (el dato más reciente gana)
+            """INSERT INTO clientes (tipo_doc, num_doc, nombres, apellidos, telefono, email)
+               SELECT DISTINCT ON (cliente_tipo_doc, cliente_num_doc)
+                      cliente_tipo_doc, cliente_num_doc, cliente_nombres,
+                      cliente_apellidos, cliente_telefono, cliente_email
+               FROM cotizaciones
+               WHERE cliente_id IS NULL AND cliente_num_doc IS NOT NULL
+               ORDER BY cliente_tipo_doc, cliente_num_doc, fecha DESC
+               ON CONFLICT (tipo_doc, num_doc) DO NOTHING""",
+            """UPDATE cotizaciones c
+               SET cliente_id = cl.id,
+                   cliente_tipo_doc = NULL, cliente_num_doc = NULL, cliente_nombres = NULL,
+                   cliente_apellidos = NULL, cliente_telefono = NULL, cliente_email = NULL
+               FROM clientes cl
+               WHERE c.cliente_id IS NULL
+                 AND cl.tipo_doc = c.cliente_tipo_doc AND cl.num_doc = c.cliente_num_doc""",
+
+            # Tablero de administración: agregados precalculados que se refrescan
+            # en segundo plano (REFRESH CONCURRENTLY necesita un índice único)
+            """CREATE MATERIALIZED VIEW IF NOT EXISTS ventas_producto_dia AS
+               SELECT cotizacion_fecha::date AS dia,
+                      producto_id,
+                      SUM(cantidad)::bigint AS unidades,
+                      SUM(cantidad * precio_unitario)::numeric(15,2) AS ingresos
+               FROM cotizacion_detalles
+               GROUP BY cotizacion_fecha::date, producto_id""",
+            """CREATE UNIQUE INDEX IF NOT EXISTS ventas_producto_dia_idx
+               ON ventas_producto_dia (dia, producto_id)""",
+            """CREATE MATERIALIZED VIEW IF NOT EXISTS ventas_vendedor_dia AS
+               SELECT fecha::date AS dia,
+                      usuario_id,
+                      COUNT(*)::bigint AS cotizaciones,
+                      SUM(total)::numeric(15,2) AS ingresos
+               FROM cotizaciones
+               GROUP BY fecha::date, usuario_id""",
+            """CREATE UNIQUE INDEX IF NOT EXISTS ventas_vendedor_dia_idx
+               ON ventas_vendedor_dia (dia, usuario_id)""",
+
+            # Usuario administrador y productos por defecto, solo en una base vacía
+            """INSERT INTO usuarios (id, username, password, role)
+               SELECT 1072649746, 'admin', 'admin123', 'admin'
+               WHERE NOT EXISTS (SELECT 1 FROM usuarios)""",
+            """INSERT INTO productos (nombre, unidades, costo)
+               SELECT v.nombre, v.unidades, v.costo
+               FROM (VALUES ('Google Assistant Nest', 140, 223076.00),
+                            ('Foco LED RGB Controlado', 30, 61876.00),
+                            ('Control Remoto Universal', 25, 91636.00)) AS v(nombre, unidades, costo)
+               WHERE NOT EXISTS (SELECT 1 FROM productos)""",
+            # Productos sin movimientos (anteriores al libro o creados por fuera de
+            # add_product) arrancan con un ajuste por sus unidades actuales
+            """INSERT INTO movimientos_inventario (producto_id, tipo, cantidad)
+               SELECT p.id, 'ajuste', p.unidades
+               FROM productos p
+               WHERE NOT EXISTS (SELECT 1 FROM movimientos_inventario m WHERE m.producto_id = p.id)""",
+
+            f"INSERT INTO esquema_version (version) VALUES ({SCHEMA_VERSION})",
+        ]
+        try:
+            self._execute_query(';\n'.join(script))
         except Exception as e:
-            print(f"Error en inicialización: {str(e)}")
+            print(f"Error en la migración: {str(e)}")
             raise
 
+        try:
+            self.ensure_cotizacion_partitions()
+        except Exception as e:
+            # Sin la partición del mes las cotizaciones siguen entrando en la
+            # partición por defecto; el mantenimiento del servidor lo reintenta
+            logger.error("%s", e)
+        return True
+
+    def ensure_cotizacion_partitions(self, desde=None, meses_adelante=PARTITION_MONTHS_AHEAD):
+        """Crear las particiones mensuales desde `desde` (por defecto, el mes actual) en adelante.
+
+        Cada mes se crea en su propia transacción; si alguno falla se siguen
+        creando los demás y al final se lanza un error con los meses fallidos.
+        Devuelve los meses creados ('YYYY_MM').
+        """
+        hoy = date.today()
+        # Las filas fuera de rango caen en la partición por defecto en vez de fallar
+        self._execute_query(
+            "CREATE TABLE IF NOT EXISTS cotizaciones_default PARTITION OF cotizaciones DEFAULT"
+        )
+        self._execute_query(
+            "CREATE TABLE IF NOT EXISTS cotizacion_detalles_default PARTITION OF cotizacion_detalles DEFAULT"
+        )
+
+        existentes = {
+            row['relname'] for row in self._execute_query("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'cotizaciones'::regclass
+            """, fetch=True)
+        }
+        creados = []
+        fallidos = []
+        mes = _month_start(desde or hoy)
+        hasta = _add_months(_month_start(hoy), meses_adelante)
+        while mes <= hasta:
+            sufijo = mes.strftime('%Y_%m')
+            if f'cotizaciones_{sufijo}' not in existentes:
+                try:
+                    self._execute_query(';\n'.join(_month_partition_script(mes)))
+                    creados.append(sufijo)
+                except Exception as e:
+                    logger.error("No se pudo crear la partición %s de cotizaciones: %s", sufijo, e)
+                    fallidos.append(sufijo)
+            mes = _add_months(mes, 1)
+
+        if fallidos:
+            raise Exception(f"Error creando particiones de cotizaciones: {', '.join(fallidos)}")
+        return creados
+
+    def _legacy_cotizaciones_script(self):
+        """Sentencias que pasan las tablas sin particionar a tablas particionadas"""
+        columnas = self._execute_query("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = 'cotizaciones'
+        """, fetch=True)
+        columnas = [c['column_name'] for c in columnas if c['column_name'] != 'fecha']
+        desde = self._execute_query(
+            "SELECT MIN(fecha) AS desde FROM cotizaciones", fetch=True
+        )[0]['desde'] or datetime.now()
+        lista = ', '.join(columnas)
+
+        script = [
+            # Otra migración pudo convertirlas mientras se esperaba el bloqueo
+            """DO $$
+               BEGIN
+                   IF (SELECT relkind FROM pg_class
+                       WHERE relname = 'cotizaciones' AND relnamespace = 'public'::regnamespace) <> 'r' THEN
+                       RAISE EXCEPTION 'Las cotizaciones ya están particionadas; vuelva a ejecutar la migración';
+                   END IF;
+               END $$""",
+            # Las vistas del tablero dependen de las tablas antiguas; se recrean después
+            "DROP MATERIALIZED VIEW IF EXISTS ventas_producto_dia, ventas_vendedor_dia",
+            "ALTER TABLE cotizacion_detalles RENAME TO cotizacion_detalles_legacy",
+            "ALTER TABLE cotizaciones RENAME TO cotizaciones_legacy",
+            COTIZACIONES_DDL,
+            DETALLES_DDL,
+            *_partition_ddl(desde, _month_start(date.today())),
+            "CREATE TABLE cotizaciones_default PARTITION OF cotizaciones DEFAULT",
+            "CREATE TABLE cotizacion_detalles_default PARTITION OF cotizacion_detalles DEFAULT",
+            f"""INSERT INTO cotizaciones ({lista}, fecha)
+                SELECT {lista}, COALESCE(fecha, NOW()) FROM cotizaciones_legacy""",
+            """INSERT INTO cotizacion_detalles (
+                   id, cotizacion_id, cotizacion_fecha, ambiente, producto_id, cantidad, precio_unitario
+               )
+               SELECT d.id, d.cotizacion_id, COALESCE(c.fecha, NOW()), d.ambiente,
+                      d.producto_id, d.cantidad, d.precio_unitario
+               FROM cotizacion_detalles_legacy d
+               JOIN cotizaciones_legacy c ON c.id = d.cotizacion_id""",
+            """SELECT setval(pg_get_serial_sequence('cotizaciones', 'id'),
+                             COALESCE((SELECT MAX(id) FROM cotizaciones), 0) + 1, false)""",
+            """SELECT setval(pg_get_serial_sequence('cotizacion_detalles', 'id'),
+                             COALESCE((SELECT MAX(id) FROM cotizacion_detalles), 0) + 1, false)""",
+            "DROP TABLE cotizacion_detalles_legacy",
+            "DROP TABLE cotizaciones_legacy",
+        ]
+        print(f"Migrando cotizaciones a tablas particionadas (desde {desde:%Y-%m})")
+        return script
+
+    def archive_cotizaciones(self, antes_de, eliminar=False, esquema='archivo'):
+        """Separar las particiones de meses anteriores a `antes_de`.
+
+        Las tablas separadas se mueven al esquema `esquema` (o se eliminan con
+        eliminar=True) y dejan de leerse en las consultas de cotizaciones.
+        Devuelve los meses archivados ('YYYY_MM').
+        """
+        try:
+            limite = _month_start(antes_de)
+            particiones = self._execute_query("""
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'cotizaciones'::regclass
+                ORDER BY c.relname
+            """, fetch=True)
+
+            meses = []
+            for p in particiones:
+                m = re.fullmatch(r'cotizaciones_(\d{4})_(\d{2})', p['relname'])
+                if m and _add_months(date(int(m[1]), int(m[2]), 1), 1) <= limite:
+                    meses.append(f"{m[1]}_{m[2]}")
+
+            for mes in meses:
+                cotizaciones = f"cotizaciones_{mes}"
+                detalles = f"cotizacion_detalles_{mes}"
+                script = [
+                    f"ALTER TABLE cotizacion_detalles DETACH PARTITION {detalles}",
+                    # La FK hacia cotizaciones impediría separar la partición de cotizaciones
+                    f"""DO $$
+                        DECLARE r record;
+                        BEGIN
+                            FOR r IN SELECT conname FROM pg_constraint
+                                     WHERE conrelid = '{detalles}'::regclass AND contype = 'f'
+                                       AND conparentid = 0 AND confrelid = 'cotizaciones'::regclass
+                            LOOP
+                                EXECUTE format('ALTER TABLE {detalles} DROP CONSTRAINT %I', r.conname);
+                            END LOOP;
+                        END $$""",
+                    f"ALTER TABLE cotizaciones DETACH PARTITION {cotizaciones}",
+                ]
+                if eliminar:
+                    script += [f"DROP TABLE {detalles}", f"DROP TABLE {cotizaciones}"]
+                else:
+                    script += [
+                        f"CREATE SCHEMA IF NOT EXISTS {esquema}",
+                        f"ALTER TABLE {detalles} SET SCHEMA {esquema}",
+                        f"ALTER TABLE {cotizaciones} SET SCHEMA {esquema}",
+                    ]
+                self._execute_query(';\n'.join(script))
+            return meses
+        except Exception as e:
+            raise Exception(f"Error archivando cotizaciones: {str(e)}")
+
     def validate_user(self, id_number, password):
-        query = 'SELECT * FROM usuarios WHERE id = %s'
-        users = self._execute_query(query, (id_number,), fetch=True)
+        users = self._execute_query(USUARIO_PASSWORD_SELECT, (id_number,), fetch=True)
         return users and users[0]['password'] == password
 
     def get_user_role(self, id_number):
-        query = 'SELECT role FROM usuarios WHERE id = %s'
-        users = self._execute_query(query, (id_number,), fetch=True)
+        users = self._execute_query(USUARIO_ROL_SELECT, (id_number,), fetch=True)
         return users[0]['role'] if users else None
 
     def get_user_data(self, id_number):
-        """Obtener datos completos de un usuario"""
-        query = 'SELECT * FROM usuarios WHERE id = %s'
-        users = self._execute_query(query, (id_number,), fetch=True)
+        """Obtener los datos de un usuario (sin la contraseña)"""
+        users = self._execute_query(USUARIO_SELECT, (id_number,), fetch=True)
         return users[0] if users else None
 
     def get_all_users(self):
-        query = 'SELECT * FROM usuarios'
-        users = self._execute_query(query, fetch=True)
+        users = self._execute_query(USUARIOS_SELECT, fetch=True)
         return [(str(user['id']), {
             'username': user['username'],
             'role': user['role']
@@ -190,16 +1396,87 @@ class Database:
     def get_all_products(self):
         """Obtener todos los productos con manejo de errores mejorado"""
         try:
-            query = """
-                SELECT id, nombre, unidades, costo::numeric(15,2) as costo
-                FROM productos
-                ORDER BY nombre
-            """
-            return self._execute_query(query, fetch=True)
+            return self._execute_query(PRODUCTOS_SELECT, fetch=True)
         except Exception as e:
             print(f"Error obteniendo productos: {str(e)}")
             return []
 
+    def get_catalog(self):
+        """Productos vigentes para el listado con ETag del servidor.
+
+        Siempre se lee del primario: el cuerpo no puede ser más antiguo que la
+        versión leída antes. A diferencia de get_all_products, los errores se
+        propagan en lugar de devolver una lista vacía que quedaría cacheada.
+        """
+        return self._execute_query(PRODUCTOS_SELECT, fetch=True)
+
+    def get_catalog_version(self):
+        """Versión del catálogo: cambia con cada alta, modificación, eliminación o
+        movimiento de stock confirmado. None si en este momento no es confiable
+        (ver _stable_catalog_version); quien la usa debe comparar el contenido."""
+        result = self._execute_query(CATALOG_VERSION_SELECT, fetch=True)
+        return _stable_catalog_version(result[0])
+
+    def get_product_changes_since(self, version=0):
+        """Productos modificados y eliminados desde `version`.
+
+        Devuelve {'version', 'changed', 'deleted'}; la próxima consulta debe usar
+        la 'version' recibida. Esa marca es el xmin del snapshot tomado antes de
+        leer, así que las transacciones que seguían abiertas se vuelven a incluir
+        en la siguiente consulta en lugar de perderse.
+        """
+        try:
+            marca = self._execute_query(VERSION_WATERMARK_SELECT, fetch=True)[0]['version']
+            rows = self._execute_query(PRODUCT_CHANGES_SELECT, (version, version), fetch=True)
+            deleted = self._execute_query(PRODUCTOS_ELIMINADOS_SELECT, (version,), fetch=True)
+            return {
+                'version': marca,
+                'changed': [_without_deleted_at(row) for row in rows if row['deleted_at'] is None],
+                'deleted': [row['id'] for row in rows if row['deleted_at'] is not None]
+                           + [row['producto_id'] for row in deleted]
+            }
+        except Exception as e:
+            raise Exception(f"Error obteniendo cambios del catálogo: {str(e)}")
+
+    def get_products_changed_since(self, ts=None):
+        """Variante por fecha de get_product_changes_since (todos los vigentes si `ts` es None).
+
+        Devuelve {'timestamp', 'changed', 'deleted'}; la próxima consulta debe usar
+        el 'timestamp' recibido: el inicio de la transacción abierta más antigua.
+        Para verla en otras sesiones el usuario necesita el rol pg_read_all_stats;
+        sin él se lanza un error en lugar de devolver una marca que saltaría
+        cambios. Los clientes nuevos deben usar get_product_changes_since.
+        """
+        try:
+            marca = self._execute_query(TIMESTAMP_WATERMARK_SELECT, fetch=True)[0]
+            if not marca['permitido']:
+                raise Exception("se requiere el rol pg_read_all_stats; use get_product_changes_since")
+
+            if ts is None:
+                cambios = self.get_product_changes_since(0)
+                return {'timestamp': marca['ts'], 'changed': cambios['changed'], 'deleted': []}
+
+            rows = self._execute_query(PRODUCTS_CHANGED_SELECT, (ts, ts), fetch=True)
+            return {
+                'timestamp': marca['ts'],
+                'changed': [_without_deleted_at(row) for row in rows if row['deleted_at'] is None],
+                'deleted': [row['id'] for row in rows if row['deleted_at'] is not None]
+            }
+        except Exception as e:
+            raise Exception(f"Error obteniendo cambios del catálogo: {str(e)}")
+
+    def delete_product(self, nombre):
+        """Eliminación lógica: el producto deja de listarse pero se conserva su historial"""
+        try:
+            result = self._execute_query(PRODUCTO_DELETE, (nombre,), fetch=True)
+
+            if not result:
+                raise Exception(f"No se encontró el producto: {nombre}")
+            return result[0]['id']
+
+        except Exception as e:
+            raise Exception(f"Error eliminando producto: {str(e)}")
+
     def add_product(self, nombre, unidades, costo):
         """Agregar producto con validaciones mejoradas"""
         try:
@@ -225,20 +1502,14 @@ class Database:
             except (ValueError, TypeError):
                 raise ValueError("El costo debe ser un número válido")
 
-            query = """
-                INSERT INTO productos (nombre, unidades, costo)
-                VALUES (%s, %s, %s::numeric(15,2))
-                RETURNING id, nombre, costo
-            """
-            
-            result = self._execute_query(query, 
-                                      (nombre.strip(), unidades, costo), 
+            result = self._execute_query(PRODUCTO_INSERT,
+                                      (nombre.strip(), unidades, costo, unidades),
                                       fetch=True)
             
             if result:
                 print(f"Producto agregado exitosamente: {result[0]}")
                 return result[0]['id']
-            raise Exception("No se pudo agregar el producto")
+            raise Exception("Ya existe un producto con ese nombre")
             
         except psycopg2.errors.NumericValueOutOfRange:
             raise ValueError("El costo excede el límite permitido (máximo: 9,999,999,999.99)")
@@ -247,16 +1518,25 @@ class Database:
         except Exception as e:
             raise Exception(f"Error agregando producto: {str(e)}")
 
+    def _append_movement(self, nombre, tipo, cantidad_sql, params, usuario_id=None, cotizacion_id=None):
+        """Registrar un movimiento con el producto bloqueado y devolver {unidades, aplicado}.
+
+        `cantidad_sql` es la expresión de la cantidad (ver _movimiento_insert) y
+        `params` sus parámetros. El movimiento se omite si dejaría el stock en
+        negativo.
+        """
+        result = self._execute_query(
+            f"{MOVIMIENTO_LOCK};\n{_movimiento_insert(cantidad_sql)}",
+            (nombre, nombre, tipo, *params, usuario_id, cotizacion_id, *params), fetch=True
+        )
+
+        if not result:
+            raise Exception(f"No se encontró el producto: {nombre}")
+        return result[0]
+
     def update_product_units(self, nombre, nuevas_unidades):
-        """Actualizar unidades con verificación"""
+        """Fijar el stock: se registra un ajuste por la diferencia con el stock actual"""
         try:
-            # Primero verificamos si el producto existe
-            check_query = "SELECT id FROM productos WHERE nombre = %s"
-            result = self._execute_query(check_query, (nombre,), fetch=True)
-            
-            if not result:
-                raise Exception(f"No se encontró el producto: {nombre}")
-
             try:
                 nuevas_unidades = int(nuevas_unidades)
                 if nuevas_unidades < 0:
@@ -264,27 +1544,27 @@ class Database:
             except ValueError:
                 raise ValueError("Las unidades deben ser un número entero positivo")
 
-            query = """
-                UPDATE productos 
-                SET unidades = %s
-                WHERE nombre = %s
-                RETURNING id, unidades
-            """
-            result = self._execute_query(query, (nuevas_unidades, nombre), fetch=True)
-            
-            if not result:
-                raise Exception("No se pudo actualizar el producto")
-                
-            return result[0]['unidades']
+            result = self._append_movement(nombre, 'ajuste', AJUSTE_CANTIDAD, (nuevas_unidades,))
+            return result['unidades']
             
         except Exception as e:
             raise Exception(f"Error actualizando unidades: {str(e)}")
 
+    def restock_product(self, nombre, unidades, usuario_id=None):
+        """Sumar unidades al stock (reposición)"""
+        try:
+            unidades = int(unidades)
+            if unidades <= 0:
+                raise ValueError("Las unidades deben ser un número entero positivo")
+            result = self._append_movement(nombre, 'reposicion', REPOSICION_CANTIDAD, (unidades,), usuario_id)
+            return result['unidades']
+        except Exception as e:
+            raise Exception(f"Error reponiendo unidades: {str(e)}")
+
     def check_stock(self, nombre, cantidad):
         """Verificar stock disponible"""
         try:
-            query = "SELECT unidades FROM productos WHERE nombre = %s"
-            result = self._execute_query(query, (nombre,), fetch=True)
+            result = self._execute_query(STOCK_SELECT, (nombre,), fetch=True)
             
             if not result:
                 raise Exception(f"Producto no encontrado: {nombre}")
@@ -298,32 +1578,11 @@ class Database:
     def update_user(self, id_number, username=None, password=None, role=None):
         """Actualizar información de usuario con manejo de transacciones"""
         try:
-            updates = []
-            params = []
-            if username:
-                updates.append("username = %s")
-                params.append(username)
-            if password:
-                updates.append("password = %s")
-                params.append(password)
-            if role and str(id_number) != 'admin':
-                if role not in ('admin', 'client'):
-                    raise ValueError("Rol inválido. Debe ser 'admin' o 'client'")
-                updates.append("role = %s")
-                params.append(role)
-
-            if not updates:
+            update = _usuario_update(id_number, username, password, role)
+            if update is None:
                 return True
 
-            params.append(id_number)
-            query = f"""
-                UPDATE usuarios 
-                SET {', '.join(updates)}
-                WHERE id = %s
-                RETURNING id, username, role
-            """
-            
-            result = self._execute_query(query, params, fetch=True)
+            result = self._execute_query(*update, fetch=True)
             if not result:
                 raise Exception("Usuario no encontrado")
                 
@@ -338,8 +1597,7 @@ class Database:
             if str(id_number) == 'admin':
                 raise ValueError("No se puede eliminar el usuario administrador")
                 
-            query = "DELETE FROM usuarios WHERE id = %s RETURNING id"
-            result = self._execute_query(query, (id_number,), fetch=True)
+            result = self._execute_query(USUARIO_DELETE, (id_number,), fetch=True)
             
             if not result:
                 raise Exception("Usuario no encontrado")
@@ -357,13 +1615,8 @@ class Database:
             if role not in ('admin', 'client'):
                 raise ValueError("Rol inválido. Debe ser 'admin' o 'client'")
                 
-            query = """
-                INSERT INTO usuarios (id, username, password, role)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id, username, role
-            """
             result = self._execute_query(
-                query, 
+                USUARIO_INSERT,
                 (id_number, username, password, role),
                 fetch=True
             )
@@ -379,79 +1632,189 @@ class Database:
     def create_cotizacion(self, usuario_id, cliente_data, valores):
         """Crear cotización incluyendo el ID del usuario"""
         try:
-            query = """
-                INSERT INTO cotizaciones (
-                    usuario_id, cliente_tipo_doc, cliente_num_doc,
-                    cliente_nombres, cliente_apellidos, cliente_telefono,
-                    cliente_email, subtotal, iva, total
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """
-            params = (
-                usuario_id,
-                cliente_data['tipo_documento'],
-                cliente_data['numero_documento'],
-                cliente_data['nombres'],
-                cliente_data['apellidos'],
-                cliente_data['telefono'],
-                cliente_data['email'],
-                valores['subtotal'],
-                valores['iva'],
-                valores['total']
+            result = self._execute_query(
+                COTIZACION_INSERT, _cotizacion_params(usuario_id, cliente_data, valores), fetch=True
             )
-            result = self._execute_query(query, params, fetch=True)
             return result[0]['id'] if result else None
             
         except Exception as e:
             raise Exception(f"Error creando cotización: {str(e)}")
 
     def create_cotizacion_with_details(self, usuario_id, cliente_data, valores, detalles_ambientes):
-        """Crear cotización con sus detalles por ambiente"""
+        """Crear cotización con sus detalles por ambiente, en una sola transacción"""
         try:
-            # Primero crear la cotización
-            cotizacion_query = """
-                INSERT INTO cotizaciones (
-                    usuario_id, cliente_tipo_doc, cliente_num_doc,
-                    cliente_nombres, cliente_apellidos, cliente_telefono,
-                    cliente_email, subtotal, iva, total
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """
-            params = (
-                usuario_id,
-                cliente_data['tipo_documento'],
-                cliente_data['numero_documento'],
-                cliente_data['nombres'],
-                cliente_data['apellidos'],
-                cliente_data['telefono'],
-                cliente_data['email'],
-                valores['subtotal'],
-                valores['iva'],
-                valores['total']
+            result = self._execute_query(
+                COTIZACION_DETALLES_INSERT,
+                (*_cotizacion_params(usuario_id, cliente_data, valores), *_detalle_columnas(detalles_ambientes)),
+                fetch=True
             )
-            result = self._execute_query(cotizacion_query, params, fetch=True)
-            cotizacion_id = result[0]['id']
-
-            # Luego insertar los detalles por ambiente
-            for ambiente_num, productos in detalles_ambientes.items():
-                for producto_id, detalle in productos.items():
-                    detalle_query = """
-                        INSERT INTO cotizacion_detalles (
-                            cotizacion_id, ambiente, producto_id,
-                            cantidad, precio_unitario
-                        ) VALUES (%s, %s, %s, %s, %s)
-                    """
-                    self._execute_query(
-                        detalle_query,
-                        (cotizacion_id, ambiente_num, producto_id,
-                         detalle['cantidad'], detalle['precio_unitario'])
-                    )
-
-            return cotizacion_id
-            
+            return result[0]['id']
+
         except Exception as e:
             raise Exception(f"Error creando cotización: {str(e)}")
 
+    def search_clientes(self, prefijo, tipo_doc=None, limite=8):
+        """Clientes cuyo número de documento empieza por `prefijo` (autocompletado)"""
+        try:
+            rows = self._execute_query(
+                CLIENTES_SEARCH, _clientes_search_params(prefijo, tipo_doc, limite), fetch=True
+            )
+            return [_cliente_data(row) for row in rows]
+        except Exception as e:
+            print(f"Error buscando clientes: {str(e)}")
+            return []
+
+    def get_cotizaciones_with_details(self, ids=None, desde=None, hasta=None):
+        """Obtener cotizaciones con sus detalles en dos consultas (por IDs o rango de fechas)"""
+        try:
+            where, params = _cotizaciones_filter(ids, desde, hasta)
+
+            cotizaciones = self._execute_query(f"""
+                {COTIZACION_SELECT}
+                {where}
+                ORDER BY c.id
+            """, params, fetch=True)
+            if not cotizaciones:
+                return []
+
+            fechas = [c['fecha'] for c in cotizaciones]
+            detalles = self._execute_query(
+                DETALLES_SELECT, ([c['id'] for c in cotizaciones], min(fechas), max(fechas)), fetch=True
+            )
+            return _cotizaciones_with_details(cotizaciones, detalles)
+
+        except Exception as e:
+            raise Exception(f"Error obteniendo cotizaciones: {str(e)}")
+
+    def refresh_dashboard(self):
+        """Recalcular las vistas del tablero sin bloquear a quienes las están leyendo"""
+        try:
+            for vista in DASHBOARD_VIEWS:
+                self._execute_query(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {vista}")
+        except Exception as e:
+            raise Exception(f"Error actualizando tablero: {str(e)}")
+
+    def get_dashboard(self, dias=30, stock_minimo=10, limite=10):
+        """Productos más cotizados, ingresos por vendedor y productos con poco stock.
+
+        Las ventas salen de las vistas materializadas (a lo sumo `dias` filas por
+        producto o vendedor); el stock se lee directo de productos para que las
+        alertas no queden desactualizadas.
+        """
+        try:
+            productos = self._execute_query(DASHBOARD_PRODUCTOS_SELECT, (dias, limite), fetch=True)
+            vendedores = self._execute_query(DASHBOARD_VENDEDORES_SELECT, (dias, limite), fetch=True)
+            stock_bajo = self._execute_query(STOCK_BAJO_SELECT, (stock_minimo,), fetch=True)
+            return {
+                'productos': productos,
+                'vendedores': vendedores,
+                'stock_bajo': stock_bajo
+            }
+        except Exception as e:
+            raise Exception(f"Error obteniendo tablero: {str(e)}")
+
+    def decrement_product_units(self, nombre, cantidad, usuario_id=None, cotizacion_id=None):
+        """Descontar unidades registrando un movimiento (solo si hay stock suficiente)"""
+        try:
+            cantidad = int(cantidad)
+            if cantidad <= 0:
+                raise ValueError("La cantidad debe ser un número entero positivo")
+
+            result = self._append_movement(
+                nombre, 'cotizacion', COTIZACION_CANTIDAD, (cantidad,), usuario_id, cotizacion_id
+            )
+            if not result['aplicado']:
+                raise Exception(f"Stock insuficiente: {nombre}")
+            return result['unidades']
+
+        except Exception as e:
+            raise Exception(f"Error descontando unidades: {str(e)}")
+
+    def decrement_products(self, cantidades, usuario_id=None, cotizacion_id=None):
+        """Descontar las unidades de una cotización ({nombre: cantidad}) en una sola transacción.
+
+        Un producto sin stock suficiente no impide descontar los demás; se
+        informa en 'rechazados'. Devuelve {'unidades': {nombre: restantes},
+        'rechazados': {nombre: motivo}}.
+        """
+        try:
+            if not cantidades:
+                return {'unidades': {}, 'rechazados': {}}
+            nombres, valores = _descuento_params(cantidades)
+            rows = self._execute_query(
+                f"{DESCUENTO_LOCK};\n{DESCUENTO_INSERT}",
+                (nombres, nombres, valores, usuario_id, cotizacion_id), fetch=True
+            )
+            return _descuento_resultado(cantidades, rows)
+        except Exception as e:
+            raise Exception(f"Error descontando unidades: {str(e)}")
+
+    def snapshot_inventory(self):
+        """Guardar una foto del stock de los productos con movimientos nuevos.
+
+        La foto cubre los movimientos con xid menor que el xmin de la instantánea
+        actual: esas transacciones ya terminaron, así que ningún movimiento de
+        ese rango puede confirmarse después. No se bloquea la tabla; las
+        escrituras en curso quedan para la foto siguiente. Devuelve la cantidad
+        de fotos nuevas.
+        """
+        try:
+            result = self._execute_query("""
+                WITH marca AS (
+                    SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS version
+                ), previa AS (
+                    SELECT DISTINCT ON (producto_id) producto_id, hasta_version, unidades
+                    FROM inventario_snapshots
+                    ORDER BY producto_id, hasta_version DESC
+                ), nuevas AS (
+                    INSERT INTO inventario_snapshots (producto_id, hasta_version, unidades)
+                    SELECT m.producto_id, marca.version, COALESCE(p.unidades, 0) + SUM(m.cantidad)
+                    FROM movimientos_inventario m
+                    CROSS JOIN marca
+                    LEFT JOIN previa p ON p.producto_id = m.producto_id
+                    WHERE m.version >= COALESCE(p.hasta_version, 0) AND m.version < marca.version
+                    GROUP BY m.producto_id, marca.version, p.unidades
+                    ON CONFLICT (producto_id, hasta_version) DO NOTHING
+                    RETURNING 1
+                )
+                SELECT COUNT(*) AS fotos FROM nuevas
+            """, fetch=True)
+            return result[0]['fotos']
+        except Exception as e:
+            raise Exception(f"Error guardando fotos de inventario: {str(e)}")
+
+    def reconcile_inventory(self):
+        """Verificar que cada foto coincide con la anterior más los movimientos entre ambas.
+
+        Devuelve las diferencias encontradas (lista vacía si el libro cuadra),
+        incluidos los productos cuyo stock calculado es negativo.
+        """
+        try:
+            return self._execute_query("""
+                WITH fotos AS (
+                    SELECT producto_id, hasta_version, unidades,
+                           LAG(hasta_version, 1, 0::bigint) OVER w AS version_anterior,
+                           LAG(unidades, 1, 0) OVER w AS unidades_anteriores
+                    FROM inventario_snapshots
+                    WINDOW w AS (PARTITION BY producto_id ORDER BY hasta_version)
+                )
+                SELECT f.producto_id, f.hasta_version, f.unidades AS registradas,
+                       f.unidades_anteriores + COALESCE(SUM(m.cantidad), 0) AS calculadas
+                FROM fotos f
+                LEFT JOIN movimientos_inventario m
+                       ON m.producto_id = f.producto_id
+                      AND m.version >= f.version_anterior AND m.version < f.hasta_version
+                GROUP BY f.producto_id, f.hasta_version, f.unidades, f.unidades_anteriores
+                HAVING f.unidades <> f.unidades_anteriores + COALESCE(SUM(m.cantidad), 0)
+                UNION ALL
+                SELECT producto_id, NULL, NULL, unidades
+                FROM stock_actual
+                WHERE unidades < 0
+                ORDER BY producto_id
+            """, fetch=True)
+        except Exception as e:
+            raise Exception(f"Error conciliando inventario: {str(e)}")
+
 def test_connection():
     try:
         conn = psycopg2.connect(**DB_CONFIG)
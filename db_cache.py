@@ -0,0 +1,144 @@
+"""Memoización de las lecturas de Database con vencimiento (TTL) y tamaño máximo (LRU).
+
+CachedDatabase envuelve un Database (o un ApiDatabase) y expone los mismos
+métodos. Las lecturas configuradas en `ttls` se guardan por argumentos
+durante unos segundos; los métodos de escritura invalidan las lecturas que
+dependen de ellos. Los demás métodos se delegan sin cambios.
+
+Ejemplo:
+    db = CachedDatabase(Database(), ttls={'get_all_users': 60})
+    db.get_user_role('123')   # consulta la base
+    db.get_user_role('123')   # respuesta guardada
+    print(db.cache_stats())
+"""
+import copy
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Segundos que se reutiliza cada lectura (0 desactiva la memoización del método)
+DEFAULT_TTLS = {
+    'get_user_role': 60,
+    'get_user_data': 60,
+    'get_all_users': 30,
+    'check_stock': 5,
+    'get_dashboard': 30,
+    'search_clientes': 30,
+}
+
+# Entradas máximas entre todos los métodos
+DEFAULT_MAX_SIZE = int(os.getenv('DB_CACHE_SIZE', '512'))
+
+_USUARIOS = ('get_user_role', 'get_user_data', 'get_all_users')
+_STOCK = ('check_stock', 'get_dashboard')
+
+# Lecturas que deja obsoletas cada escritura
+INVALIDATIONS = {
+    'add_user': _USUARIOS,
+    'update_user': _USUARIOS,
+    'delete_user': _USUARIOS,
+    'add_product': _STOCK,
+    'delete_product': _STOCK,
+    'update_product_units': _STOCK,
+    'restock_product': _STOCK,
+    'decrement_product_units': _STOCK,
+    'decrement_products': _STOCK,
+    'snapshot_inventory': _STOCK,
+    'create_cotizacion': ('search_clientes',),
+    'create_cotizacion_with_details': ('search_clientes',),
+    'refresh_dashboard': ('get_dashboard',),
+}
+
+
+class CachedDatabase:
+    def __init__(self, db, ttls=None, max_size=DEFAULT_MAX_SIZE):
+        self.db = db
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_size = max_size
+        self._entries = OrderedDict()  # (método, args) -> (vence, valor)
+        self._counters = {}  # método -> {'hits', 'misses', 'invalidations'}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+        if self.ttls.get(name):
+            wrapper = self._memoized(name, attr)
+        elif name in INVALIDATIONS:
+            wrapper = self._invalidating(name, attr)
+        else:
+            return attr
+        # Se guarda en la instancia para no volver a pasar por __getattr__
+        setattr(self, name, wrapper)
+        return wrapper
+
+    def _counter(self, name):
+        counter = self._counters.get(name)
+        if counter is None:
+            counter = self._counters[name] = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        return counter
+
+    def _memoized(self, name, method):
+        ttl = self.ttls[name]
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            ahora = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > ahora:
+                    self._entries.move_to_end(key)
+                    self._counter(name)['hits'] += 1
+                    return copy.deepcopy(entry[1])
+                self._counter(name)['misses'] += 1
+                # Generación vigente: si una escritura invalida mientras se consulta,
+                # el resultado no se guarda
+                generacion = self._counter(name)['invalidations']
+
+            valor = method(*args, **kwargs)
+
+            with self._lock:
+                if self._counter(name)['invalidations'] == generacion:
+                    self._entries[key] = (ahora + ttl, copy.deepcopy(valor))
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+            return valor
+
+        return wrapper
+
+    def _invalidating(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            finally:
+                # También si falla: la escritura pudo aplicarse antes del error
+                self.invalidate(*INVALIDATIONS[name])
+
+        return wrapper
+
+    def invalidate(self, *methods):
+        """Descartar las lecturas guardadas de los métodos indicados (de todos si no se indica ninguno)"""
+        with self._lock:
+            if not methods:
+                methods = tuple(self._counters)
+            for key in [key for key in self._entries if key[0] in methods]:
+                del self._entries[key]
+            for name in methods:
+                self._counter(name)['invalidations'] += 1
+
+    def cache_stats(self):
+        """Aciertos, fallos, invalidaciones y entradas guardadas por método"""
+        with self._lock:
+            tamanos = {}
+            for name, _, _ in self._entries:
+                tamanos[name] = tamanos.get(name, 0) + 1
+            return {
+                name: {**counter, 'size': tamanos.get(name, 0)}
+                for name, counter in self._counters.items()
+            }
@@ -0,0 +1,74 @@
+"""Reintentos con espera exponencial y cortacircuitos para las consultas a Postgres.
+
+El cortacircuitos se abre tras varias fallas de conexión seguidas: mientras
+está abierto las llamadas fallan de inmediato (sin esperar el timeout de
+conexión) y, pasado `reset_timeout`, se deja pasar una llamada de prueba.
+"""
+import random
+import threading
+import time
+
+
+class DatabaseUnavailableError(Exception):
+    """La base de datos no responde; se evita intentar hasta que se recupere"""
+
+
+def backoff_delays(retries, base=0.2, cap=2.0):
+    """Esperas antes de cada reintento: exponencial con jitter completo"""
+    for intento in range(retries):
+        yield random.uniform(0, min(cap, base * 2 ** intento))
+
+
+class CircuitBreaker:
+    CLOSED = 'cerrado'
+    OPEN = 'abierto'
+    HALF_OPEN = 'semiabierto'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Lanzar DatabaseUnavailableError si el circuito está abierto"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                # Una sola llamada de prueba a la vez
+                self._probing = True
+                return
+            self.rejected += 1
+            restante = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        raise DatabaseUnavailableError(
+            f"Sin conexión con la base de datos; se reintentará en {restante:.0f} s"
+        )
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def status(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'rejected': self.rejected
+            }
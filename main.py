@@ -1,8 +1,8 @@
 from kivy.app import App
-from kivy.uix.screenmanager import ScreenManager, Screen, FadeTransition
+from kivy.uix.screenmanager import ScreenManager, FadeTransition
 from kivy.animation import Animation
 from kivy.clock import Clock
-from kivy.properties import ObjectProperty, ListProperty
+from kivy.properties import ObjectProperty
 from kivy.uix.popup import Popup
 from kivy.uix.label import Label
 from kivy.uix.recycleview import RecycleView
@@ -12,14 +12,7 @@ from kivy.uix.button import Button
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.widget import Widget
-from functools import partial
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.platypus.flowables import HRFlowable
-from datetime import datetime
+from array import array
 import os
 from kivy.utils import platform
 from os.path import expanduser, join
@@ -29,37 +22,15 @@ from kivy.graphics import Color, Rectangle, Line
 from kivymd.app import MDApp
 from kivymd.uix.button import MDIconButton
 from kivy.uix.spinner import Spinner
-import sqlite3
-import traceback
+from kivy.uix.dropdown import DropDown
+from base_screen import BaseScreen
 from database import Database
-
-class BaseScreen(Screen):
-    def _show_popup(self, title, message, color=(1, 0, 0, 1)):
-        content = BoxLayout(orientation='vertical', padding=10)
-        label = Label(
-            text=message,
-            text_size=(280, None),
-            size_hint_y=None,
-            halign='center',
-            valign='middle'
-        )
-        label.bind(texture_size=lambda *x: setattr(label, 'height', label.texture_size[1]))
-        content.add_widget(label)
-        
-        popup = Popup(
-            title=title,
-            content=content,
-            size_hint=(None, None),
-            size=(300, label.height + 100),
-            auto_dismiss=True
-        )
-        popup.open()
-
-    def show_error(self, message):
-        self._show_popup('Error', message, color=(1, 0, 0, 1))
-
-    def show_success(self, message):
-        self._show_popup('Éxito', message, color=(0, 1, 0, 1))
+from db_cache import CachedDatabase
+from memory_budget import low_memory_enabled, release_widgets
+from pdf_cache import PDFCache
+from prefetch import CRITICAL, HIGH, LOW, PrefetchScheduler
+from catalog import CatalogSnapshot, ProductCatalog
+from quote_engine import Cotizacion
 
 class LoadingScreen(BaseScreen):
     logo = ObjectProperty(None)
@@ -92,6 +63,10 @@ class LoadingScreen(BaseScreen):
         self.manager.current = 'login'
 
 class LoginScreen(BaseScreen):
+    def on_enter(self):
+        # Volver al inicio de sesión descarta la precarga de la sesión anterior
+        App.get_running_app().prefetch.cancel_all()
+
     def validate_login(self, id_number, password):
         if not id_number or not password:
             self.show_error("Por favor complete todos los campos")
@@ -114,7 +89,13 @@ class LoginScreen(BaseScreen):
             app.current_user_role = app.get_user_role(id_number)
             print(f"Usuario logueado con rol: {app.current_user_role}")
             self.show_success("Inicio de sesión exitoso")
+            app.prefetch_session_data()
             self.manager.current = 'principal'
+            if app.warm_up_screens:
+                pantallas = ['cotizacion', 'client_form']
+                if app.current_user_role == 'admin':
+                    pantallas.extend(['users', 'dashboard'])
+                self.manager.warm_up(pantallas)
 
     def on_create_account_press(self):
         self.manager.current = 'register'
@@ -163,212 +144,17 @@ class RegisterScreen(BaseScreen):
                 self.show_error(str(e))
 
 class ProductosRV(RecycleView):
-    def __init__(self, **kwargs):
-        super(ProductosRV, self).__init__(**kwargs)
-        self.load_products()
-    
     def load_products(self):
         app = App.get_running_app()
-        productos = app.db.get_all_products()
+        app.catalog.refresh()
+        productos = app.catalog.snapshot()
         self.data = [{
-            'nombre': p['nombre'],
-            'unidades': str(p['unidades']),
-            'costo': f"${p['costo']:,}"
-        } for p in productos]
-
-class AddProductPopup(Popup):
-    def __init__(self, update_callback, **kwargs):
-        super().__init__(**kwargs)
-        self.update_callback = update_callback
-        self.title = 'Agregar Producto'
-        self.size_hint = (0.8, 0.6)
-        self.content = self.create_content()
-
-    def create_content(self):
-        layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
-        
-        self.nombre_input = TextInput(hint_text='Nombre del Producto', multiline=False)
-        self.unidades_input = TextInput(hint_text='Unidades', multiline=False)
-        self.costo_input = TextInput(hint_text='Costo', multiline=False)
-        
-        add_button = Button(
-            text='Agregar',
-            size_hint_y=None,
-            height='40dp',
-            background_color=(0.2, 0.6, 1, 1)
-        )
-        add_button.bind(on_press=self.add_product)
-        
-        layout.add_widget(Label(text='Nombre del Producto'))
-        layout.add_widget(self.nombre_input)
-        layout.add_widget(Label(text='Unidades'))
-        layout.add_widget(self.unidades_input)
-        layout.add_widget(Label(text='Costo'))
-        layout.add_widget(self.costo_input)
-        layout.add_widget(add_button)
-        
-        return layout
-
-    def add_product(self, instance):
-        nombre = self.nombre_input.text.strip()
-        unidades = self.unidades_input.text.strip()
-        costo = self.costo_input.text.strip()
-        
-        if not all([nombre, unidades, costo]):
-            self.show_error("Todos los campos son requeridos")
-            return
-            
-        if not unidades.isdigit() or not costo.isdigit():
-            self.show_error("Unidades y costo deben ser números")
-            return
-            
-        app = App.get_running_app()
-        app.db.add_product(nombre, unidades, costo)
-        self.update_callback()
-        self.dismiss()
-
-    def show_error(self, message):
-        content = BoxLayout(orientation='vertical', padding=10)
-        label = Label(
-            text=message,
-            text_size=(280, None),
-            size_hint_y=None,
-            halign='center',
-            valign='middle'
-        )
-        label.bind(texture_size=lambda *x: setattr(label, 'height', label.texture_size[1]))
-        content.add_widget(label)
-        
-        popup = Popup(
-            title='Error',
-            content=content,
-            size_hint=(None, None),
-            size=(300, label.height + 100),
-            auto_dismiss=True
-        )
-        popup.open()
-
-class SelectProductTypePopup(Popup):
-    def __init__(self, callback, **kwargs):
-        super().__init__(**kwargs)
-        self.callback = callback
-        self.title = 'Seleccionar Tipo de Producto'
-        self.size_hint = (0.8, 0.4)
-        
-        layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
-        
-        nuevo_btn = Button(
-            text='Nuevo Producto',
-            size_hint_y=None,
-            height='50dp',
-            background_color=(0.2, 0.6, 1, 1)
-        )
-        nuevo_btn.bind(on_press=lambda x: self.select_type('nuevo'))
-        
-        existente_btn = Button(
-            text='Actualizar Producto Existente',
-            size_hint_y=None,
-            height='50dp',
-            background_color=(0.2, 0.8, 0.2, 1)
-        )
-        existente_btn.bind(on_press=lambda x: self.select_type('existente'))
-        
-        layout.add_widget(nuevo_btn)
-        layout.add_widget(existente_btn)
-        self.content = layout
-
-    def select_type(self, tipo):
-        self.dismiss()
-        self.callback(tipo)
-
-class UpdateProductPopup(Popup):
-    def __init__(self, producto, update_callback, **kwargs):
-        super().__init__(**kwargs)
-        self.producto = producto
-        self.update_callback = update_callback
-        self.title = f'Actualizar {producto["nombre"]}'
-        self.size_hint = (0.8, 0.6)
-        self.content = self.create_content()
-
-    def create_content(self):
-        layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
-        
-        layout.add_widget(Label(text=f'Unidades actuales: {self.producto["unidades"]}'))
-        layout.add_widget(Label(text=f'Costo actual: ${self.producto["costo"]:,}'))
-        
-        self.unidades_input = TextInput(
-            hint_text='Unidades adicionales',
-            multiline=False,
-            input_filter='int'
-        )
-        self.costo_input = TextInput(
-            hint_text='Nuevo costo (opcional)',
-            multiline=False,
-            input_filter='int'
-        )
-        
-        update_button = Button(
-            text='Actualizar',
-            size_hint_y=None,
-            height='40dp',
-            background_color=(0.2, 0.6, 1, 1)
-        )
-        update_button.bind(on_press=self.update_product)
-        
-        layout.add_widget(Label(text='Unidades a agregar:'))
-        layout.add_widget(self.unidades_input)
-        layout.add_widget(Label(text='Nuevo costo (dejar vacío para mantener):'))
-        layout.add_widget(self.costo_input)
-        layout.add_widget(update_button)
-        
-        return layout
-
-    def update_product(self, instance):
-        try:
-            unidades_adicionales = int(self.unidades_input.text or '0')
-            nuevo_costo = self.costo_input.text.strip()
-            
-            if nuevo_costo and not nuevo_costo.isdigit():
-                self.show_error("El costo debe ser un número")
-                return
-                
-            app = App.get_running_app()
-            productos = app.db.get_all_products()
-            
-            for producto in productos:
-                if producto['nombre'] == self.producto['nombre']:
-                    producto['unidades'] += unidades_adicionales
-                    if nuevo_costo:
-                        producto['costo'] = int(nuevo_costo)
-                    break
-            
-            app.db.update_product_units(self.producto['nombre'], producto['unidades'])
-            self.update_callback()
-            self.dismiss()
-            
-        except ValueError:
-            self.show_error("Por favor ingrese valores válidos")
-
-    def show_error(self, message):
-        content = BoxLayout(orientation='vertical', padding=10)
-        label = Label(
-            text=message,
-            text_size=(280, None),
-            size_hint_y=None,
-            halign='center',
-            valign='middle'
-        )
-        label.bind(texture_size=lambda *x: setattr(label, 'height', label.texture_size[1]))
-        content.add_widget(label)
-        
-        popup = Popup(
-            title='Error',
-            content=content,
-            size_hint=(None, None),
-            size=(300, label.height + 100),
-            auto_dismiss=True
-        )
-        popup.open()
+            'nombre': nombre,
+            'unidades': str(unidades),
+            'costo': f"${costo_cents / 100:,.2f}"
+        } for nombre, unidades, costo_cents in zip(
+            productos.nombres, productos.unidades, productos.costos_cents
+        )]
 
 class PrincipalScreen(BaseScreen):
     def __init__(self, **kwargs):
@@ -386,11 +172,15 @@ class PrincipalScreen(BaseScreen):
         self.ids.admin_btn.disabled = not (app.current_user_role == 'admin')
         self.ids.users_btn.opacity = 1 if app.current_user_role == 'admin' else 0
         self.ids.users_btn.disabled = not (app.current_user_role == 'admin')
+        self.ids.dashboard_btn.opacity = 1 if app.current_user_role == 'admin' else 0
+        self.ids.dashboard_btn.disabled = not (app.current_user_role == 'admin')
 
     def generar_cotizacion(self):
         self.manager.current = 'cotizacion'
 
     def show_add_product_popup(self):
+        from admin_screens import AddProductPopup, SelectProductTypePopup
+
         def on_type_selected(tipo):
             if (tipo == 'nuevo'):
                 popup = AddProductPopup(self.update_products)
@@ -403,7 +193,8 @@ class PrincipalScreen(BaseScreen):
 
     def show_product_selection(self):
         app = App.get_running_app()
-        productos = app.db.get_all_products()
+        app.catalog.refresh()
+        productos = app.catalog.snapshot()
         
         content = BoxLayout(orientation='vertical', spacing=10, padding=10)
         scroll_layout = GridLayout(cols=1, spacing=5, size_hint_y=None)
@@ -430,6 +221,7 @@ class PrincipalScreen(BaseScreen):
         popup.open()
 
     def show_update_popup(self, producto):
+        from admin_screens import UpdateProductPopup
         popup = UpdateProductPopup(producto, self.update_products)
         popup.open()
     
@@ -534,8 +326,9 @@ class ClientDataPopup(Popup):
 class CotizacionScreen(BaseScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.productos = []
-        self.ambiente_count = 1
+        self.productos = CatalogSnapshot(array('q'), [], array('q'), array('q'))
+        self.cotizacion = Cotizacion(self.productos)
+        self._usuario = None
         self.total_productos = {}
         self.subtotal = 0
         self.iva = 0
@@ -543,11 +336,32 @@ class CotizacionScreen(BaseScreen):
 
     def on_enter(self):
         app = App.get_running_app()
-        self.productos = app.db.get_all_products()
+        app.catalog.refresh()
+        self.productos = app.catalog.snapshot()
+        if self._usuario != app.current_user_id:
+            # Otro vendedor inició sesión: no hereda la cotización en curso
+            self._usuario = app.current_user_id
+            self.nueva_cotizacion()
         self.crear_tabla()
-        
+
+    def on_leave(self):
+        # La cotización (self.cotizacion) se conserva: el formulario del cliente la usa
+        # y on_enter reconstruye la grilla a partir de ella
+        if App.get_running_app().low_memory:
+            release_widgets(self.name, self.ids.tabla_container)
+
+    def nueva_cotizacion(self):
+        """Descartar la cotización en curso; la grilla se reconstruye al volver a la pantalla"""
+        self.cotizacion = Cotizacion(self.productos)
+
     def crear_tabla(self):
+        """Reconstruir la grilla a partir de self.cotizacion (el modelo no se reinicia)"""
         self.ids.tabla_container.clear_widgets()
+        if self.cotizacion.productos is not self.productos:
+            # Catálogo actualizado: se conservan las cantidades de los productos que siguen en él
+            self.cotizacion = self.cotizacion.con_productos(self.productos)
+        if not self.cotizacion.ambientes:
+            self.cotizacion.agregar_ambiente()
         
         column_width = 250
         
@@ -568,9 +382,9 @@ class CotizacionScreen(BaseScreen):
             valign='middle'
         ))
         
-        for producto in self.productos:
+        for nombre in self.productos.nombres:
             header.add_widget(Label(
-                text=producto['nombre'],
+                text=nombre,
                 bold=True,
                 color=[0,0,0,1],
                 size_hint_x=None,
@@ -582,10 +396,13 @@ class CotizacionScreen(BaseScreen):
         
         self.ids.tabla_container.add_widget(header)
         
-        for i in range(self.ambiente_count):
-            self.agregar_fila_ambiente(i + 1)
+        for num in range(1, len(self.cotizacion.ambientes) + 1):
+            self.agregar_fila_ambiente(num)
+
+        self.actualizar_totales()
 
     def agregar_fila_ambiente(self, num):
+        """Agregar la fila de un ambiente que ya existe en el modelo"""
         column_width = 250
         
         fila = GridLayout(
@@ -606,11 +423,12 @@ class CotizacionScreen(BaseScreen):
             valign='middle'
         ))
         
-        for producto in self.productos:
+        for idx in range(len(self.productos)):
+            cantidad = self.cotizacion.get_cantidad(num, idx)
             text_input = TextInput(
                 multiline=False,
                 input_filter='int',
-                text='',
+                text=str(cantidad) if cantidad else '',
                 hint_text='0',
                 size_hint_x=None,
                 width=column_width,
@@ -618,7 +436,8 @@ class CotizacionScreen(BaseScreen):
                 halign='center',
                 padding=(10, 10)
             )
-            setattr(text_input, 'producto_ref', producto)
+            setattr(text_input, 'producto_idx', idx)
+            setattr(text_input, 'ambiente_num', num)
             text_input.bind(
                 text=self.on_text_input_change,
                 focus=self.on_focus
@@ -628,101 +447,52 @@ class CotizacionScreen(BaseScreen):
         self.ids.tabla_container.add_widget(fila)
 
     def on_text_input_change(self, instance, value):
-        if not value:
-            self.actualizar_totales()
-            return
-
         try:
-            cantidad = int(value)
-            producto = instance.producto_ref
-            total_otros = self.calcular_total_otros(instance, producto)
-            disponibles = producto['unidades'] - total_otros
-
-            if cantidad > disponibles:
-                mensaje = (
-                    f"No hay suficientes unidades de {producto['nombre']}.\n"
-                    f"Unidades totales: {producto['unidades']}\n"
-                    f"En uso en otros ambientes: {total_otros}\n"
-                    f"Disponibles: {disponibles}"
-                )
-                instance.text = str(disponibles)
-                instance.readonly = True
-                Clock.schedule_once(lambda dt: self.show_error(mensaje))
-            
-            self.actualizar_totales()
+            cantidad = int(value) if value else 0
+            if cantidad < 0:
+                raise ValueError
         except ValueError:
             instance.text = ''
-            self.actualizar_totales()
+            return
+
+        idx = instance.producto_idx
+        unidades = self.productos.unidades[idx]
+        total_otros = self.cotizacion.cantidad_total(idx, excluir_ambiente=instance.ambiente_num)
+        disponibles = unidades - total_otros
+
+        if cantidad > max(disponibles, 0):
+            mensaje = (
+                f"No hay suficientes unidades de {self.productos.nombres[idx]}.\n"
+                f"Unidades totales: {unidades}\n"
+                f"En uso en otros ambientes: {total_otros}\n"
+                f"Disponibles: {disponibles}"
+            )
+            instance.readonly = True
+            Clock.schedule_once(lambda dt: self.show_error(mensaje))
+            # Con stock ya comprometido en otros ambientes disponibles puede ser negativo:
+            # escribirlo volvería a entrar aquí como texto inválido, así que se limita a 0
+            cantidad = max(disponibles, 0)
+            if instance.text != str(cantidad):
+                instance.text = str(cantidad)
+                return
+
+        self.cotizacion.set_cantidad(instance.ambiente_num, instance.producto_idx, cantidad)
+        self.actualizar_totales()
 
     def on_focus(self, instance, value):
         if not value:
             instance.readonly = False
 
-    def calcular_total_otros(self, current_input, producto):
-        filas = [widget for widget in self.ids.tabla_container.children 
-                if isinstance(widget, GridLayout)][:-1]
-        
-        return sum(
-            int(other_input.text or '0')
-            for other_fila in filas
-            for other_input in [w for w in other_fila.children if isinstance(w, TextInput)]
-            if hasattr(other_input, 'producto_ref') 
-            and other_input.producto_ref['nombre'] == producto['nombre']
-            and other_input != current_input
-        )
-
     def actualizar_totales(self, instance=None, value=None):
-        if not hasattr(self, '_actualizando'):
-            self._actualizando = False
-            
-        if self._actualizando:
-            return
-            
-        self._actualizando = True
-        try:
-            total = 0
-            self.total_productos = {p['nombre']: 0 for p in self.productos}
-            
-            filas = [widget for widget in self.ids.tabla_container.children 
-                    if isinstance(widget, GridLayout)][:-1]
-            
-            for fila in filas:
-                inputs = [widget for widget in fila.children 
-                         if isinstance(widget, TextInput)]
-                inputs.reverse()
-                
-                for input_widget in inputs:
-                    if not hasattr(input_widget, 'producto_ref'):
-                        continue
-                        
-                    try:
-                        producto = input_widget.producto_ref
-                        valor_actual = input_widget.text.strip()
-                        cantidad = int(valor_actual) if valor_actual else 0
-                        
-                        if cantidad < 0:
-                            input_widget.text = ''
-                            cantidad = 0
-                            continue
-                        
-                        self.total_productos[producto['nombre']] += cantidad
-                        subtotal = cantidad * int(producto['costo'])
-                        total += subtotal
-                        
-                    except ValueError:
-                        input_widget.text = ''
-                        continue
-            
-            subtotal = total
-            iva = subtotal * 0.19
-            total_final = subtotal + iva
-            
-            self.ids.valor_plan.text = f"${subtotal:,.0f}"
-            self.ids.valor_iva.text = f"${iva:,.0f}"
-            self.ids.valor_total.text = f"${total_final:,.0f}"
-            
-        finally:
-            self._actualizando = False
+        valores = self.cotizacion.valores()
+        self.total_productos = self.cotizacion.totales_por_nombre()
+        self.subtotal = valores['subtotal']
+        self.iva = valores['iva']
+        self.total_final = valores['total']
+
+        self.ids.valor_plan.text = f"${self.subtotal:,.0f}"
+        self.ids.valor_iva.text = f"${self.iva:,.0f}"
+        self.ids.valor_total.text = f"${self.total_final:,.0f}"
 
     def show_error(self, message):
         content = BoxLayout(orientation='vertical', padding=10)
@@ -746,8 +516,7 @@ class CotizacionScreen(BaseScreen):
         popup.open()
 
     def agregar_ambiente(self):
-        self.ambiente_count += 1
-        self.agregar_fila_ambiente(self.ambiente_count)
+        self.agregar_fila_ambiente(self.cotizacion.agregar_ambiente())
         self.actualizar_totales()
 
     def get_downloads_dir(self):
@@ -763,155 +532,42 @@ class CotizacionScreen(BaseScreen):
     def generar_pdf_con_datos(self, cliente_data):
         try:
             app = App.get_running_app()
-            valores = {
-                'subtotal': float(self.ids.valor_plan.text.replace('$', '').replace(',', '')),
-                'iva': float(self.ids.valor_iva.text.replace('$', '').replace(',', '')),
-                'total': float(self.ids.valor_total.text.replace('$', '').replace(',', ''))
-            }
-            
-            # Recolectar detalles por ambiente
-            detalles_ambientes = {}
-            filas = [widget for widget in self.ids.tabla_container.children 
-                    if isinstance(widget, GridLayout)][:-1]
-            filas.reverse()
-            
-            for num_ambiente, fila in enumerate(filas, 1):
-                inputs = [widget for widget in fila.children if isinstance(widget, TextInput)]
-                inputs.reverse()
-                ambiente_detalles = {}
-                
-                for input_widget, producto in zip(inputs, self.productos):
-                    cantidad = int(input_widget.text or '0')
-                    if cantidad > 0:
-                        ambiente_detalles[producto['id']] = {
-                            'cantidad': cantidad,
-                            'precio_unitario': float(producto['costo'])
-                        }
-                
-                if ambiente_detalles:  # Solo agregar ambiente si tiene productos
-                    detalles_ambientes[num_ambiente] = ambiente_detalles
+            valores = self.cotizacion.valores()
+            detalles_ambientes = self.cotizacion.detalles_ambientes()
             
             # Si no hay productos seleccionados, mostrar error
             if not detalles_ambientes:
                 self.show_error("Debe seleccionar al menos un producto")
                 return
 
-            # Crear primero la cotización principal
-            cotizacion_id = app.db.create_cotizacion(
+            # Crear la cotización con sus detalles por ambiente
+            cotizacion_id = app.db.create_cotizacion_with_details(
                 usuario_id=int(app.current_user_id),
                 cliente_data=cliente_data,
-                valores=valores
+                valores=valores,
+                detalles_ambientes=detalles_ambientes
             )
 
             if not cotizacion_id:
                 raise Exception("Error al crear la cotización")
 
-            # Luego insertar los detalles de cada ambiente
-            try:
-                for ambiente_num, productos in detalles_ambientes.items():
-                    for producto_id, detalle in productos.items():
-                        app.db._execute_query("""
-                            INSERT INTO cotizacion_detalles (
-                                cotizacion_id, ambiente, producto_id, 
-                                cantidad, precio_unitario
-                            ) VALUES (%s, %s, %s, %s, %s)
-                        """, (
-                            cotizacion_id, 
-                            ambiente_num,
-                            producto_id, 
-                            detalle['cantidad'],
-                            detalle['precio_unitario']
-                        ))
-            except Exception as e:
-                # Si falla, eliminar la cotización principal
-                app.db._execute_query("DELETE FROM cotizaciones WHERE id = %s", (cotizacion_id,))
-                raise Exception(f"Error guardando detalles: {str(e)}")
-
-            # Generar PDF
+            # Generar PDF (o reutilizar el de una cotización idéntica)
             downloads_dir = self.get_downloads_dir()
             os.makedirs(downloads_dir, exist_ok=True)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = join(downloads_dir, f'cotizacion_{cotizacion_id}_{timestamp}.pdf')
-
-            # Crear el documento PDF
-            doc = SimpleDocTemplate(filename, pagesize=letter)
-            elements = []
-
-            # Título
-            styles = getSampleStyleSheet()
-            elements.append(Paragraph("Cotización de Productos", styles['Title']))
-            elements.append(Spacer(1, 20))
-
-            # Información del cliente
-            elements.append(Paragraph("Información del Cliente", styles['Heading2']))
-            cliente_info = [
-                ['Tipo de Documento:', cliente_data['tipo_documento']],
-                ['Número:', cliente_data['numero_documento']],
-                ['Nombres:', cliente_data['nombres']],
-                ['Apellidos:', cliente_data['apellidos']],
-                ['Teléfono:', cliente_data['telefono']],
-                ['Email:', cliente_data['email']]
-            ]
-            t = Table(cliente_info)
-            t.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('TOPPADDING', (0, 0), (-1, -1), 3),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-            ]))
-            elements.append(t)
-            elements.append(Spacer(1, 20))
-
-            # Detalles por ambiente
-            filas = [widget for widget in self.ids.tabla_container.children 
-                    if isinstance(widget, GridLayout)][:-1]
-            filas.reverse()
-
-            for idx, fila in enumerate(filas, 1):
-                elements.append(Paragraph(f"Ambiente {idx}", styles['Heading3']))
-                
-                data = [['Producto', 'Cantidad', 'Precio Unit.', 'Subtotal']]
-                inputs = [w for w in fila.children if isinstance(w, TextInput)]
-                inputs.reverse()
-                
-                ambiente_total = 0
-                for input_widget, producto in zip(inputs, self.productos):
-                    cantidad = int(input_widget.text or '0')
-                    if cantidad > 0:
-                        subtotal = cantidad * float(producto['costo'])
-                        ambiente_total += subtotal
-                        data.append([
-                            producto['nombre'],
-                            str(cantidad),
-                            f"${producto['costo']:,.2f}",
-                            f"${subtotal:,.2f}"
-                        ])
-
-                if len(data) > 1:  # Si hay productos en este ambiente
-                    t = Table(data, colWidths=[200, 80, 100, 100])
-                    t.setStyle(TableStyle([
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ]))
-                    elements.append(t)
-                    elements.append(Paragraph(f"Total Ambiente {idx}: ${ambiente_total:,.2f}", styles['Normal']))
-                    elements.append(Spacer(1, 10))
-
-            # Totales
-            elements.append(Spacer(1, 20))
-            elements.append(Paragraph(f"Subtotal: ${valores['subtotal']:,.2f}", styles['Heading4']))
-            elements.append(Paragraph(f"IVA (19%): ${valores['iva']:,.2f}", styles['Heading4']))
-            elements.append(Paragraph(f"Total: ${valores['total']:,.2f}", styles['Heading2']))
-
-            # Generar el PDF
-            doc.build(elements)
+            filename = join(downloads_dir, f'cotizacion_{cotizacion_id}.pdf')
+
+            def render(path):
+                # ReportLab solo se carga al generar el primer PDF
+                from quote_pdf import get_renderer
+                get_renderer().render(path, cliente_data, valores, detalles_ambientes)
+
+            pdf = app.pdf_cache.get_or_render(cliente_data, valores, detalles_ambientes, render)
+            app.pdf_cache.export(pdf, filename)
             
             # Actualizar inventario
-            self.actualizar_inventario()
+            sin_descontar = self.actualizar_inventario(cotizacion_id)
+            # La cotización quedó guardada: la próxima empieza vacía
+            self.nueva_cotizacion()
             
             # Mostrar modal de éxito
             content = BoxLayout(orientation='vertical', spacing=10, padding=20)
@@ -945,22 +601,34 @@ class CotizacionScreen(BaseScreen):
             ok_button.bind(on_press=popup.dismiss)
             popup.open()
 
+            if sin_descontar:
+                # La cotización ya está guardada: el vendedor debe saber qué no se descontó
+                self.show_error(
+                    "No se descontó del inventario:\n"
+                    + "\n".join(f"{nombre} ({error})" for nombre, error in sin_descontar)
+                )
+
         except Exception as e:
             self.show_error(f"Error al generar la cotización: {str(e)}")
 
-    def actualizar_inventario(self):
+    def actualizar_inventario(self, cotizacion_id):
+        """Descontar las unidades cotizadas; devuelve [(nombre, error)] de lo que no se pudo descontar"""
         app = App.get_running_app()
-        for producto in self.productos:
-            cantidad_usada = self.total_productos[producto['nombre']]
-            if cantidad_usada > 0:
-                nuevas_unidades = int(producto['unidades']) - cantidad_usada
-                try:
-                    app.db.update_product_units(producto['nombre'], nuevas_unidades)
-                except Exception as e:
-                    print(f"Error actualizando {producto['nombre']}: {str(e)}")
-                    continue
+        cantidades = {
+            nombre: cantidad for nombre, cantidad in self.total_productos.items() if cantidad > 0
+        }
+        try:
+            # Todo el descuento va en una transacción: se sabe exactamente qué se aplicó
+            resultado = app.db.decrement_products(
+                cantidades, usuario_id=int(app.current_user_id), cotizacion_id=cotizacion_id
+            )
+            sin_descontar = list(resultado['rechazados'].items())
+        except Exception as e:
+            print(f"Error actualizando inventario: {str(e)}")
+            sin_descontar = [(nombre, str(e)) for nombre in cantidades]
         
         self.manager.get_screen('principal').update_products()
+        return sin_descontar
 
     def show_success(self, message):
         content = BoxLayout(orientation='vertical', padding=10)
@@ -983,135 +651,6 @@ class CotizacionScreen(BaseScreen):
         )
         popup.open()
 
-class UsersScreen(BaseScreen):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.current_user_id = None
-        
-    def on_enter(self):
-        self.load_users()
-        app = App.get_running_app()
-        if app.current_user_role != 'admin':
-            self.disable_admin_actions()
-    
-    def disable_admin_actions(self):
-        container = self.ids.users_container
-        for widget in container.walk():
-            if isinstance(widget, Button):
-                widget.disabled = True
-                widget.opacity = 0
-    
-    def load_users(self):
-        app = App.get_running_app()
-        users = app.db.get_all_users()
-        container = self.ids.users_container
-        container.clear_widgets()
-        
-        for user_id, user_data in users:
-            container.add_widget(Label(
-                text=str(user_id),
-                color=(0,0,0,1),
-                size_hint_y=None,
-                height='40dp'
-            ))
-            container.add_widget(Label(
-                text=str(user_data['username']),
-                color=(0,0,0,1),
-                size_hint_y=None,
-                height='40dp'
-            ))
-            container.add_widget(Label(
-                text=str(user_data['role']),
-                color=(0,0,0,1),
-                size_hint_y=None,
-                height='40dp'
-            ))
-            actions = BoxLayout(size_hint_y=None, height='40dp', spacing='10dp')
-            if user_id != 'admin':
-                edit_btn = MDIconButton(
-                    icon="pencil",
-                    theme_text_color="Custom",
-                    text_color=(0.2, 0.6, 1, 1),
-                    size_hint=(None, None),
-                    size=('40dp', '40dp')
-                )
-                edit_btn.bind(on_press=lambda x, uid=user_id: self.show_edit_popup(uid))
-                
-                delete_btn = MDIconButton(
-                    icon="delete",
-                    theme_text_color="Custom",
-                    text_color=(1, 0.2, 0.2, 1),
-                    size_hint=(None, None),
-                    size=('40dp', '40dp')
-                )
-                delete_btn.bind(on_press=lambda x, uid=user_id: self.delete_user(uid))
-                
-                actions.add_widget(edit_btn)
-                actions.add_widget(delete_btn)
-            container.add_widget(actions)
-
-    def show_add_user_popup(self):
-        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
-
-    def show_edit_popup(self, user_id):
-        app = App.get_running_app()
-        user_data = app.db.get_user_data(user_id)
-        if not user_data:
-            return
-
-        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
-        
-        username_input = TextInput(
-            text=user_data['username'],
-            hint_text='Nombre de Usuario',
-            multiline=False,
-            size_hint_y=None,
-            height='40dp'
-        )
-        
-        role_spinner = Spinner(
-            text=user_data['role'],
-            values=('admin', 'client'),
-            size_hint_y=None,
-            height='40dp'
-        )
-        
-        update_btn = Button(
-            text='Actualizar',
-            size_hint_y=None,
-            height='40dp',
-            background_color=(0.2, 0.6, 1, 1)
-        )
-        
-        content.add_widget(Label(text='Nombre de Usuario:'))
-        content.add_widget(username_input)
-        content.add_widget(Label(text='Rol:'))
-        content.add_widget(role_spinner)
-        content.add_widget(update_btn)
-
-        popup = Popup(
-            title=f'Editar Usuario: {user_id}',
-            content=content,
-            size_hint=(0.8, 0.8)
-        )
-
-        def update(instance):
-            app.db.update_user(
-                user_id,
-                username=username_input.text,
-                role=role_spinner.text
-            )
-            self.load_users()
-            popup.dismiss()
-
-        update_btn.bind(on_press=update)
-        popup.open()
-
-    def delete_user(self, user_id):
-        app = App.get_running_app()
-        if app.db.delete_user(user_id):
-            self.load_users()
-
 class UsuarioRow(BoxLayout):
     pass
 
@@ -1259,18 +798,75 @@ class NavBar(BoxLayout):
         super().__init__(**kwargs)
 
 class ClientFormScreen(BaseScreen):
+    # Autocompletado de clientes: espera entre teclas y dígitos mínimos para consultar
+    AUTOCOMPLETE_DELAY = 0.3
+    AUTOCOMPLETE_MIN_DIGITS = 4
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.productos = []
         self.total_productos = {}
+        self._buscar_trigger = Clock.create_trigger(self.buscar_clientes, self.AUTOCOMPLETE_DELAY)
+        self._sugerencias = DropDown()
+        self._llenando = False
         
     def on_enter(self):
         cotizacion_screen = self.manager.get_screen('cotizacion')
         self.productos = cotizacion_screen.productos
         self.total_productos = cotizacion_screen.total_productos
-        self.subtotal = float(cotizacion_screen.ids.valor_plan.text.replace('$', '').replace(',', ''))
-        self.iva = float(cotizacion_screen.ids.valor_iva.text.replace('$', '').replace(',', ''))
-        self.total = float(cotizacion_screen.ids.valor_total.text.replace('$', '').replace(',', ''))
+        valores = cotizacion_screen.cotizacion.valores()
+        self.subtotal = valores['subtotal']
+        self.iva = valores['iva']
+        self.total = valores['total']
+
+    def on_leave(self):
+        self._buscar_trigger.cancel()
+        self._sugerencias.dismiss()
+
+    def on_num_documento(self, text):
+        """Reiniciar la espera en cada tecla; solo se consulta al dejar de escribir"""
+        if self._llenando:
+            return
+        self._buscar_trigger.cancel()
+        if len(text) >= self.AUTOCOMPLETE_MIN_DIGITS:
+            self._buscar_trigger()
+        else:
+            self._sugerencias.dismiss()
+
+    def buscar_clientes(self, dt):
+        prefijo = self.ids.num_documento.text.strip()
+        if len(prefijo) < self.AUTOCOMPLETE_MIN_DIGITS:
+            return
+        app = App.get_running_app()
+        clientes = app.db.search_clientes(prefijo)
+
+        self._sugerencias.dismiss()
+        self._sugerencias.clear_widgets()
+        # El texto pudo cambiar mientras se consultaba
+        if not clientes or self.ids.num_documento.text.strip() != prefijo:
+            return
+        for cliente in clientes:
+            btn = Button(
+                text=f"{cliente['numero_documento']} - {cliente['nombres']} {cliente['apellidos']}",
+                size_hint_y=None,
+                height='40dp'
+            )
+            btn.bind(on_release=lambda x, c=cliente: self.seleccionar_cliente(c))
+            self._sugerencias.add_widget(btn)
+        self._sugerencias.open(self.ids.num_documento)
+
+    def seleccionar_cliente(self, cliente):
+        self._sugerencias.dismiss()
+        self._llenando = True
+        try:
+            self.ids.tipo_doc.text = cliente['tipo_documento']
+            self.ids.num_documento.text = cliente['numero_documento']
+            self.ids.nombres.text = cliente['nombres']
+            self.ids.apellidos.text = cliente['apellidos']
+            self.ids.telefono.text = cliente['telefono']
+            self.ids.email.text = cliente['email']
+        finally:
+            self._llenando = False
 
     def validate_fields(self):
         num_documento = self.ids.num_documento.text.strip()
@@ -1337,13 +933,89 @@ class ClientFormScreen(BaseScreen):
         cotizacion_screen.generar_pdf_con_datos(cliente_data)
         self.manager.current = 'cotizacion'
 
+def _users_screen(**kwargs):
+    from admin_screens import UsersScreen
+    return UsersScreen(**kwargs)
+
+def _dashboard_screen(**kwargs):
+    from admin_screens import DashboardScreen
+    return DashboardScreen(**kwargs)
+
+class LazyScreenManager(ScreenManager):
+    """ScreenManager que construye cada pantalla la primera vez que se necesita"""
+
+    def __init__(self, factories, **kwargs):
+        self.factories = factories
+        super().__init__(**kwargs)
+
+    def ensure_screen(self, name):
+        if name not in self.screen_names and name in self.factories:
+            self.add_widget(self.factories[name](name=name))
+
+    def get_screen(self, name):
+        self.ensure_screen(name)
+        return super().get_screen(name)
+
+    def has_screen(self, name):
+        return name in self.factories or super().has_screen(name)
+
+    def warm_up(self, names=None):
+        """Construir pantallas pendientes en segundo plano, una por frame"""
+        pendientes = [n for n in (names or self.factories) if n not in self.screen_names]
+
+        def construir_siguiente(dt):
+            if not pendientes:
+                return False
+            self.ensure_screen(pendientes.pop(0))
+
+        # Los widgets deben crearse en el hilo principal; se reparte el trabajo entre frames
+        Clock.schedule_interval(construir_siguiente, 0)
+
 class MainApp(MDApp):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.current_user_id = None
         self.current_user_role = None
-        self.db = Database()
+        self.low_memory = low_memory_enabled()
+        # Construir pantallas por adelantado ocupa la memoria que el modo intenta ahorrar
+        self.warm_up_screens = not self.low_memory
+        self.profiling = os.getenv('COLVA_PROFILE') == '1'
+        self.profiler = None
+        api_url = os.getenv('COLVA_API_URL')
+        if api_url:
+            # Modo cliente: las operaciones pasan por api_server.py
+            from api_client import ApiDatabase
+            self.db = ApiDatabase(api_url, api_key=os.getenv('COLVA_API_KEY'))
+        else:
+            self.db = Database()
+        if os.getenv('COLVA_DB_CACHE', '1') != '0':
+            # Lecturas repetidas (rol, datos de usuario, stock) sin ir a la red
+            self.db = CachedDatabase(self.db)
         self.db.initialize_database()
+        self.catalog = ProductCatalog(self.db)
+        self.prefetch = PrefetchScheduler()
+        self._pdf_cache = None
+
+    @property
+    def pdf_cache(self):
+        # user_data_dir solo está disponible una vez creada la app
+        if self._pdf_cache is None:
+            self._pdf_cache = PDFCache(join(self.user_data_dir, 'pdf_cache'))
+        return self._pdf_cache
+
+    def prefetch_session_data(self):
+        """Precargar lo que el rol actual suele abrir después del inicio de sesión"""
+        self.prefetch.cancel_all()
+        self.prefetch.submit('catalogo', self.catalog.refresh, CRITICAL)
+        # Usuarios y tablero quedan en la caché de lecturas; sin ella no hay dónde guardarlos
+        if self.current_user_role == 'admin' and isinstance(self.db, CachedDatabase):
+            from admin_screens import DashboardScreen
+            self.prefetch.submit('usuarios', self.db.get_all_users, HIGH)
+            self.prefetch.submit(
+                'tablero',
+                lambda: self.db.get_dashboard(DashboardScreen.DIAS, DashboardScreen.STOCK_MINIMO),
+                LOW
+            )
 
     def validate_user(self, id_number, password):
         return self.db.validate_user(id_number, password)
@@ -1351,15 +1023,38 @@ class MainApp(MDApp):
     def get_user_role(self, id_number):
         return self.db.get_user_role(id_number)
 
+    def start_profiler(self):
+        import sys
+        import admin_screens
+        from ui_profiler import UIProfiler, app_classes
+
+        self.profiler = UIProfiler(self)
+        self.profiler.install(app_classes(sys.modules[__name__], admin_screens))
+
+    def on_start(self):
+        if self.profiler:
+            self.profiler.show_overlay()
+
+    def on_stop(self):
+        if self.profiler:
+            path = self.profiler.export(self.user_data_dir)
+            print(f"Perfil de interfaz guardado en: {path}")
+
     def build(self):
-        sm = ScreenManager(transition=FadeTransition())
+        if self.profiling:
+            self.start_profiler()
+
+        # Solo las pantallas de carga e inicio de sesión se crean al arrancar
+        sm = LazyScreenManager({
+            'register': RegisterScreen,
+            'principal': PrincipalScreen,
+            'cotizacion': CotizacionScreen,
+            'users': _users_screen,
+            'dashboard': _dashboard_screen,
+            'client_form': ClientFormScreen,
+        }, transition=FadeTransition())
         sm.add_widget(LoadingScreen(name='loading'))
         sm.add_widget(LoginScreen(name='login'))
-        sm.add_widget(RegisterScreen(name='register'))
-        sm.add_widget(PrincipalScreen(name='principal'))
-        sm.add_widget(CotizacionScreen(name='cotizacion'))
-        sm.add_widget(UsersScreen(name='users'))
-        sm.add_widget(ClientFormScreen(name='client_form'))
         
         self.theme_cls.theme_style = "Light"
         self.theme_cls.primary_palette = "Blue"
@@ -0,0 +1,67 @@
+"""Modo de bajo consumo de memoria para tabletas con poca RAM.
+
+Con el modo activo las pantallas pesadas (cotización, usuarios) destruyen su
+árbol de widgets al salir y lo reconstruyen al entrar a partir de los datos
+que conservan, y no se construyen pantallas por adelantado.
+
+Se activa con COLVA_LOW_MEMORY=1 (o se desactiva con 0); por defecto se activa
+en equipos con LOW_MEMORY_TOTAL_MB o menos de RAM.
+"""
+import gc
+import os
+
+LOW_MEMORY_TOTAL_MB = 3072
+
+
+def _meminfo_mb(campo, archivo):
+    """Valor en MB de un campo 'Nombre:  1234 kB' de /proc, o None si no existe"""
+    try:
+        with open(archivo, encoding='ascii') as f:
+            for linea in f:
+                if linea.startswith(campo + ':'):
+                    return int(linea.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def rss_mb():
+    """Memoria residente del proceso en MB (None si el sistema no la informa)"""
+    rss = _meminfo_mb('VmRSS', '/proc/self/status')
+    if rss is not None:
+        return rss
+    try:
+        import resource
+        import sys
+        # Pico de memoria: KB en Linux, bytes en macOS
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximo / (1024 * 1024) if sys.platform == 'darwin' else maximo / 1024
+    except (ImportError, OSError):
+        return None
+
+
+def low_memory_enabled():
+    valor = os.getenv('COLVA_LOW_MEMORY')
+    if valor is not None:
+        return valor == '1'
+    total = _meminfo_mb('MemTotal', '/proc/meminfo')
+    return total is not None and total <= LOW_MEMORY_TOTAL_MB
+
+
+def count_widgets(widget):
+    return sum(1 for _ in widget.walk(restrict=True))
+
+
+def release_widgets(nombre, container):
+    """Vaciar `container` y registrar los widgets liberados y la memoria antes/después"""
+    widgets = count_widgets(container) - 1
+    if widgets <= 0:
+        return
+    antes = rss_mb()
+    container.clear_widgets()
+    gc.collect()
+    despues = rss_mb()
+    if antes is not None and despues is not None:
+        print(f"[memoria] {nombre}: {widgets} widgets liberados, RSS {antes:.0f} -> {despues:.0f} MB")
+    else:
+        print(f"[memoria] {nombre}: {widgets} widgets liberados")
@@ -0,0 +1,43 @@
+"""Crear o actualizar el esquema de la base de datos.
+
+Aplica en una sola transacción las migraciones pendientes hasta la versión
+de esquema que espera la aplicación (database.SCHEMA_VERSION). La aplicación
+solo comprueba la versión al iniciar; este paso se ejecuta una vez por
+despliegue (api_server.py también lo hace al arrancar).
+
+Ejemplos:
+    python migrar_base.py
+    python migrar_base.py --comprobar
+"""
+import argparse
+import sys
+
+from database import Database, SCHEMA_VERSION
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrar el esquema de la base de datos")
+    parser.add_argument('--comprobar', action='store_true',
+                        help="Solo mostrar la versión del esquema, sin migrar")
+    args = parser.parse_args(argv)
+
+    db = Database()
+    try:
+        version = db.get_schema_version()
+        if args.comprobar:
+            print(f"Esquema v{version} (la aplicación requiere v{SCHEMA_VERSION})")
+            return 0 if version >= SCHEMA_VERSION else 1
+        migrado = db.migrate_database()
+    except Exception as e:
+        print(f"❌ {str(e)}")
+        return 1
+
+    if migrado:
+        print(f"✅ Esquema migrado de v{version} a v{SCHEMA_VERSION}")
+    else:
+        print(f"Esquema al día (v{version})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Caché de PDF de cotizaciones direccionada por contenido.
+
+Cada PDF se guarda como <sha256>.pdf, donde el hash se calcula sobre los datos
+que aparecen en el documento (cliente, detalles por ambiente y totales) y la
+versión de la plantilla. Volver a generar una cotización sin cambios es una
+búsqueda de archivo en lugar de un render de ReportLab. Al superar el tamaño
+máximo se eliminan los PDF usados hace más tiempo.
+
+No importa ReportLab: quien llama entrega la función de render.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+
+# Subir al cambiar el diseño de quote_pdf.py, para no servir PDF con la plantilla anterior
+TEMPLATE_VERSION = 1
+
+DEFAULT_MAX_BYTES = int(os.getenv('COLVA_PDF_CACHE_MB', '50')) * 1024 * 1024
+
+CLIENTE_CAMPOS = ('tipo_documento', 'numero_documento', 'nombres', 'apellidos', 'telefono', 'email')
+
+
+def _monto(valor):
+    return format(Decimal(str(valor)).quantize(Decimal('0.01')), 'f')
+
+
+def quote_key(cliente_data, valores, detalles_ambientes):
+    """Hash de los datos visibles en el PDF.
+
+    Los ambientes se ordenan como en el documento; los productos de cada
+    ambiente conservan su orden porque así se imprimen.
+    """
+    contenido = {
+        'plantilla': TEMPLATE_VERSION,
+        'cliente': [cliente_data.get(campo) for campo in CLIENTE_CAMPOS],
+        'ambientes': [
+            [num, [
+                [detalle['nombre'], int(detalle['cantidad']), _monto(detalle['precio_unitario'])]
+                for detalle in detalles_ambientes[num].values()
+            ]]
+            for num in sorted(detalles_ambientes)
+            if detalles_ambientes[num]
+        ],
+        'valores': [_monto(valores[k]) for k in ('subtotal', 'iva', 'total')],
+    }
+    datos = json.dumps(contenido, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(datos.encode('utf-8')).hexdigest()
+
+
+class PDFCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        """Ruta del PDF guardado, o None; marca el archivo como usado recientemente"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_or_render(self, cliente_data, valores, detalles_ambientes, render):
+        """Ruta del PDF de la cotización; `render(ruta)` solo se llama si no está guardado"""
+        key = quote_key(cliente_data, valores, detalles_ambientes)
+        path = self.get(key)
+        if path:
+            self.hits += 1
+            return path
+        self.misses += 1
+
+        # Se escribe en un temporal y se renombra: otro proceso nunca ve un PDF a medias
+        fd, tmp = tempfile.mkstemp(suffix='.pdf.tmp', dir=self.directory)
+        os.close(fd)
+        try:
+            render(tmp)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict(keep=key)
+        return self.path(key)
+
+    def export(self, path, destino):
+        """Dejar una copia del PDF en `destino` (enlace duro si el sistema lo permite)"""
+        if os.path.exists(destino):
+            os.remove(destino)
+        try:
+            os.link(path, destino)
+        except OSError:
+            shutil.copyfile(path, destino)
+        return destino
+
+    def evict(self, keep=None):
+        """Eliminar los PDF menos usados hasta quedar por debajo de max_bytes"""
+        archivos = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf') and entry.is_file():
+                stat = entry.stat()
+                archivos.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in archivos)
+        conservar = self.path(keep) if keep else None
+        for _, size, path in sorted(archivos):
+            if total <= self.max_bytes:
+                break
+            if path == conservar:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
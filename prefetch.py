@@ -0,0 +1,80 @@
+"""Precarga en segundo plano de los datos que cada pantalla va a pedir.
+
+Tras el inicio de sesión se encolan tareas (catálogo, usuarios, tablero) que
+un hilo ejecuta por orden de prioridad; al entrar a la pantalla los datos ya
+están en la copia local del catálogo o en la caché de lecturas (db_cache).
+Las tareas pendientes se cancelan al cerrar sesión.
+"""
+import itertools
+import queue
+import threading
+
+# Prioridades: menor valor se ejecuta antes
+CRITICAL = 0
+HIGH = 10
+LOW = 20
+
+
+class PrefetchTask:
+    def __init__(self, name, fn, priority, generation):
+        self.name = name
+        self.fn = fn
+        self.priority = priority
+        self.generation = generation
+        self.cancelled = False
+        self.done = threading.Event()
+        self.error = None
+
+    def cancel(self):
+        """Descartar la tarea si aún no empezó (una tarea en curso termina igual)"""
+        self.cancelled = True
+
+
+class PrefetchScheduler:
+    def __init__(self):
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending = {}  # nombre -> tarea encolada
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, name, fn, priority=LOW):
+        """Encolar `fn`; si ya hay una tarea pendiente con ese nombre se reutiliza
+        (y se le sube la prioridad si la nueva es mayor)"""
+        with self._lock:
+            tarea = self._pending.get(name)
+            if tarea is not None and not tarea.cancelled:
+                if priority >= tarea.priority:
+                    return tarea
+                tarea.cancel()
+            tarea = PrefetchTask(name, fn, priority, self._generation)
+            self._pending[name] = tarea
+            self._queue.put((priority, next(self._seq), tarea))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='prefetch', daemon=True)
+                self._thread.start()
+            return tarea
+
+    def cancel_all(self):
+        """Cancelar todo lo pendiente (p. ej. al cerrar sesión)"""
+        with self._lock:
+            self._generation += 1
+            for tarea in self._pending.values():
+                tarea.cancel()
+            self._pending.clear()
+
+    def _run(self):
+        while True:
+            _, _, tarea = self._queue.get()
+            with self._lock:
+                vigente = not tarea.cancelled and tarea.generation == self._generation
+                if self._pending.get(tarea.name) is tarea:
+                    del self._pending[tarea.name]
+            if vigente:
+                try:
+                    tarea.fn()
+                except Exception as e:
+                    tarea.error = e
+                    print(f"Error en precarga '{tarea.name}': {str(e)}")
+            tarea.done.set()
@@ -0,0 +1,163 @@
+"""Métricas de consultas a la base de datos: latencias, filas y consultas lentas"""
+import logging
+import re
+import threading
+
+logger = logging.getLogger('colva.db')
+
+# Límites superiores (ms) de cada cubeta del histograma; la última es "más de 5000"
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        idx = len(BUCKETS_MS)
+        for i, limite in enumerate(BUCKETS_MS):
+            if ms <= limite:
+                idx = i
+                break
+        self.counts[idx] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        """Percentil aproximado: límite superior de la cubeta que lo contiene"""
+        if not self.count:
+            return 0.0
+        objetivo = self.count * p / 100
+        acumulado = 0
+        for i, n in enumerate(self.counts):
+            acumulado += n
+            if acumulado >= objetivo:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ms,
+            'buckets': dict(zip([str(b) for b in BUCKETS_MS] + ['inf'], self.counts))
+        }
+
+
+def params_shape(params):
+    """Tipos de los parámetros, sin sus valores (pueden contener contraseñas)"""
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in params.items()) + '}'
+    return '(' + ', '.join(type(v).__name__ for v in params) + ')'
+
+
+def compact_sql(query):
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+class QueryStats:
+    """Acumula métricas por método llamador de Database"""
+
+    PHASES = ('connect', 'execute', 'fetch')
+
+    def __init__(self, slow_query_ms=500):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._callers = {}
+
+    def _entry(self, caller):
+        entry = self._callers.get(caller)
+        if entry is None:
+            entry = {
+                'calls': 0,
+                'errors': 0,
+                'rows': 0,
+                'slow': 0,
+                # Reintentos, sentencias canceladas por timeout y llamadas rechazadas
+                # con el cortacircuitos abierto
+                'retries': 0,
+                'timeouts': 0,
+                'rejected': 0,
+                'total': Histogram(),
+            }
+            for phase in self.PHASES:
+                entry[phase] = Histogram()
+            self._callers[caller] = entry
+        return entry
+
+    def record(self, caller, query, params, connect_ms, execute_ms, fetch_ms, rows, error=False):
+        total_ms = connect_ms + execute_ms + fetch_ms
+        slow = self.slow_query_ms is not None and total_ms >= self.slow_query_ms
+        with self._lock:
+            entry = self._entry(caller)
+            entry['calls'] += 1
+            entry['rows'] += rows or 0
+            if error:
+                entry['errors'] += 1
+            if slow:
+                entry['slow'] += 1
+            entry['connect'].add(connect_ms)
+            entry['execute'].add(execute_ms)
+            entry['fetch'].add(fetch_ms)
+            entry['total'].add(total_ms)
+
+        if slow:
+            logger.warning(
+                "Consulta lenta (%.1f ms: conexión %.1f, ejecución %.1f, lectura %.1f) en %s: %s params=%s",
+                total_ms, connect_ms, execute_ms, fetch_ms, caller,
+                compact_sql(query), params_shape(params)
+            )
+
+    def record_event(self, caller, event):
+        """Contar un reintento ('retries'), timeout ('timeouts') o rechazo ('rejected')"""
+        with self._lock:
+            self._entry(caller)[event] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                caller: {
+                    'calls': entry['calls'],
+                    'errors': entry['errors'],
+                    'rows': entry['rows'],
+                    'slow': entry['slow'],
+                    'retries': entry['retries'],
+                    'timeouts': entry['timeouts'],
+                    'rejected': entry['rejected'],
+                    **{phase: entry[phase].to_dict() for phase in self.PHASES + ('total',)}
+                }
+                for caller, entry in self._callers.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._callers.clear()
+
+    def report(self):
+        """Tabla de texto ordenada por tiempo total acumulado"""
+        snapshot = self.snapshot()
+        lineas = [
+            f"{'método':<32} {'llamadas':>8} {'filas':>8} {'lentas':>6} {'reint':>6} "
+            f"{'con p50':>8} {'ejec p50':>8} {'lect p50':>8} {'p99 ms':>8} {'máx ms':>8}"
+        ]
+        ordenados = sorted(
+            snapshot.items(),
+            key=lambda item: -item[1]['total']['avg_ms'] * item[1]['calls']
+        )
+        for caller, datos in ordenados:
+            lineas.append(
+                f"{caller[:32]:<32} {datos['calls']:>8} {datos['rows']:>8} {datos['slow']:>6} "
+                f"{datos['retries']:>6} "
+                f"{datos['connect']['p50_ms']:>8.0f} {datos['execute']['p50_ms']:>8.0f} "
+                f"{datos['fetch']['p50_ms']:>8.0f} {datos['total']['p99_ms']:>8.0f} "
+                f"{datos['total']['max_ms']:>8.1f}"
+            )
+        return '\n'.join(lineas)
@@ -0,0 +1,144 @@
+"""Cálculo de cotizaciones sin dependencias de la interfaz.
+
+Los precios se manejan en centavos enteros y los totales se entregan como
+Decimal, de modo que la pantalla, el PDF y la base de datos usan exactamente
+los mismos valores.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from operator import mul
+
+IVA_RATE = Decimal('0.19')
+CENT = Decimal('0.01')
+
+
+def to_cents(valor):
+    """Convertir un valor monetario (int, float, str o Decimal) a centavos"""
+    if isinstance(valor, float):
+        valor = repr(valor)
+    return int((Decimal(valor) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+def line_totals(cantidades, precios_cents):
+    """Subtotal en centavos de cada línea (cantidad x precio)"""
+    return list(map(mul, cantidades, precios_cents))
+
+
+def totales_ambientes(detalles_ambientes):
+    """Subtotal de cada línea y total de cada ambiente, como Decimal.
+
+    detalles_ambientes tiene el formato de Cotizacion.detalles_ambientes(); se
+    calcula en centavos, igual que subtotal_cents(), para que las sumas del PDF
+    cuadren con el subtotal guardado. Devuelve {num_ambiente: ({producto_id:
+    subtotal}, total_ambiente)}.
+    """
+    totales = {}
+    for num, productos in detalles_ambientes.items():
+        lineas = {
+            producto_id: detalle['cantidad'] * to_cents(detalle['precio_unitario'])
+            for producto_id, detalle in productos.items()
+        }
+        totales[num] = (
+            {producto_id: from_cents(cents) for producto_id, cents in lineas.items()},
+            from_cents(sum(lineas.values()))
+        )
+    return totales
+
+
+def calcular_valores(subtotal_cents, iva_rate=IVA_RATE):
+    subtotal = from_cents(subtotal_cents)
+    iva = (subtotal * iva_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+    return {
+        'subtotal': subtotal,
+        'iva': iva,
+        'total': subtotal + iva
+    }
+
+
+class Cotizacion:
+    """Cantidades por ambiente para una lista fija de productos.
+
+    `productos` puede ser una lista de diccionarios o un catalog.CatalogSnapshot,
+    del que se toman directamente las columnas.
+    """
+
+    def __init__(self, productos, iva_rate=IVA_RATE):
+        self.productos = productos
+        self.iva_rate = iva_rate
+        if hasattr(productos, 'costos_cents'):
+            self.ids = list(productos.ids)
+            self.nombres = list(productos.nombres)
+            self.precios_cents = list(productos.costos_cents)
+        else:
+            self.ids = [p['id'] for p in productos]
+            self.nombres = [p['nombre'] for p in productos]
+            self.precios_cents = [to_cents(p['costo']) for p in productos]
+        self.precios = [from_cents(c) for c in self.precios_cents]
+        self.ambientes = []
+
+    def con_productos(self, productos):
+        """Nueva cotización sobre otro catálogo, con las cantidades de los productos que siguen en él"""
+        nueva = Cotizacion(productos, self.iva_rate)
+        posiciones = {producto_id: idx for idx, producto_id in enumerate(nueva.ids)}
+        for fila in self.ambientes:
+            destino = nueva.ambientes[nueva.agregar_ambiente() - 1]
+            for producto_id, cantidad in zip(self.ids, fila):
+                idx = posiciones.get(producto_id)
+                if cantidad and idx is not None:
+                    destino[idx] = cantidad
+        return nueva
+
+    def agregar_ambiente(self):
+        """Agregar un ambiente vacío y devolver su número (desde 1)"""
+        self.ambientes.append([0] * len(self.productos))
+        return len(self.ambientes)
+
+    def set_cantidad(self, num_ambiente, producto_idx, cantidad):
+        if cantidad < 0:
+            raise ValueError("La cantidad no puede ser negativa")
+        self.ambientes[num_ambiente - 1][producto_idx] = cantidad
+
+    def get_cantidad(self, num_ambiente, producto_idx):
+        return self.ambientes[num_ambiente - 1][producto_idx]
+
+    def cantidad_total(self, producto_idx, excluir_ambiente=None):
+        """Unidades de un producto usadas en todos los ambientes (opcionalmente excluyendo uno)"""
+        return sum(
+            fila[producto_idx]
+            for num, fila in enumerate(self.ambientes, 1)
+            if num != excluir_ambiente
+        )
+
+    def cantidades_por_producto(self):
+        if not self.ambientes:
+            return [0] * len(self.productos)
+        return [sum(columna) for columna in zip(*self.ambientes)]
+
+    def totales_por_nombre(self):
+        return dict(zip(self.nombres, self.cantidades_por_producto()))
+
+    def subtotal_cents(self):
+        return sum(line_totals(self.cantidades_por_producto(), self.precios_cents))
+
+    def valores(self):
+        return calcular_valores(self.subtotal_cents(), self.iva_rate)
+
+    def detalles_ambientes(self):
+        """Detalles por ambiente con el formato de cotizacion_detalles (solo cantidades > 0)"""
+        detalles = {}
+        for num, fila in enumerate(self.ambientes, 1):
+            ambiente = {
+                producto_id: {
+                    'nombre': nombre,
+                    'cantidad': cantidad,
+                    'precio_unitario': precio
+                }
+                for producto_id, nombre, precio, cantidad in zip(self.ids, self.nombres, self.precios, fila)
+                if cantidad > 0
+            }
+            if ambiente:
+                detalles[num] = ambiente
+        return detalles
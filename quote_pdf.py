@@ -0,0 +1,112 @@
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+from quote_engine import from_cents, to_cents, totales_ambientes
+
+# Estilos compilados una sola vez por proceso
+CLIENTE_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+])
+
+AMBIENTE_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+AMBIENTE_COL_WIDTHS = [200, 80, 100, 100]
+AMBIENTE_HEADER = ['Producto', 'Cantidad', 'Precio Unit.', 'Subtotal']
+
+
+class QuotePDFRenderer:
+    """Genera el PDF de una cotización a partir de los datos ya recolectados"""
+
+    def __init__(self, pagesize=letter):
+        self.pagesize = pagesize
+        self.styles = getSampleStyleSheet()
+
+    def _header(self):
+        return [
+            Paragraph("Cotización de Productos", self.styles['Title']),
+            Spacer(1, 20),
+            Paragraph("Información del Cliente", self.styles['Heading2']),
+        ]
+
+    def build_elements(self, cliente_data, valores, detalles_ambientes):
+        """Construir los flowables del documento.
+
+        detalles_ambientes: {num_ambiente: {producto_id: {'nombre', 'cantidad',
+        'precio_unitario'}}}, el mismo modelo que se guarda en cotizacion_detalles.
+        """
+        styles = self.styles
+        elements = self._header()
+
+        cliente_info = [
+            ['Tipo de Documento:', cliente_data['tipo_documento']],
+            ['Número:', cliente_data['numero_documento']],
+            ['Nombres:', cliente_data['nombres']],
+            ['Apellidos:', cliente_data['apellidos']],
+            ['Teléfono:', cliente_data['telefono']],
+            ['Email:', cliente_data['email']]
+        ]
+        t = Table(cliente_info)
+        t.setStyle(CLIENTE_TABLE_STYLE)
+        elements.append(t)
+        elements.append(Spacer(1, 20))
+
+        # Los importes salen del motor de cotización (Decimal), no de sumas en float
+        totales = totales_ambientes(detalles_ambientes)
+        for num_ambiente in sorted(detalles_ambientes):
+            productos = detalles_ambientes[num_ambiente]
+            if not productos:
+                continue
+
+            data = [AMBIENTE_HEADER]
+            subtotales, ambiente_total = totales[num_ambiente]
+            for producto_id, detalle in productos.items():
+                precio = from_cents(to_cents(detalle['precio_unitario']))
+                subtotal = subtotales[producto_id]
+                data.append([
+                    detalle['nombre'],
+                    str(detalle['cantidad']),
+                    f"${precio:,.2f}",
+                    f"${subtotal:,.2f}"
+                ])
+
+            elements.append(Paragraph(f"Ambiente {num_ambiente}", styles['Heading3']))
+            t = Table(data, colWidths=AMBIENTE_COL_WIDTHS)
+            t.setStyle(AMBIENTE_TABLE_STYLE)
+            elements.append(t)
+            elements.append(Paragraph(f"Total Ambiente {num_ambiente}: ${ambiente_total:,.2f}", styles['Normal']))
+            elements.append(Spacer(1, 10))
+
+        # Totales
+        elements.append(Spacer(1, 20))
+        elements.append(Paragraph(f"Subtotal: ${valores['subtotal']:,.2f}", styles['Heading4']))
+        elements.append(Paragraph(f"IVA (19%): ${valores['iva']:,.2f}", styles['Heading4']))
+        elements.append(Paragraph(f"Total: ${valores['total']:,.2f}", styles['Heading2']))
+        return elements
+
+    def render(self, output, cliente_data, valores, detalles_ambientes):
+        """Escribir el PDF en `output` (ruta o archivo binario)"""
+        doc = SimpleDocTemplate(output, pagesize=self.pagesize)
+        doc.build(self.build_elements(cliente_data, valores, detalles_ambientes))
+        return output
+
+
+_renderer = None
+
+def get_renderer():
+    """Renderer compartido por proceso (los estilos se compilan una vez)"""
+    global _renderer
+    if _renderer is None:
+        _renderer = QuotePDFRenderer()
+    return _renderer
@@ -0,0 +1,90 @@
+"""Regenerar los PDF de cotizaciones guardadas sin abrir la aplicación.
+
+Los PDF se guardan en una caché por contenido (--cache): una cotización que
+no cambió desde la última vez se copia sin volver a renderizarse.
+
+Ejemplos:
+    python regenerar_pdfs.py --ids 12 13 20
+    python regenerar_pdfs.py --desde 2025-01-01 --hasta 2025-02-01 --salida ./pdfs
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from os.path import expanduser, join
+
+from database import Database
+from pdf_cache import PDFCache
+
+
+def nombre_archivo(cotizacion):
+    fecha = cotizacion['fecha'] or datetime.now()
+    return f"cotizacion_{cotizacion['id']}_{fecha.strftime('%Y%m%d_%H%M%S')}.pdf"
+
+
+def renderizar(cotizacion, salida, cache_dir):
+    def render(path):
+        # Se importa en el proceso hijo para que cada worker compile sus estilos una vez
+        from quote_pdf import get_renderer
+        get_renderer().render(
+            path,
+            cotizacion['cliente_data'],
+            cotizacion['valores'],
+            cotizacion['detalles_ambientes']
+        )
+
+    filename = join(salida, nombre_archivo(cotizacion))
+    cache = PDFCache(cache_dir)
+    pdf = cache.get_or_render(
+        cotizacion['cliente_data'], cotizacion['valores'], cotizacion['detalles_ambientes'], render
+    )
+    return cache.export(pdf, filename)
+
+
+def parse_fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida (use AAAA-MM-DD): {valor}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerar PDF de cotizaciones guardadas")
+    parser.add_argument('--ids', type=int, nargs='+', help="IDs de cotización")
+    parser.add_argument('--desde', type=parse_fecha, help="Fecha inicial (incluida), AAAA-MM-DD")
+    parser.add_argument('--hasta', type=parse_fecha, help="Fecha final (excluida), AAAA-MM-DD")
+    parser.add_argument('--salida', default=join(expanduser('~'), 'Downloads'),
+                        help="Directorio de salida")
+    parser.add_argument('--cache', default=join(expanduser('~'), '.cache', 'colva_pdf'),
+                        help="Directorio de la caché de PDF")
+    parser.add_argument('--procesos', type=int, default=os.cpu_count(),
+                        help="Número de procesos (por defecto, todos los núcleos)")
+    args = parser.parse_args(argv)
+
+    if not (args.ids or args.desde or args.hasta):
+        parser.error("Indique --ids o un rango con --desde/--hasta")
+
+    cotizaciones = Database().get_cotizaciones_with_details(args.ids, args.desde, args.hasta)
+    if not cotizaciones:
+        print("No se encontraron cotizaciones")
+        return 1
+
+    os.makedirs(args.salida, exist_ok=True)
+    errores = 0
+    with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+        futures = {pool.submit(renderizar, c, args.salida, args.cache): c['id'] for c in cotizaciones}
+        for future in as_completed(futures):
+            cotizacion_id = futures[future]
+            try:
+                print(f"✅ Cotización {cotizacion_id}: {future.result()}")
+            except Exception as e:
+                errores += 1
+                print(f"❌ Cotización {cotizacion_id}: {str(e)}")
+
+    print(f"{len(cotizaciones) - errores} de {len(cotizaciones)} PDF generados en {args.salida}")
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
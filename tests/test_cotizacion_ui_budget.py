@@ -0,0 +1,65 @@
+"""Presupuestos de frame y de memoria de la grilla de CotizacionScreen.
+
+Mismas mediciones que benchmarks/bench_cotizacion_ui.py (ventana 'dummy' y
+backend GL 'mock'); se omiten si Kivy no está instalado.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_GL_BACKEND', 'mock')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+pytest.importorskip('kivy')
+pytest.importorskip('kivymd')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import bench_cotizacion_ui as bench  # noqa: E402
+from common import percentile  # noqa: E402
+from memory_budget import count_widgets, release_widgets  # noqa: E402
+
+PRODUCTOS = 100
+AMBIENTES = 10
+TECLAS = 300
+# Un frame a 60 Hz
+PRESUPUESTO_TECLA_MS = 16.0
+
+
+@pytest.fixture(scope='module')
+def medicion():
+    bench.cargar_kv()
+    return bench.medir(PRODUCTOS, AMBIENTES, TECLAS)
+
+
+def test_pulsacion_dentro_de_un_frame(medicion):
+    p95_ms = percentile(medicion['tecla_s'], 95) * 1000
+    assert p95_ms <= PRESUPUESTO_TECLA_MS
+
+
+def test_widgets_en_el_minimo(medicion):
+    widgets = count_widgets(medicion['screen'].ids.tabla_container)
+    assert widgets <= bench.widgets_minimos(PRODUCTOS, AMBIENTES)
+
+
+def test_totales_del_modelo_coinciden_con_las_celdas(medicion):
+    screen = medicion['screen']
+    assert screen.cotizacion.valores()['subtotal'] == bench.subtotal_celdas(screen)
+
+
+def test_bajo_consumo_libera_la_grilla_y_conserva_la_cotizacion(medicion):
+    screen = medicion['screen']
+    contenedor = screen.ids.tabla_container
+    cantidades = [list(fila) for fila in screen.cotizacion.ambientes]
+    subtotal = bench.subtotal_celdas(screen)
+
+    release_widgets(screen.name, contenedor)
+    assert count_widgets(contenedor) == 1
+
+    screen.crear_tabla()
+    assert [list(fila) for fila in screen.cotizacion.ambientes] == cantidades
+    assert bench.subtotal_celdas(screen) == subtotal
+    assert count_widgets(contenedor) <= bench.widgets_minimos(PRODUCTOS, AMBIENTES)
@@ -0,0 +1,201 @@
+"""Perfilado de la interfaz: tiempos de frame, callbacks y eventos de Clock.
+
+Se activa con la variable de entorno COLVA_PROFILE=1. Mide cada método de
+las pantallas y popups de la app, el tiempo de los eventos de Clock y la
+duración de cada frame, agrupando por pantalla activa. Muestra un resumen
+(con la memoria residente del proceso) sobre la ventana y lo exporta a JSON
+al cerrar la app.
+"""
+import functools
+import inspect
+import json
+import os
+import time
+from datetime import datetime
+
+from kivy.clock import Clock
+from kivy.core.window import Window
+from kivy.uix.label import Label
+from kivy.uix.widget import Widget
+
+from memory_budget import rss_mb
+
+FRAME_BUDGET_MS = 1000 / 60
+
+
+def app_classes(*modules):
+    """Clases de widgets definidas en los módulos indicados"""
+    clases = []
+    for module in modules:
+        for _, obj in vars(module).items():
+            if (inspect.isclass(obj) and issubclass(obj, Widget)
+                    and obj.__module__ == module.__name__):
+                clases.append(obj)
+    return clases
+
+
+class _Stat:
+    __slots__ = ('count', 'total_ms', 'max_ms')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3)
+        }
+
+
+class UIProfiler:
+    def __init__(self, app, frame_budget_ms=FRAME_BUDGET_MS):
+        self.app = app
+        self.frame_budget_ms = frame_budget_ms
+        self.handlers = {}  # pantalla -> {nombre: _Stat}
+        self.frames = {}  # pantalla -> {'stat': _Stat, 'slow': int}
+        self.overlay = None
+        self._clock_originals = {}
+
+    def current_screen(self):
+        root = self.app.root
+        return getattr(root, 'current', None) or 'inicio'
+
+    def record(self, name, ms):
+        screen = self.current_screen()
+        stats = self.handlers.setdefault(screen, {})
+        stat = stats.get(name)
+        if stat is None:
+            stat = stats[name] = _Stat()
+        stat.add(ms)
+
+    def wrap(self, func, name):
+        if getattr(func, '_profiled', False):
+            return func
+        profiler = self
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(name, (time.perf_counter() - inicio) * 1000)
+
+        wrapper._profiled = True
+        return wrapper
+
+    def instrument_class(self, cls):
+        """Envolver los métodos propios de la clase (on_enter, callbacks, etc.)"""
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('__') or not inspect.isfunction(value):
+                continue
+            setattr(cls, attr, self.wrap(value, f'{cls.__name__}.{attr}'))
+
+    def instrument_clock(self):
+        """Medir el tiempo que Clock dedica a sus eventos en cada frame.
+
+        Se envuelve el procesamiento de eventos y no cada callback: así
+        Clock.unschedule() sigue encontrando el callback original y Clock conserva
+        sus referencias débiles a los métodos. Los callbacks que son métodos de
+        pantallas o popups ya se miden uno por uno con instrument_class.
+        """
+        profiler = self
+        for attr, name in (('_process_events', 'Clock:eventos'),
+                           ('_process_events_before_frame', 'Clock:eventos antes del frame')):
+            original = getattr(Clock, attr, None)
+            if original is None or attr in self._clock_originals:
+                continue
+            self._clock_originals[attr] = original
+
+            def process(original=original, name=name):
+                inicio = time.perf_counter()
+                try:
+                    return original()
+                finally:
+                    profiler.record(name, (time.perf_counter() - inicio) * 1000)
+
+            setattr(Clock, attr, process)
+
+    def install(self, classes):
+        for cls in classes:
+            self.instrument_class(cls)
+        self.instrument_clock()
+        Clock.schedule_interval(self._on_frame, 0)
+
+    def _on_frame(self, dt):
+        ms = dt * 1000
+        entry = self.frames.setdefault(self.current_screen(), {'stat': _Stat(), 'slow': 0})
+        entry['stat'].add(ms)
+        if ms > self.frame_budget_ms * 1.5:
+            entry['slow'] += 1
+
+    def worst_offenders(self, screen, limit=5):
+        stats = self.handlers.get(screen, {})
+        return sorted(stats.items(), key=lambda item: -item[1].max_ms)[:limit]
+
+    def show_overlay(self):
+        self.overlay = Label(
+            font_name='RobotoMono-Regular',
+            font_size='11sp',
+            color=(1, 1, 0, 1),
+            size_hint=(None, None),
+            halign='left',
+            valign='top'
+        )
+        self.overlay.bind(texture_size=self.overlay.setter('size'))
+        Window.add_widget(self.overlay)
+        Clock.schedule_interval(self._update_overlay, 1)
+
+    def _update_overlay(self, dt):
+        screen = self.current_screen()
+        frames = self.frames.get(screen)
+        lineas = [f"[{screen}]"]
+        rss = rss_mb()
+        if rss is not None:
+            lineas[0] += f" RSS {rss:.0f} MB"
+        if frames and frames['stat'].count:
+            stat = frames['stat']
+            lineas.append(
+                f"frame prom {stat.total_ms / stat.count:.1f} ms, máx {stat.max_ms:.1f} ms, "
+                f"lentos {frames['slow']}"
+            )
+        for name, stat in self.worst_offenders(screen):
+            lineas.append(f"{stat.max_ms:7.1f} ms máx  x{stat.count:<5} {name}")
+        self.overlay.text = '\n'.join(lineas)
+        self.overlay.pos = (5, Window.height - self.overlay.height - 5)
+
+    def report(self):
+        screens = set(self.handlers) | set(self.frames)
+        return {
+            screen: {
+                'frames': {
+                    **self.frames[screen]['stat'].to_dict(),
+                    'slow': self.frames[screen]['slow']
+                } if screen in self.frames else None,
+                'handlers': {
+                    name: stat.to_dict()
+                    for name, stat in sorted(
+                        self.handlers.get(screen, {}).items(),
+                        key=lambda item: -item[1].total_ms
+                    )
+                }
+            }
+            for screen in sorted(screens)
+        }
+
+    def export(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"perfil_ui_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        return path